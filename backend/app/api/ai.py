@@ -2,10 +2,12 @@
 AI 功能 API - 智能分类和内容摘要
 """
 import asyncio
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db, async_session_maker
+from app.database import get_read_db
+from app.models.bookmark import Bookmark
 from app.schemas.ai import (
     ClassifyRequest,
     ClassifyResponse,
@@ -17,12 +19,30 @@ from app.schemas.ai import (
     QuickAddWithTitleRequest,
     QuickAddWithCategoryRequest,
     QuickAddResponse,
+    SearchRequest,
+    SearchResult,
+    SearchResponse,
+    OrganizeProposeRequest,
+    OrganizeProposeResponse,
+    OrganizeApplyRequest,
 )
-from app.services.ai.classifier import classify_bookmark, batch_classify
-from app.services.ai.summarizer import summarize_bookmark, summarize_url, batch_summarize
-from app.services.ai.task_progress import create_task, get_task, get_all_tasks, cleanup_old_tasks
-from app.services.bookmark import get_bookmark_by_id, get_categories, create_bookmark
-from app.schemas.bookmark import BookmarkCreate
+from app.services.ai.classifier import classify_bookmark
+from app.services.ai.summarizer import summarize_bookmark, summarize_url
+from app.services.ai.cache import get_cache_stats, clear_cache
+from app.utils.page_cache import get_page_cache_stats, clear_page_cache
+from app.services.ai.job_queue import (
+    create_job,
+    get_job,
+    list_jobs,
+    cancel_job,
+    resume_job,
+    cleanup_old_jobs,
+)
+from app.services.ai.enrichment import create_enriched_bookmark
+from app.services.ai.vector_index import get_search_index, search_bookmarks
+from app.services.ai.local_classifier import get_local_classifier
+from app.services.ai.organizer import propose_groups, apply_groups
+from app.services.bookmark import get_bookmark_by_id, get_categories
 from app.utils.security import get_current_user, get_optional_user
 from app.config import get_settings
 
@@ -45,7 +65,7 @@ def check_openai_configured():
 @router.post("/classify", response_model=ClassifyResponse)
 async def classify_endpoint(
     data: ClassifyRequest,
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_optional_user)
 ):
     """智能分类 - 为书签推荐分类"""
@@ -82,7 +102,7 @@ async def classify_endpoint(
 @router.post("/summarize", response_model=SummarizeResponse)
 async def summarize_endpoint(
     data: SummarizeRequest,
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_optional_user)
 ):
     """内容摘要 - 抓取网页并生成摘要"""
@@ -98,84 +118,222 @@ async def summarize_endpoint(
     return SummarizeResponse(**result)
 
 
-async def run_batch_task(task, operations: list, bookmark_ids: list = None):
-    """后台执行批量任务"""
-    async with async_session_maker() as session:
-        try:
-            for operation in operations:
-                if operation == "summarize":
-                    await batch_summarize(session, bookmark_ids, task=task)
-                elif operation == "classify":
-                    await batch_classify(session, bookmark_ids, task=task)
-        except Exception as e:
-            task.status = "failed"
-            task.errors.append(str(e))
-
-
 @router.post("/batch")
 async def batch_process_endpoint(
     data: BatchProcessRequest,
-    background_tasks: BackgroundTasks,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    批量处理 - 为书签批量生成 AI 内容（后台执行）
+    批量处理 - 为书签批量生成 AI 内容（后台任务队列执行）
 
     operations 可选值:
     - summarize: 生成摘要
     - classify: 智能分类
 
-    返回 task_id，可通过 /api/ai/task/{task_id} 查询进度
+    返回 task_id，可通过 /api/ai/task/{task_id} 查询进度。
+    任务保存在数据库中，服务重启后会从中断处继续。
     """
     check_openai_configured()
 
     # 清理旧任务
-    cleanup_old_tasks()
-
-    # 创建任务
-    operation_name = "+".join(data.operations)
-    task = create_task(operation_name)
-
-    # 后台执行
-    background_tasks.add_task(
-        run_batch_task,
-        task,
-        data.operations,
-        data.bookmark_ids
-    )
+    await cleanup_old_jobs()
+
+    try:
+        job = await create_job(data.operations, data.bookmark_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
-        "task_id": task.task_id,
+        "task_id": job.id,
         "message": "任务已创建，正在后台执行",
-        "status": task.status,
+        "status": job.status,
     }
 
 
 @router.get("/task/{task_id}")
 async def get_task_progress(
     task_id: str,
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """获取批量任务进度"""
-    task = get_task(task_id)
-    if not task:
+    job = await get_job(session, task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    return job.to_dict()
+
+
+@router.post("/task/{task_id}/cancel")
+async def cancel_task(
+    task_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """取消批量任务（运行中的任务在当前分块完成后停止）"""
+    job = await cancel_job(task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    return job.to_dict()
+
+
+@router.post("/task/{task_id}/resume")
+async def resume_task(
+    task_id: str,
+    retry_failed: bool = True,
+    current_user: dict = Depends(get_current_user)
+):
+    """继续执行已取消或失败的任务，默认重试失败项"""
+    job = await resume_job(task_id, retry_failed=retry_failed)
+    if not job:
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    return task.to_dict()
+    return job.to_dict()
 
 
 @router.get("/tasks")
 async def list_tasks(
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """获取所有任务列表"""
-    return get_all_tasks()
+    jobs = await list_jobs(session)
+    return [job.to_dict() for job in jobs]
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search_endpoint(
+    data: SearchRequest,
+    session: AsyncSession = Depends(get_read_db),
+    current_user: dict = Depends(get_optional_user)
+):
+    """语义搜索 - 在本地向量索引中按标题、标签和描述查找相关书签"""
+    query = data.query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="搜索内容不能为空")
+    limit = max(1, min(data.limit, 100))
+
+    try:
+        matches = await search_bookmarks(query, limit=limit, include_hidden=current_user is not None)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"搜索索引不可用: {str(e)}")
+    if not matches:
+        return SearchResponse(results=[])
+
+    result = await session.execute(
+        select(Bookmark).where(Bookmark.id.in_([bookmark_id for bookmark_id, _ in matches]))
+    )
+    bookmarks = {b.id: b for b in result.scalars().all()}
+
+    results = []
+    for bookmark_id, score in matches:
+        bookmark = bookmarks.get(bookmark_id)
+        if bookmark is None:
+            continue
+        results.append(SearchResult(
+            id=bookmark.id,
+            title=bookmark.title,
+            url=bookmark.url,
+            category=bookmark.category,
+            description=bookmark.description,
+            score=round(max(score, 0.0), 4),
+        ))
+    return SearchResponse(results=results)
+
+
+@router.get("/search/stats")
+async def search_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """获取搜索索引状态（向量化方式、书签数、内存占用）"""
+    return get_search_index().stats()
+
+
+@router.get("/classifier/stats")
+async def local_classifier_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """获取本地分类器状态（训练书签数、本地命中次数、回退到 LLM 的次数）"""
+    return get_local_classifier().stats()
+
+
+@router.post("/organize/propose", response_model=OrganizeProposeResponse)
+async def organize_propose(
+    data: OrganizeProposeRequest,
+    session: AsyncSession = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    分类整理建议 - 对指定分类（默认"默认分类"）下的书签离线聚类
+
+    返回分组、每组的代表性书签和建议名称，不修改数据。
+    AI 只为每个分组命名一次；name_clusters=false 时不请求 AI，用关键词作为名称。
+    """
+    if data.name_clusters:
+        check_openai_configured()
+    if data.num_clusters is not None and data.num_clusters < 1:
+        raise HTTPException(status_code=400, detail="分组数必须大于 0")
+
+    try:
+        result = await propose_groups(
+            session,
+            category=data.category,
+            num_clusters=data.num_clusters,
+            sample_size=max(1, min(data.sample_size, 20)),
+            name_clusters=data.name_clusters,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return OrganizeProposeResponse(**result)
+
+
+@router.post("/organize/apply")
+async def organize_apply(
+    data: OrganizeApplyRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """应用分类整理 - 按确认后的分组批量修改书签分类"""
+    updated = await apply_groups([group.model_dump() for group in data.groups])
+    return {"success": True, "updated": updated}
+
+
+@router.get("/cache/stats")
+async def cache_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """获取 LLM 响应缓存统计（命中率、节省 token 数）"""
+    return await get_cache_stats()
+
+
+@router.delete("/cache")
+async def clear_cache_endpoint(
+    current_user: dict = Depends(get_current_user)
+):
+    """清空 LLM 响应缓存"""
+    removed = await clear_cache()
+    return {"success": True, "removed": removed}
+
+
+@router.get("/page-cache/stats")
+async def page_cache_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """获取网页抓取缓存统计（命中、304 重新验证、未命中）"""
+    return await get_page_cache_stats()
+
+
+@router.delete("/page-cache")
+async def clear_page_cache_endpoint(
+    current_user: dict = Depends(get_current_user)
+):
+    """清空网页抓取缓存"""
+    removed = await clear_page_cache()
+    return {"success": True, "removed": removed}
 
 
 @router.get("/status")
 async def ai_status(
-    session: AsyncSession = Depends(get_db)
+    session: AsyncSession = Depends(get_read_db)
 ):
     """检查 AI 服务状态"""
     from app.services.ai.llm import get_effective_config
@@ -189,18 +347,39 @@ async def ai_status(
     }
 
 
+@router.get("/capabilities")
+async def ai_capabilities(
+    refresh: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """获取当前 AI 提供商能力（JSON 模式、工具调用、上下文长度）"""
+    check_openai_configured()
+
+    from app.services.ai import capabilities
+    from app.services.ai.llm import get_effective_config, get_openai_client
+
+    if refresh:
+        capabilities.invalidate_capabilities()
+
+    config = get_effective_config()
+    caps = await capabilities.get_capabilities(
+        get_openai_client(), config["base_url"], config["model"]
+    )
+    return caps.to_dict()
+
+
 @router.post("/fetch-page-info")
 async def fetch_page_info_endpoint(
     data: SummarizeRequest,
     current_user: dict = Depends(get_optional_user)
 ):
-    """获取网页信息（标题、描述等）- 不需要 AI"""
-    from app.utils.web_scraper import fetch_page_content
+    """获取网页信息（标题、描述等）- 不需要 AI，只读取网页 <head>"""
+    from app.utils.web_scraper import fetch_page_metadata
 
     if not data.url:
         raise HTTPException(status_code=400, detail="请提供 url")
 
-    page_data = await fetch_page_content(data.url)
+    page_data = await fetch_page_metadata(data.url)
 
     if not page_data:
         raise HTTPException(status_code=400, detail="无法获取网页信息")
@@ -212,144 +391,71 @@ async def fetch_page_info_endpoint(
     }
 
 
+def _quick_add_response(bookmark) -> QuickAddResponse:
+    return QuickAddResponse(
+        id=bookmark.id,
+        title=bookmark.title,
+        url=bookmark.url,
+        description=bookmark.description or "",
+        category=bookmark.category or "",
+        tags=bookmark.tags or "",
+        visible=bookmark.visible,
+        enrich_status=bookmark.enrich_status,
+    )
+
+
 @router.post("/quick-add", response_model=QuickAddResponse)
 async def quick_add_bookmark(
     data: QuickAddRequest,
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
     快速添加书签 - 只需提供 URL，AI 自动生成其他内容
 
-    1. 抓取网页获取标题和内容
-    2. AI 生成描述、标签
-    3. AI 智能分类
-    4. 创建书签
+    1. 抓取网页获取标题和内容（只抓取一次）
+    2. 一次 AI 请求生成描述、标签和分类
+    3. 创建书签
+
+    enrich_later=true 时立即创建书签并返回，AI 补全在后台完成
     """
     check_openai_configured()
 
-    from app.utils.web_scraper import fetch_page_content
-    import json
-
-    # 1. 抓取网页内容
-    page_data = await fetch_page_content(data.url)
-
-    if not page_data:
-        raise HTTPException(status_code=400, detail="无法获取网页信息")
-
-    title = page_data.get("title", data.url)
-    description = page_data.get("description", "")
-
-    # 2. 获取现有分类
-    existing_categories = await get_categories(session)
-
-    # 3. AI 生成摘要和标签
-    summary_result = await summarize_url(data.url, title)
-
-    # 4. AI 智能分类
-    from app.services.ai.classifier import classify_bookmark as ai_classify
-    classify_result = await ai_classify(
-        session,
-        title=title,
-        url=data.url,
-        description=summary_result.get("summary") or description,
-        existing_categories=existing_categories,
-    )
-
-    # 5. 准备书签数据
-    final_description = summary_result.get("summary") or description or ""
-    final_tags = summary_result.get("tags", [])
-    final_category = classify_result.get("suggested_category", "未分类")
-
-    # 6. 创建书签
-    bookmark_data = BookmarkCreate(
-        title=title,
-        url=data.url,
-        description=final_description,
-        tags=json.dumps(final_tags, ensure_ascii=False) if final_tags else "",
-        category=final_category,
-        visible=True
-    )
-
-    bookmark = await create_bookmark(session, bookmark_data)
+    try:
+        bookmark = await create_enriched_bookmark(
+            session, data.url, enrich_later=data.enrich_later
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return QuickAddResponse(
-        id=bookmark.id,
-        title=bookmark.title,
-        url=bookmark.url,
-        description=bookmark.description or "",
-        category=bookmark.category or "",
-        tags=bookmark.tags or "",
-        visible=bookmark.visible
-    )
+    return _quick_add_response(bookmark)
 
 
 @router.post("/quick-add-with-title", response_model=QuickAddResponse)
 async def quick_add_bookmark_with_title(
     data: QuickAddWithTitleRequest,
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
     快速添加书签 - 提供 URL 和标题，AI 生成描述、标签和分类
 
     1. 使用提供的标题
-    2. AI 生成描述、标签
-    3. AI 智能分类
-    4. 创建书签
+    2. 一次 AI 请求生成描述、标签和分类
+    3. 创建书签
     """
     check_openai_configured()
 
-    import json
-
-    # 1. 获取现有分类
-    existing_categories = await get_categories(session)
-
-    # 2. AI 生成摘要和标签
-    summary_result = await summarize_url(data.url, data.title)
-
-    # 3. AI 智能分类
-    from app.services.ai.classifier import classify_bookmark as ai_classify
-    classify_result = await ai_classify(
-        session,
-        title=data.title,
-        url=data.url,
-        description=summary_result.get("summary") or "",
-        existing_categories=existing_categories,
-    )
-
-    # 4. 准备书签数据
-    final_description = summary_result.get("summary") or ""
-    final_tags = summary_result.get("tags", [])
-    final_category = classify_result.get("suggested_category", "未分类")
-
-    # 5. 创建书签
-    bookmark_data = BookmarkCreate(
-        title=data.title,
-        url=data.url,
-        description=final_description,
-        tags=json.dumps(final_tags, ensure_ascii=False) if final_tags else "",
-        category=final_category,
-        visible=True
-    )
-
-    bookmark = await create_bookmark(session, bookmark_data)
-
-    return QuickAddResponse(
-        id=bookmark.id,
-        title=bookmark.title,
-        url=bookmark.url,
-        description=bookmark.description or "",
-        category=bookmark.category or "",
-        tags=bookmark.tags or "",
-        visible=bookmark.visible
+    bookmark = await create_enriched_bookmark(
+        session, data.url, title=data.title, enrich_later=data.enrich_later
     )
+    return _quick_add_response(bookmark)
 
 
 @router.post("/quick-add-with-category", response_model=QuickAddResponse)
 async def quick_add_bookmark_with_category(
     data: QuickAddWithCategoryRequest,
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -361,33 +467,11 @@ async def quick_add_bookmark_with_category(
     """
     check_openai_configured()
 
-    import json
-
-    # 1. AI 生成摘要和标签
-    summary_result = await summarize_url(data.url, data.title)
-
-    # 2. 准备书签数据
-    final_description = summary_result.get("summary") or ""
-    final_tags = summary_result.get("tags", [])
-
-    # 3. 创建书签
-    bookmark_data = BookmarkCreate(
+    bookmark = await create_enriched_bookmark(
+        session,
+        data.url,
         title=data.title,
-        url=data.url,
-        description=final_description,
-        tags=json.dumps(final_tags, ensure_ascii=False) if final_tags else "",
         category=data.category,
-        visible=True
-    )
-
-    bookmark = await create_bookmark(session, bookmark_data)
-
-    return QuickAddResponse(
-        id=bookmark.id,
-        title=bookmark.title,
-        url=bookmark.url,
-        description=bookmark.description or "",
-        category=bookmark.category or "",
-        tags=bookmark.tags or "",
-        visible=bookmark.visible
+        enrich_later=data.enrich_later,
     )
+    return _quick_add_response(bookmark)
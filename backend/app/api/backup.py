@@ -14,13 +14,14 @@ from datetime import datetime
 
 from typing import Optional
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.bookmark import Bookmark
 from app.models.category import CategoryOrder
 from app.models.settings import SiteSettings
 from app.schemas.settings import BackupData, WebDAVConfig, WebDAVConfigUpdate
 from app.utils.security import get_current_user
 from app.services.bookmark import import_bookmarks
+from app.services.coordination import bookmarks_reloaded
 from app.version import VERSION
 
 router = APIRouter()
@@ -145,7 +146,7 @@ def _parse_bookmarks_from_html(text):
 @router.get("/export")
 async def export_backup(
     format: str = Query('json', regex='^(json|csv|html)$'),
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     # 获取书签
@@ -213,6 +214,7 @@ async def import_backup(
     await session.execute(delete(Bookmark))
     await session.execute(delete(CategoryOrder))
     await session.commit()
+    bookmarks_reloaded()
 
     # 导入书签
     bookmarks_data = []
@@ -223,7 +225,7 @@ async def import_backup(
             bookmarks_data.append(b.dict() if hasattr(b, 'dict') else dict(b))
 
     # 自动创建分类（skip_category=False）
-    count = await import_bookmarks(session, bookmarks_data, skip_category=False)
+    count = await import_bookmarks(bookmarks_data, skip_category=False)
 
     # 导入分类顺序（可选，若有提供则更新顺序）
     category_order = data.category_order or data.categoryOrder or []
@@ -275,6 +277,7 @@ async def import_backup_file(
         await session.execute(delete(Bookmark))
         await session.execute(delete(CategoryOrder))
         await session.commit()
+        bookmarks_reloaded()
 
     bookmarks_data = []
     category_order = []
@@ -302,7 +305,7 @@ async def import_backup_file(
         raise HTTPException(status_code=400, detail='导入的书签数据格式错误')
 
     # 导入书签时自动创建分类（skip_category=False）
-    imported = await import_bookmarks(session, bookmarks_data, skip_category=False)
+    imported = await import_bookmarks(bookmarks_data, skip_category=False)
 
     # 如果文件中包含了 category_order 信息，更新分类顺序
     categories_count = 0
@@ -339,7 +342,7 @@ async def import_backup_file(
 @router.get("/webdav")
 async def get_webdav_config_endpoint(
     test: bool = Query(False, description="是否测试连接"),
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """获取 WebDAV 配置状态"""
@@ -407,9 +410,9 @@ async def save_webdav_config(
         if config.backupTime is not None:
             await set_setting(session, "webdav_backup_time", config.backupTime)
             # 更新调度器
-            from app.services.scheduler import update_backup_schedule
+            from app.services.coordination import backup_schedule_changed
             try:
-                await update_backup_schedule(config.backupTime)
+                await backup_schedule_changed(config.backupTime)
             except Exception as e:
                 print(f"更新备份时间失败: {e}")
 
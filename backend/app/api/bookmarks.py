@@ -1,11 +1,17 @@
 """
 书签 API
 """
+import asyncio
+import json
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional, Set
 
-from app.database import get_db
+from app.database import get_read_db
+from app.models.bookmark import Bookmark
 from app.schemas.bookmark import (
     BookmarkCreate,
     BookmarkUpdate,
@@ -29,25 +35,62 @@ from app.services.bookmark import (
     update_category,
     delete_category,
 )
+from app.services.events import subscribe
+from app.services.keyword_search import keyword_search
+from app.services.related import get_related_bookmarks
+from app.services.link_checker import get_link_health_summary, run_link_check
+from app.services.duplicates import (
+    find_duplicate_clusters,
+    find_near_duplicates,
+    get_duplicate_scan_summary,
+    is_duplicate_scan_running,
+    run_duplicate_scan,
+)
 from app.utils.security import get_current_user, get_optional_user
 
 router = APIRouter()
 
+# 手动触发的后台任务 (事件循环只弱引用任务，需在这里保留引用直到完成)
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _start_background(name: str, func) -> asyncio.Task:
+    """在后台执行 func()，异常记录到日志"""
+    async def run():
+        try:
+            await func()
+        except Exception as e:
+            print(f"⚠ {name}失败: {e}")
+
+    task = asyncio.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+_duplicate_scan_task: Optional[asyncio.Task] = None
+
 
 @router.get("", response_model=List[BookmarkResponse])
 async def list_bookmarks(
-    session: AsyncSession = Depends(get_db),
+    broken: bool = False,
+    q: Optional[str] = None,
+    limit: int = 50,
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_optional_user)
 ):
-    """获取书签列表"""
+    """获取书签列表，broken=true 时只返回链接失效的书签，q 不为空时按关键词搜索"""
     include_hidden = current_user is not None
-    bookmarks = await get_bookmarks(session, include_hidden=include_hidden)
+    if q and q.strip():
+        bookmarks = await keyword_search(session, q, include_hidden=include_hidden, limit=max(1, min(limit, 500)))
+        return [BookmarkResponse.model_validate(b.to_dict()) for b in bookmarks]
+    bookmarks = await get_bookmarks(session, include_hidden=include_hidden, broken_only=broken)
     return [BookmarkResponse.model_validate(b.to_dict()) for b in bookmarks]
 
 
 @router.get("/categories")
 async def list_categories(
-    session: AsyncSession = Depends(get_db)
+    session: AsyncSession = Depends(get_read_db)
 ):
     """获取所有分类"""
     categories = await get_categories(session)
@@ -60,10 +103,101 @@ async def list_categories(
     return {"categories": sorted_categories}
 
 
+@router.get("/events")
+async def bookmark_events(
+    current_user: dict = Depends(get_optional_user)
+):
+    """书签变更事件流 (SSE)，后台补全完成时推送；未登录时不推送隐藏书签的事件"""
+    include_hidden = current_user is not None
+
+    async def event_stream():
+        async with subscribe() as queue:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 保持连接
+                    yield ": ping\n\n"
+                    continue
+                if not include_hidden and not message["data"].get("visible", False):
+                    continue
+                payload = json.dumps(message["data"], ensure_ascii=False)
+                yield f"event: {message['event']}\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/broken-links")
+async def broken_links(
+    session: AsyncSession = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取链接检查统计和失效书签"""
+    summary = await get_link_health_summary(session)
+    bookmarks = await get_bookmarks(session, include_hidden=True, broken_only=True)
+    return {
+        **summary,
+        "bookmarks": [BookmarkResponse.model_validate(b.to_dict()) for b in bookmarks],
+    }
+
+
+@router.post("/broken-links/check")
+async def check_links_now(
+    current_user: dict = Depends(get_current_user)
+):
+    """立即在后台执行一轮链接检查"""
+    _start_background("链接检查", run_link_check)
+    return {"success": True, "message": "链接检查已开始"}
+
+
+@router.get("/duplicates")
+async def duplicate_clusters(
+    min_similarity: Optional[float] = None,
+    session: AsyncSession = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取近似重复的书签分组 (按网页内容 MinHash 签名)"""
+    summary = await get_duplicate_scan_summary(session)
+    clusters = await find_duplicate_clusters(session, min_similarity)
+
+    bookmark_ids = [bookmark_id for cluster in clusters for bookmark_id, _ in cluster]
+    bookmarks = {}
+    for i in range(0, len(bookmark_ids), 500):
+        result = await session.execute(select(Bookmark).where(Bookmark.id.in_(bookmark_ids[i:i + 500])))
+        bookmarks.update({b.id: b for b in result.scalars().all()})
+
+    groups = []
+    for cluster in clusters:
+        members = [
+            {**BookmarkResponse.model_validate(bookmarks[bookmark_id].to_dict()).model_dump(), "similarity": similarity}
+            for bookmark_id, similarity in cluster
+            if bookmark_id in bookmarks
+        ]
+        if len(members) > 1:
+            groups.append({"size": len(members), "bookmarks": members})
+    return {**summary, "clusters": groups}
+
+
+@router.post("/duplicates/scan")
+async def scan_duplicates_now(
+    current_user: dict = Depends(get_current_user)
+):
+    """立即在后台计算缺少的内容签名 (已有扫描在进行时返回 409)"""
+    global _duplicate_scan_task
+    if (_duplicate_scan_task is not None and not _duplicate_scan_task.done()) or is_duplicate_scan_running():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="近似重复扫描正在进行")
+    _duplicate_scan_task = _start_background("近似重复扫描", run_duplicate_scan)
+    return {"success": True, "message": "近似重复扫描已开始"}
+
+
 @router.get("/{bookmark_id}", response_model=BookmarkResponse)
 async def get_bookmark(
     bookmark_id: str,
-    session: AsyncSession = Depends(get_db)
+    session: AsyncSession = Depends(get_read_db)
 ):
     """获取单个书签"""
     bookmark = await get_bookmark_by_id(session, bookmark_id)
@@ -73,14 +207,60 @@ async def get_bookmark(
     return BookmarkResponse.model_validate(bookmark.to_dict())
 
 
+@router.get("/{bookmark_id}/related")
+async def related_bookmarks(
+    bookmark_id: str,
+    limit: int = 10,
+    session: AsyncSession = Depends(get_read_db),
+    current_user: dict = Depends(get_optional_user)
+):
+    """获取相关书签 (读取预先计算的结果)"""
+    related = await get_related_bookmarks(
+        session,
+        bookmark_id,
+        include_hidden=current_user is not None,
+        limit=max(1, min(limit, 50)),
+    )
+    return [
+        {**BookmarkResponse.model_validate(bookmark.to_dict()).model_dump(), "score": score}
+        for bookmark, score in related
+    ]
+
+
+@router.get("/{bookmark_id}/duplicates")
+async def bookmark_duplicates(
+    bookmark_id: str,
+    min_similarity: Optional[float] = None,
+    session: AsyncSession = Depends(get_read_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取与指定书签内容近似重复的书签"""
+    bookmark = await get_bookmark_by_id(session, bookmark_id)
+    if bookmark is None:
+        raise HTTPException(status_code=404, detail="书签不存在")
+
+    matches = await find_near_duplicates(session, bookmark_id, min_similarity)
+    bookmarks = {}
+    if matches:
+        result = await session.execute(
+            select(Bookmark).where(Bookmark.id.in_([other_id for other_id, _ in matches]))
+        )
+        bookmarks = {b.id: b for b in result.scalars().all()}
+    return [
+        {**BookmarkResponse.model_validate(bookmarks[other_id].to_dict()).model_dump(), "similarity": similarity}
+        for other_id, similarity in matches
+        if other_id in bookmarks
+    ]
+
+
 @router.post("", response_model=BookmarkResponse, status_code=status.HTTP_201_CREATED)
 async def create_new_bookmark(
     data: BookmarkCreate,
-    session: AsyncSession = Depends(get_db),
+    enrich: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
-    """创建书签"""
-    bookmark = await create_bookmark(session, data)
+    """创建书签 (enrich=true 时由后台补全标题、图标、描述、标签和分类)"""
+    bookmark = await create_bookmark(data, enrich_later=enrich)
     return BookmarkResponse.model_validate(bookmark.to_dict())
 
 
@@ -88,11 +268,10 @@ async def create_new_bookmark(
 async def update_existing_bookmark(
     bookmark_id: str,
     data: BookmarkUpdate,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """更新书签"""
-    bookmark = await update_bookmark(session, bookmark_id, data)
+    bookmark = await update_bookmark(bookmark_id, data)
     if bookmark is None:
         raise HTTPException(status_code=404, detail="书签不存在")
 
@@ -102,11 +281,10 @@ async def update_existing_bookmark(
 @router.delete("/{bookmark_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_existing_bookmark(
     bookmark_id: str,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """删除书签"""
-    success = await delete_bookmark(session, bookmark_id)
+    success = await delete_bookmark(bookmark_id)
     if not success:
         raise HTTPException(status_code=404, detail="书签不存在")
 
@@ -114,47 +292,43 @@ async def delete_existing_bookmark(
 @router.post("/import")
 async def import_bookmarks_endpoint(
     data: BookmarkImport,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """批量导入书签"""
     bookmarks_data = [b.model_dump() for b in data.bookmarks]
-    count = await import_bookmarks(session, bookmarks_data)
+    count = await import_bookmarks(bookmarks_data)
     return {"imported": count}
 
 
 @router.post("/reorder")
 async def reorder_bookmarks_endpoint(
     data: ReorderRequest,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """重新排序书签"""
     bookmark_ids = data.get_ids()
     if not bookmark_ids:
         return {"success": True}
-    await reorder_bookmarks(session, data.category, bookmark_ids)
+    await reorder_bookmarks(data.category, bookmark_ids)
     return {"success": True}
 
 
 @router.post("/reorder-categories")
 async def reorder_categories_endpoint(
     data: CategoryReorderRequest,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """重新排序分类"""
     categories = data.get_categories()
     if not categories:
         return {"success": True}
-    await reorder_categories(session, categories)
+    await reorder_categories(categories)
     return {"success": True}
 
 
 @router.post("/categories")
 async def create_category_endpoint(
     data: dict,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """创建新分类"""
@@ -164,7 +338,7 @@ async def create_category_endpoint(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="分类名称不能为空"
         )
-    cat_order = await create_category(session, category_name)
+    cat_order = await create_category(category_name)
     return {"success": True, "category": cat_order.category, "order": cat_order.order}
 
 
@@ -172,7 +346,6 @@ async def create_category_endpoint(
 async def update_category_endpoint(
     category_name: str,
     data: dict,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """更新分类名称"""
@@ -182,7 +355,7 @@ async def update_category_endpoint(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="新分类名称不能为空"
         )
-    success = await update_category(session, category_name, new_name)
+    success = await update_category(category_name, new_name)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -194,11 +367,10 @@ async def update_category_endpoint(
 @router.delete("/categories/{category_name}")
 async def delete_category_endpoint(
     category_name: str,
-    session: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """删除分类"""
-    success = await delete_category(session, category_name)
+    success = await delete_category(category_name)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,38 @@
+"""
+网站图标 API
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_read_db
+from app.services.favicon import get_favicon
+
+router = APIRouter()
+
+# 图标按内容 hash 寻址，内容不会变化
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{icon_hash}")
+async def serve_favicon(
+    icon_hash: str,
+    request: Request,
+    session: AsyncSession = Depends(get_read_db)
+):
+    """获取本地缓存的网站图标"""
+    etag = f'"{icon_hash}"'
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    favicon = await get_favicon(session, icon_hash)
+    if favicon is None:
+        raise HTTPException(status_code=404, detail="图标不存在")
+
+    # SVG 可能包含脚本，禁止执行
+    headers["Content-Security-Policy"] = "default-src 'none'; style-src 'unsafe-inline'"
+    headers["X-Content-Type-Options"] = "nosniff"
+    return Response(content=favicon.data, media_type=favicon.content_type, headers=headers)
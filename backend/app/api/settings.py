@@ -7,7 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.settings import SiteSettings
 from app.schemas.settings import (
     SettingsResponse,
@@ -17,6 +17,7 @@ from app.schemas.settings import (
     MCPConfigResponse,
     MCPConfigUpdate,
 )
+from app.services.coordination import ai_config_changed
 from app.utils.security import get_current_user
 from app.version import get_version, get_latest_github_version, is_update_available
 
@@ -99,7 +100,7 @@ async def get_mcp_config_dict(session: AsyncSession) -> dict:
 
 @router.get("", response_model=SettingsResponse)
 async def get_settings(
-    session: AsyncSession = Depends(get_db)
+    session: AsyncSession = Depends(get_read_db)
 ):
     """获取站点设置"""
     settings = await get_settings_dict(session)
@@ -143,7 +144,7 @@ async def update_settings(
 
 @router.get("/ai", response_model=AIConfigResponse)
 async def get_ai_config(
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """获取 AI 配置"""
@@ -166,8 +167,9 @@ async def update_ai_config(
 
     await session.commit()
 
-    # 重新加载 AI 配置到运行时
+    # 重新加载 AI 配置到运行时，并通知其他工作进程
     await reload_ai_config(session)
+    await ai_config_changed()
 
     config = await get_ai_config_dict(session)
     return AIConfigResponse(**config)
@@ -198,17 +200,17 @@ async def reload_ai_config(session: AsyncSession):
 
     config = await get_ai_config_dict(session)
 
-    # 更新 LLM 模块的配置
-    llm.runtime_config = {
+    # 更新 LLM 模块的配置 (连接参数变化时重建客户端)
+    await llm.update_runtime_config({
         "api_key": config.get("ai_api_key") or None,
         "base_url": config.get("ai_base_url") or None,
         "model": config.get("ai_model") or "gpt-4o-mini",
-    }
+    })
 
 
 @router.get("/mcp", response_model=MCPConfigResponse)
 async def get_mcp_config(
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     current_user: dict = Depends(get_current_user)
 ):
     """获取 MCP 配置"""
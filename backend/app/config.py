@@ -16,6 +16,46 @@ class Settings(BaseSettings):
     # 数据库配置
     database_url: str = "sqlite+aiosqlite:///./litemark.db"
 
+    # SQLite 连接参数 (每个连接建立时通过 PRAGMA 设置，其他数据库忽略)
+    sqlite_journal_mode: str = "WAL"  # WAL 模式下读写互不阻塞；DELETE 为 SQLite 默认值
+    sqlite_synchronous: str = "NORMAL"  # WAL 模式下 NORMAL 只在检查点时同步磁盘，断电不会损坏数据库
+    sqlite_cache_size: int = -65536  # 页缓存大小，负数表示 KiB (默认 64MB)
+    sqlite_mmap_size: int = 268435456  # 内存映射读取的字节数 (0 表示关闭)
+    sqlite_busy_timeout: int = 5000  # 数据库被锁定时等待的毫秒数
+    sqlite_temp_store: str = "MEMORY"  # 临时表和排序使用内存
+    sqlite_pool_size: int = 5  # 保持打开的连接数
+    sqlite_read_pool_size: int = 10  # 只读连接池保持打开的连接数
+    sqlite_pool_overflow: int = 10  # 繁忙时额外允许的连接数
+
+    # PostgreSQL / MySQL 连接池 (SQLite 使用上面的 SQLITE_POOL_* 参数)
+    db_pool_size: int = 10  # 每个工作进程保持打开的连接数
+    db_pool_overflow: int = 20  # 繁忙时额外允许的连接数
+    db_pool_timeout: float = 30.0  # 等待空闲连接的秒数
+    db_pool_recycle: int = 1800  # 连接使用多少秒后重建 (避免被服务端或代理断开)
+    db_pool_pre_ping: bool = True  # 取出连接时先检测是否可用
+    pg_statement_cache_size: int = 100  # asyncpg 每个连接缓存的预编译语句数，经 PgBouncer 事务模式连接时设为 0
+
+    # 写入队列：书签和 AI 结果的修改由单个写入协程合并提交
+    write_queue_enabled: bool = True
+    write_queue_max_batch: int = 64  # 每个事务最多合并的写操作数
+    write_queue_max_delay_ms: float = 2.0  # 等待更多写操作加入同一事务的最长时间
+
+    # 服务进程 (python -m app.serve)
+    server_host: str = "127.0.0.1"
+    server_port: int = 8000
+    server_workers: int = 1  # 工作进程数，0 表示 CPU 核数
+    server_loop: str = "uvloop"  # 事件循环: uvloop / asyncio / auto
+    server_http: str = "httptools"  # HTTP 解析器: httptools / h11 / auto
+    server_graceful_timeout: int = 30  # 停止或重载时等待进行中请求完成的秒数
+    server_keepalive_timeout: int = 5  # 空闲 keep-alive 连接保持的秒数
+    server_max_requests: int = 0  # 工作进程处理多少请求后自动重启 (0 表示不限)
+
+    # 多进程协调 (定时任务租约、跨进程变更通知)
+    coordination_enabled: bool = False  # 未设置时由 app.serve 在启动多个工作进程时开启
+    coordination_poll_seconds: float = 2.0  # 读取其他进程变更的间隔，即其他进程看到变化的最长延迟
+    coordination_lease_seconds: int = 30  # 定时任务租约时长，持有进程异常退出后最多这么久由其他进程接替
+    coordination_event_retention_minutes: int = 60  # 变更事件保留时长
+
     # JWT 配置
     jwt_secret: str = "your-secret-key-change-in-production"
     jwt_algorithm: str = "HS256"
@@ -29,6 +69,89 @@ class Settings(BaseSettings):
     openai_base_url: Optional[str] = None  # 支持代理
     openai_model: str = "gpt-4o-mini"
 
+    # LLM 连接池配置
+    llm_http2: bool = True
+    llm_max_connections: int = 20
+    llm_keepalive_expiry: float = 60.0
+    llm_timeout: float = 120.0
+
+    # LLM 响应缓存
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_hours: int = 168
+    llm_cache_max_entries: int = 5000
+    llm_cache_max_mb: int = 64  # 缓存响应总大小上限
+
+    # AI 批量处理
+    ai_classify_batch_size: int = 20  # 每次 LLM 请求打包分类的书签数
+    ai_scrape_concurrency: int = 8  # 网页抓取并发数
+    ai_llm_concurrency: int = 4  # LLM 请求并发数
+    ai_rpm_limit: int = 0  # 每分钟请求数上限 (0 表示不限制)
+    ai_tpm_limit: int = 0  # 每分钟 token 数上限 (0 表示不限制)
+    ai_max_retries: int = 4  # 429/5xx 最大重试次数
+
+    # 语义搜索
+    ai_search_backend: str = "hashing"  # hashing (本地向量化，无网络请求) / openai (OpenAI 兼容 embedding 接口)
+    ai_search_dim: int = 512  # hashing 向量维度
+    ai_embedding_model: str = "text-embedding-3-small"
+    ai_search_min_score: float = 0.1  # 低于该相似度的结果不返回
+
+    # 相关书签
+    related_enabled: bool = True
+    related_top_k: int = 10  # 每个书签保存的相关书签数
+    related_min_score: float = 0.15  # 低于该相关度的书签不保存
+
+    # 本地分类器
+    ai_local_classifier: bool = True  # 先用已有书签训练的本地模型分类，置信度不足时再请求 LLM
+    ai_local_classifier_threshold: float = 0.95  # 本地分类结果直接采用的最低置信度
+    ai_local_classifier_min_samples: int = 5  # 分类下至少有多少个书签才参与本地预测
+
+    # AI 任务队列
+    ai_job_chunk_size: int = 50  # 每次提交处理的书签数
+    ai_job_stale_seconds: int = 120  # 心跳超时后任务可被其他进程接管
+    ai_job_poll_interval: float = 5.0  # 空闲时轮询新任务的间隔 (秒)
+    ai_job_concurrency: int = 2  # 每个进程同时执行的任务数
+    ai_job_retention_hours: int = 72  # 已结束任务保留时间
+
+    # 网页抓取配置
+    scraper_http2: bool = True
+    scraper_max_connections: int = 100
+    scraper_max_in_flight: int = 32  # 全局同时进行的抓取请求数
+    scraper_per_host_concurrency: int = 2  # 单个主机同时进行的请求数
+    scraper_host_delay: float = 0.5  # 同一主机相邻请求的最小间隔 (秒)
+    scraper_metadata_max_bytes: int = 65536  # 只取元信息时最多读取的字节数
+    scraper_extractor: str = "lxml"  # 正文提取器: lxml / bs4
+
+    # 链接健康检查
+    link_check_enabled: bool = True
+    link_check_interval_minutes: int = 60
+    link_check_time_budget: int = 300  # 每次运行的最长时间 (秒)
+    link_check_batch_size: int = 100
+    link_check_concurrency: int = 16
+    link_check_recheck_hours: int = 168  # 同一链接的复查间隔
+    link_check_timeout: float = 10.0
+
+    # 近似重复检测
+    duplicate_scan_enabled: bool = True
+    duplicate_scan_interval_minutes: int = 60
+    duplicate_scan_time_budget: int = 300  # 每次运行的最长时间 (秒)
+    duplicate_scan_batch_size: int = 100
+    duplicate_scan_concurrency: int = 8
+    duplicate_min_text_length: int = 200  # 标题加正文少于该长度时不计算签名
+    duplicate_retry_hours: int = 168  # 内容不足的书签多久后重新抓取
+    duplicate_min_similarity: float = 0.7  # 判定为近似重复的最低 Jaccard 相似度
+
+    # 网站图标缓存
+    favicon_prefetch: bool = True  # 创建和导入书签时下载图标
+    favicon_max_bytes: int = 262144
+    favicon_retry_hours: int = 24  # 下载失败后多久重试
+    favicon_concurrency: int = 8
+
+    # 网页抓取缓存
+    page_cache_enabled: bool = True
+    page_cache_ttl_hours: int = 24  # 过期后用 ETag/Last-Modified 重新验证
+    page_cache_max_entries: int = 10000
+    page_cache_max_mb: int = 256  # 缓存内容总大小上限 (网页大小差别很大，只限条目数不够)
+
     # WebDAV 备份配置
     webdav_url: Optional[str] = None
     webdav_username: Optional[str] = None
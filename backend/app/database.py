@@ -1,20 +1,190 @@
 """
 数据库连接和会话管理
 """
+from typing import List, Tuple
+
+from sqlalchemy import event, inspect, make_url, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.config import get_settings
 
 settings = get_settings()
 
+
+def is_sqlite_file() -> bool:
+    """是否为 SQLite 文件数据库 (内存数据库只属于当前进程)"""
+    url = make_url(settings.database_url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:") \
+        and url.query.get("mode") != "memory"
+
+
+def is_postgresql() -> bool:
+    return make_url(settings.database_url).get_backend_name() == "postgresql"
+
+
+def _pool_options(pool_size: int) -> dict:
+    if is_postgresql():
+        return _postgresql_options()
+    if not is_sqlite_file():
+        return {}
+    # aiosqlite 默认每个会话新建连接 (NullPool)，连接池复用连接和已设置的 PRAGMA
+    return {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": settings.sqlite_pool_overflow,
+    }
+
+
+def _postgresql_options() -> dict:
+    """PostgreSQL 连接池和 asyncpg 预编译语句缓存"""
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_pool_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if make_url(settings.database_url).get_driver_name() == "asyncpg":
+        cache_size = max(0, settings.pg_statement_cache_size)
+        options["connect_args"] = {
+            # SQLAlchemy 层按 SQL 文本缓存预编译语句，asyncpg 层缓存语句元数据；
+            # 经 PgBouncer 事务模式连接时两者都需设为 0
+            "prepared_statement_cache_size": cache_size,
+            "statement_cache_size": cache_size,
+            "server_settings": {"application_name": settings.app_name},
+        }
+    return options
+
+
 # 创建异步引擎
 engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
     future=True,
+    **_pool_options(settings.sqlite_pool_size),
 )
 
+# 只读引擎：SQLite 文件数据库使用独立的只读连接池；PostgreSQL 共用连接池，事务以 READ ONLY 开启；
+# 其他情况与 engine 相同
+if is_sqlite_file():
+    read_engine = create_async_engine(
+        settings.database_url,
+        echo=settings.debug,
+        future=True,
+        **_pool_options(settings.sqlite_read_pool_size),
+    )
+elif is_postgresql():
+    read_engine = engine.execution_options(postgresql_readonly=True)
+else:
+    read_engine = engine
+
+# 写入引擎：SQLite 文件数据库使用单独的一个连接，由写入队列独占 (见 app/services/write_queue.py)
+if is_sqlite_file():
+    write_engine = create_async_engine(
+        settings.database_url,
+        echo=settings.debug,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+else:
+    write_engine = engine
+
+# SQLite PRAGMA 的可选值 (字符串参数不能通过占位符传入，先校验再拼接)
+SQLITE_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SQLITE_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+SQLITE_TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+
+def is_sqlite() -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def _choice(name: str, value: str, choices: Tuple[str, ...]) -> str:
+    value = value.strip().upper()
+    if value not in choices:
+        raise ValueError(f"SQLITE_{name.upper()} 无效: {value}，可选值 {', '.join(choices)}")
+    return value
+
+
+def sqlite_pragmas() -> List[Tuple[str, str]]:
+    """根据配置生成连接建立时执行的 PRAGMA"""
+    return [
+        # busy_timeout 放在最前面，切换日志模式时遇到锁也会等待
+        ("busy_timeout", str(int(settings.sqlite_busy_timeout))),
+        ("journal_mode", _choice("journal_mode", settings.sqlite_journal_mode, SQLITE_JOURNAL_MODES)),
+        ("synchronous", _choice("synchronous", settings.sqlite_synchronous, SQLITE_SYNCHRONOUS_LEVELS)),
+        ("cache_size", str(int(settings.sqlite_cache_size))),
+        ("mmap_size", str(int(settings.sqlite_mmap_size))),
+        ("temp_store", _choice("temp_store", settings.sqlite_temp_store, SQLITE_TEMP_STORES)),
+    ]
+
+
+def install_sqlite_pragmas(sync_engine, pragmas: List[Tuple[str, str]]):
+    """注册连接事件：每个新连接建立时执行 PRAGMA (连接池中的连接会复用这些设置)"""
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def install_read_only_transactions(sync_engine):
+    """
+    只读连接：禁止写入 (query_only)，每个会话在 BEGIN DEFERRED 事务中读取同一快照
+
+    pysqlite 默认不为 SELECT 开启事务，这里关闭驱动的事务管理，改为在会话开始时显式 BEGIN。
+    WAL 模式下读事务不获取写锁，不会与写入互相阻塞。
+    """
+
+    @event.listens_for(sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sync_engine, "begin")
+    def _begin_deferred(conn):
+        conn.exec_driver_sql("BEGIN DEFERRED")
+
+
+if is_sqlite():
+    install_sqlite_pragmas(engine.sync_engine, sqlite_pragmas())
+
+def install_immediate_transactions(sync_engine):
+    """
+    写连接：事务开始时即获取写锁 (BEGIN IMMEDIATE)，并支持 SAVEPOINT
+
+    pysqlite 自带的事务管理与 SAVEPOINT 不兼容，这里关闭驱动的事务管理，由引擎显式 BEGIN。
+    """
+
+    @event.listens_for(sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sync_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+if write_engine is not engine:
+    install_sqlite_pragmas(write_engine.sync_engine, sqlite_pragmas())
+    install_immediate_transactions(write_engine.sync_engine)
+
+if is_sqlite_file():
+    # 日志模式保存在数据库文件中，由写连接设置
+    install_sqlite_pragmas(
+        read_engine.sync_engine,
+        [pragma for pragma in sqlite_pragmas() if pragma[0] != "journal_mode"] + [("query_only", "ON")],
+    )
+    install_read_only_transactions(read_engine.sync_engine)
+
+
 # 创建异步会话工厂
 async_session_maker = async_sessionmaker(
     engine,
@@ -22,6 +192,20 @@ async_session_maker = async_sessionmaker(
     expire_on_commit=False,
 )
 
+# 写入会话工厂 (只由写入队列使用)
+write_session_maker = async_sessionmaker(
+    write_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+# 只读会话工厂 (不提交，用于 GET 接口和只读查询)
+read_session_maker = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
 
 class Base(DeclarativeBase):
     """SQLAlchemy 基类"""
@@ -41,8 +225,77 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+async def get_read_db() -> AsyncSession:
+    """获取只读数据库会话 (依赖注入)，结束时回滚，不提交也不获取写锁"""
+    async with read_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+def _add_missing_columns(sync_conn):
+    """为已存在的表补充新增的可空列 (create_all 不会修改已有表)"""
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(
+                f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'
+            ))
+            print(f"✓ 数据库升级: {table.name}.{column.name}")
+
+        # 新增列上的索引
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(sync_conn, checkfirst=True)
+
+
 async def init_db():
     """初始化数据库表"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+
+    if is_sqlite():
+        await report_sqlite_pragmas()
+    if is_postgresql():
+        from app.services.keyword_search import create_postgresql_search_indexes
+
+        await create_postgresql_search_indexes()
+
+
+async def dispose_engines():
+    """关闭所有引擎的连接池"""
+    for item in {id(e.sync_engine.pool): e for e in (engine, read_engine, write_engine)}.values():
+        await item.dispose()
+
+
+async def get_sqlite_pragmas() -> dict:
+    """读取当前连接实际生效的 PRAGMA"""
+    values = {}
+    async with engine.connect() as conn:
+        for name, _ in sqlite_pragmas():
+            values[name] = (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+    # 数值形式的枚举参数转换为名称
+    for name, choices in (("synchronous", SQLITE_SYNCHRONOUS_LEVELS), ("temp_store", SQLITE_TEMP_STORES)):
+        if isinstance(values.get(name), int) and 0 <= values[name] < len(choices):
+            values[name] = choices[values[name]]
+    return values
+
+
+async def report_sqlite_pragmas():
+    """启动时输出 SQLite 实际生效的参数 (内存数据库等不支持 WAL 时可以看出)"""
+    values = await get_sqlite_pragmas()
+    print("✓ SQLite 参数: " + ", ".join(f"{name}={value}" for name, value in values.items()))
+    if str(values.get("journal_mode", "")).upper() != settings.sqlite_journal_mode.strip().upper():
+        print(f"⚠ SQLite 日志模式为 {values.get('journal_mode')}，未能切换到 {settings.sqlite_journal_mode}")
 
@@ -1,6 +1,7 @@
 """
 FastAPI 应用入口
 """
+import asyncio
 import contextlib
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
@@ -8,9 +9,17 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
 from app.database import init_db
-from app.api import auth, bookmarks, settings as settings_api, backup, ai, oauth
+from app.api import auth, bookmarks, settings as settings_api, backup, ai, oauth, favicons
 from app.services.auth import init_admin
-from app.services.scheduler import init_scheduler, shutdown_scheduler
+from app.services.coordination import start_coordination, stop_coordination
+from app.services.write_queue import stop_write_queue
+from app.services.ai.llm import close_openai_client
+from app.services.ai.job_queue import start_worker, stop_worker
+from app.services.ai.vector_index import warm_up as warm_up_search_index
+from app.services.ai.local_classifier import warm_up as warm_up_local_classifier
+from app.services.related import warm_up as warm_up_related
+from app.utils.page_cache import flush_hits as flush_page_cache_hits
+from app.utils.web_scraper import close_scraper_client
 from app.version import VERSION, get_version_info
 
 settings = get_settings()
@@ -24,7 +33,13 @@ async def lifespan(app: FastAPI):
     await init_db()
     await init_admin()
     await load_ai_config()
-    await init_scheduler()
+    await start_coordination()
+    start_worker()
+    warm_up_tasks = [
+        asyncio.create_task(warm_up_search_index()),
+        asyncio.create_task(warm_up_local_classifier()),
+        asyncio.create_task(warm_up_related()),
+    ]
 
     async with contextlib.AsyncExitStack() as stack:
         from app.mcp_server import mcp
@@ -36,7 +51,14 @@ async def lifespan(app: FastAPI):
             yield
         finally:
             # 关闭时
-            shutdown_scheduler()
+            for task in warm_up_tasks:
+                task.cancel()
+            await stop_worker()
+            await stop_coordination()
+            await flush_page_cache_hits()
+            await stop_write_queue()
+            await close_openai_client()
+            await close_scraper_client()
             print("关闭 LiteMark API...")
 
 
@@ -49,11 +71,11 @@ async def load_ai_config():
     async with async_session_maker() as session:
         try:
             config = await get_ai_config_dict(session)
-            llm.runtime_config = {
+            await llm.update_runtime_config({
                 "api_key": config.get("ai_api_key") or None,
                 "base_url": config.get("ai_base_url") or None,
                 "model": config.get("ai_model") or None,
-            }
+            })
             print(f"✓ 加载 AI 配置: {config.get('ai_model', 'default')}")
         except Exception as e:
             print(f"⚠ 加载 AI 配置失败: {e}")
@@ -83,6 +105,7 @@ app.include_router(bookmarks.router, prefix="/api/bookmarks", tags=["书签"])
 app.include_router(settings_api.router, prefix="/api/settings", tags=["设置"])
 app.include_router(backup.router, prefix="/api/backup", tags=["备份"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI"])
+app.include_router(favicons.router, prefix="/api/favicons", tags=["图标"])
 app.include_router(oauth.router, tags=["OAuth"])
 
 from app.mcp_server import create_mcp_asgi_app
@@ -11,9 +11,11 @@ from mcp.server.fastmcp import FastMCP
 from mcp.server.transport_security import TransportSecuritySettings
 from sqlalchemy import select
 
-from app.database import async_session_maker, init_db
+from app.database import init_db, read_session_maker
 from app.models.settings import SiteSettings
 from app.schemas.bookmark import BookmarkCreate, BookmarkUpdate
+from app.services.ai.enrichment import create_enriched_bookmark
+from app.services.ai.llm import get_effective_config
 from app.services.bookmark import (
     create_bookmark,
     create_category,
@@ -27,6 +29,7 @@ from app.services.bookmark import (
     update_bookmark,
     update_category,
 )
+from app.services.keyword_search import keyword_search
 from app.utils.security import decode_token
 
 
@@ -69,23 +72,20 @@ async def list_litemark_bookmarks(
 ) -> dict[str, Any]:
     """List LiteMark bookmarks, optionally filtered by category and text query."""
     limit = max(1, min(limit, 1000))
-    query_text = query.lower().strip() if query else None
 
-    async with async_session_maker() as session:
-        bookmarks = await get_bookmarks(session, include_hidden=include_hidden)
+    async with read_session_maker() as session:
+        if query and query.strip():
+            bookmarks = await keyword_search(
+                session, query, include_hidden=include_hidden, category=category, limit=limit
+            )
+        else:
+            bookmarks = await get_bookmarks(session, include_hidden=include_hidden)
 
     items = []
     for bookmark in bookmarks:
         item = _serialize_bookmark(bookmark)
         if category is not None and item.get("category") != category:
             continue
-        if query_text:
-            haystack = " ".join(
-                str(item.get(field) or "")
-                for field in ("title", "url", "category", "description", "tags")
-            ).lower()
-            if query_text not in haystack:
-                continue
         items.append(item)
         if len(items) >= limit:
             break
@@ -96,7 +96,7 @@ async def list_litemark_bookmarks(
 @mcp.tool()
 async def get_litemark_bookmark(bookmark_id: str) -> dict[str, Any]:
     """Get one LiteMark bookmark by id."""
-    async with async_session_maker() as session:
+    async with read_session_maker() as session:
         bookmark = await get_bookmark_by_id(session, bookmark_id)
         if bookmark is None:
             return {"success": False, "error": "书签不存在"}
@@ -127,8 +127,40 @@ async def add_litemark_bookmark(
         visible=visible,
     )
 
-    async with async_session_maker() as session:
-        bookmark = await create_bookmark(session, data)
+    bookmark = await create_bookmark(data)
+    return {"success": True, "bookmark": _serialize_bookmark(bookmark)}
+
+
+@mcp.tool()
+async def quick_add_litemark_bookmark(
+    url: str,
+    title: Optional[str] = None,
+    category: Optional[str] = None,
+    enrich_later: bool = False,
+) -> dict[str, Any]:
+    """Add a LiteMark bookmark from a URL; AI fills in title, description, tags and category.
+
+    Set enrich_later to return immediately and let a background job fill in the details.
+    """
+    url_text = url.strip()
+    if not url_text:
+        return {"success": False, "error": "URL 不能为空"}
+
+    config = get_effective_config()
+    if not config["api_key"] or config["api_key"] == "sk-no-key-required":
+        return {"success": False, "error": "AI 未配置。请在后台设置中配置 AI API"}
+
+    async with read_session_maker() as session:
+        try:
+            bookmark = await create_enriched_bookmark(
+                session,
+                url_text,
+                title=title.strip() if title and title.strip() else None,
+                category=category.strip() if category and category.strip() else None,
+                enrich_later=enrich_later,
+            )
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
         return {"success": True, "bookmark": _serialize_bookmark(bookmark)}
 
 
@@ -158,18 +190,16 @@ async def update_litemark_bookmark(
     if payload.get("title") == "" or payload.get("url") == "":
         return {"success": False, "error": "标题和 URL 不能为空"}
 
-    async with async_session_maker() as session:
-        bookmark = await update_bookmark(session, bookmark_id, BookmarkUpdate(**payload))
-        if bookmark is None:
-            return {"success": False, "error": "书签不存在"}
-        return {"success": True, "bookmark": _serialize_bookmark(bookmark)}
+    bookmark = await update_bookmark(bookmark_id, BookmarkUpdate(**payload))
+    if bookmark is None:
+        return {"success": False, "error": "书签不存在"}
+    return {"success": True, "bookmark": _serialize_bookmark(bookmark)}
 
 
 @mcp.tool()
 async def delete_litemark_bookmark(bookmark_id: str) -> dict[str, Any]:
     """Delete a LiteMark bookmark by id."""
-    async with async_session_maker() as session:
-        success = await delete_bookmark(session, bookmark_id)
+    success = await delete_bookmark(bookmark_id)
     if not success:
         return {"success": False, "error": "书签不存在"}
     return {"success": True, "deleted_id": bookmark_id}
@@ -178,7 +208,7 @@ async def delete_litemark_bookmark(bookmark_id: str) -> dict[str, Any]:
 @mcp.tool()
 async def list_litemark_categories() -> dict[str, Any]:
     """List LiteMark categories in display order."""
-    async with async_session_maker() as session:
+    async with read_session_maker() as session:
         categories = await get_categories(session)
     return {"categories": categories}
 
@@ -190,13 +220,12 @@ async def add_litemark_category(category: str) -> dict[str, Any]:
     if not category_name:
         return {"success": False, "error": "分类名称不能为空"}
 
-    async with async_session_maker() as session:
-        cat_order = await create_category(session, category_name)
-        return {
-            "success": True,
-            "category": cat_order.category,
-            "order": cat_order.order,
-        }
+    cat_order = await create_category(category_name)
+    return {
+        "success": True,
+        "category": cat_order.category,
+        "order": cat_order.order,
+    }
 
 
 @mcp.tool()
@@ -207,8 +236,7 @@ async def rename_litemark_category(old_name: str, new_name: str) -> dict[str, An
     if not old_category or not new_category:
         return {"success": False, "error": "分类名称不能为空"}
 
-    async with async_session_maker() as session:
-        success = await update_category(session, old_category, new_category)
+    success = await update_category(old_category, new_category)
     if not success:
         return {"success": False, "error": "分类不存在或新名称已被使用"}
     return {"success": True, "category": new_category}
@@ -221,8 +249,7 @@ async def delete_litemark_category(category: str) -> dict[str, Any]:
     if not category_name:
         return {"success": False, "error": "分类名称不能为空"}
 
-    async with async_session_maker() as session:
-        success = await delete_category(session, category_name)
+    success = await delete_category(category_name)
     if not success:
         return {"success": False, "error": "分类不存在"}
     return {"success": True, "category": category_name}
@@ -234,8 +261,7 @@ async def reorder_litemark_bookmarks(
     bookmark_ids: list[str],
 ) -> dict[str, Any]:
     """Set display order for bookmarks in a category using an ordered id list."""
-    async with async_session_maker() as session:
-        await reorder_bookmarks_service(session, category, bookmark_ids)
+    await reorder_bookmarks_service(category, bookmark_ids)
     return {"success": True, "ordered_ids": bookmark_ids}
 
 
@@ -243,8 +269,7 @@ async def reorder_litemark_bookmarks(
 async def reorder_litemark_categories(categories: list[str]) -> dict[str, Any]:
     """Set category display order using an ordered category-name list."""
     clean_categories = [category.strip() for category in categories if category.strip()]
-    async with async_session_maker() as session:
-        await reorder_categories_service(session, clean_categories)
+    await reorder_categories_service(clean_categories)
     return {"success": True, "categories": clean_categories}
 
 
@@ -306,7 +331,7 @@ class MCPAuthMiddleware:
         await self.app(scope, receive, send)
 
     async def _load_config(self) -> dict[str, str | bool]:
-        async with async_session_maker() as session:
+        async with read_session_maker() as session:
             result = await session.execute(
                 select(SiteSettings).where(
                     SiteSettings.key.in_(
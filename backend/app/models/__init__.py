@@ -5,10 +5,30 @@ from app.models.bookmark import Bookmark
 from app.models.category import CategoryOrder
 from app.models.settings import SiteSettings
 from app.models.user import AdminUser
+from app.models.llm_cache import LLMCacheEntry
+from app.models.ai_job import AIJob, AIJobItem
+from app.models.page_cache import PageCacheEntry
+from app.models.favicon import Favicon, FaviconSource
+from app.models.embedding import BookmarkEmbedding
+from app.models.signature import BookmarkSignature, BookmarkLSHBucket
+from app.models.related import BookmarkRelated
+from app.models.coordination import ServiceLease, ChangeEvent
 
 __all__ = [
     "Bookmark",
     "CategoryOrder",
     "SiteSettings",
     "AdminUser",
+    "LLMCacheEntry",
+    "AIJob",
+    "AIJobItem",
+    "PageCacheEntry",
+    "Favicon",
+    "FaviconSource",
+    "BookmarkEmbedding",
+    "BookmarkSignature",
+    "BookmarkLSHBucket",
+    "BookmarkRelated",
+    "ServiceLease",
+    "ChangeEvent",
 ]
@@ -0,0 +1,98 @@
+"""
+AI 批量任务模型
+"""
+import json
+from datetime import datetime
+from sqlalchemy import String, Text, Boolean, Integer, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+import uuid
+
+from app.database import Base
+
+
+class AIJob(Base):
+    """AI 批量任务表"""
+
+    __tablename__ = "ai_jobs"
+
+    id: Mapped[str] = mapped_column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4())
+    )
+    operation: Mapped[str] = mapped_column(String(255), nullable=False)  # 如 "summarize+classify"
+    status: Mapped[str] = mapped_column(
+        String(32), nullable=False, default="pending", index=True
+    )  # pending, running, completed, failed, cancelled
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    errors: Mapped[str] = mapped_column(Text, nullable=True)  # JSON 列表
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    # 执行该任务的工作进程及心跳 (心跳超时后可被其他进程接管)
+    worker_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=func.now(),
+        server_default=func.now()
+    )
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    @property
+    def operations(self) -> list:
+        return self.operation.split("+")
+
+    @property
+    def error_list(self) -> list:
+        return json.loads(self.errors) if self.errors else []
+
+    @property
+    def progress(self) -> float:
+        """进度百分比"""
+        if not self.total:
+            return 0
+        return round(((self.processed or 0) + (self.failed or 0)) / self.total * 100, 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "task_id": self.id,
+            "operation": self.operation,
+            "total": self.total or 0,
+            "processed": self.processed or 0,
+            "failed": self.failed or 0,
+            "progress": self.progress,
+            "status": self.status,
+            "errors": self.error_list[:10],  # 只返回前10个错误
+            "cancel_requested": bool(self.cancel_requested),
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class AIJobItem(Base):
+    """AI 批量任务明细表 (每个书签每个操作一行)"""
+
+    __tablename__ = "ai_job_items"
+    __table_args__ = (
+        Index("ix_ai_job_items_job_status", "job_id", "operation", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    bookmark_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    operation: Mapped[str] = mapped_column(String(32), nullable=False)
+    status: Mapped[str] = mapped_column(
+        String(32), nullable=False, default="pending"
+    )  # pending, done, failed
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=func.now(),
+        onupdate=func.now(),
+        server_default=func.now()
+    )
@@ -26,6 +26,19 @@ class Bookmark(Base):
     visible: Mapped[bool] = mapped_column(Boolean, default=True)
     order: Mapped[int] = mapped_column(Integer, default=0)
     tags: Mapped[str] = mapped_column(Text, nullable=True)  # 标签 (JSON)
+    favicon: Mapped[str] = mapped_column(Text, nullable=True)
+    favicon_hash: Mapped[str] = mapped_column(String(64), nullable=True)  # 本地缓存的图标
+    enrich_status: Mapped[str] = mapped_column(String(32), nullable=True)  # pending, done, failed
+
+    # 链接健康检查
+    link_status_code: Mapped[int] = mapped_column(Integer, nullable=True)
+    link_final_url: Mapped[str] = mapped_column(Text, nullable=True)  # 跟随重定向后的地址
+    link_latency_ms: Mapped[int] = mapped_column(Integer, nullable=True)
+    link_error: Mapped[str] = mapped_column(String(255), nullable=True)  # 连接失败、超时等
+    link_checked_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+
+    # 相关书签最近一次计算时间 (为空表示尚未计算)
+    related_computed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
     # 时间戳
     created_at: Mapped[datetime] = mapped_column(
@@ -51,6 +64,14 @@ class Bookmark(Base):
             "visible": self.visible,
             "order": self.order,
             "tags": self.tags,
+            "favicon": self.favicon,
+            "favicon_hash": self.favicon_hash,
+            "enrich_status": self.enrich_status,
+            "link_status_code": self.link_status_code,
+            "link_final_url": self.link_final_url,
+            "link_latency_ms": self.link_latency_ms,
+            "link_error": self.link_error,
+            "link_checked_at": self.link_checked_at.isoformat() if self.link_checked_at else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -0,0 +1,37 @@
+"""
+多进程协调模型
+"""
+from datetime import datetime
+from sqlalchemy import String, Text, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class ServiceLease(Base):
+    """租约表 (同一时间只有一个进程持有，持有者需在到期前续约)"""
+
+    __tablename__ = "service_leases"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(255), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class ChangeEvent(Base):
+    """变更事件表 (各进程轮询其他进程产生的事件，更新自己的内存状态)"""
+
+    __tablename__ = "change_events"
+    # 清理旧事件后 ID 也不能重复使用，否则轮询会漏掉新事件
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    topic: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=True)  # JSON
+    origin: Mapped[str] = mapped_column(String(255), nullable=False)  # 产生事件的进程
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=func.now(),
+        server_default=func.now(),
+        index=True,
+    )
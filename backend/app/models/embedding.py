@@ -0,0 +1,27 @@
+"""
+书签向量模型
+"""
+from datetime import datetime
+from sqlalchemy import String, Integer, DateTime, LargeBinary, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class BookmarkEmbedding(Base):
+    """书签向量表 (标题、标签和描述的 float32 向量，用于语义搜索)"""
+
+    __tablename__ = "bookmark_embeddings"
+
+    bookmark_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    model: Mapped[str] = mapped_column(String(255), nullable=False)  # 如 hashing-256、openai:text-embedding-3-small
+    text_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # 文本变化时重新计算
+    dim: Mapped[int] = mapped_column(Integer, nullable=False)
+    vector: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=func.now(),
+        onupdate=func.now(),
+        server_default=func.now()
+    )
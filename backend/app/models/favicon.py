@@ -0,0 +1,36 @@
+"""
+网站图标模型
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, DateTime, LargeBinary, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class Favicon(Base):
+    """图标内容表 (按内容 sha256 去重)"""
+
+    __tablename__ = "favicons"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    content_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=func.now(),
+        server_default=func.now()
+    )
+
+
+class FaviconSource(Base):
+    """图标地址 → 图标内容，记录下载失败以免反复请求"""
+
+    __tablename__ = "favicon_sources"
+
+    url: Mapped[str] = mapped_column(String(2048), primary_key=True)
+    hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # 为空表示下载失败
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
@@ -0,0 +1,29 @@
+"""
+LLM 响应缓存模型
+"""
+from datetime import datetime
+from sqlalchemy import String, Text, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class LLMCacheEntry(Base):
+    """LLM 响应缓存表 (按模型 + 提示词内容寻址)"""
+
+    __tablename__ = "llm_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(255), nullable=False)
+    response: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    tokens: Mapped[int] = mapped_column(Integer, default=0)  # 生成该响应消耗的 token
+    size: Mapped[int] = mapped_column(Integer, default=0)  # 响应字节数
+    hit_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=func.now(),
+        server_default=func.now()
+    )
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
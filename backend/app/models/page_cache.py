@@ -0,0 +1,35 @@
+"""
+网页抓取缓存模型
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Text, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class PageCacheEntry(Base):
+    """网页抓取结果缓存表 (按 URL 寻址，保存校验信息用于条件请求)"""
+
+    __tablename__ = "page_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # URL 的 sha256
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    title: Mapped[str] = mapped_column(Text, default="")
+    description: Mapped[str] = mapped_column(Text, default="")
+    content: Mapped[str] = mapped_column(Text, default="")  # 清洗后的正文
+    favicon: Mapped[str] = mapped_column(Text, default="")
+    etag: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    size: Mapped[int] = mapped_column(Integer, default=0)  # 缓存内容字节数
+    hit_count: Mapped[int] = mapped_column(Integer, default=0)
+    revalidated_count: Mapped[int] = mapped_column(Integer, default=0)  # 304 次数
+
+    fetched_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=func.now(),
+        server_default=func.now()
+    )
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
@@ -0,0 +1,17 @@
+"""
+相关书签模型
+"""
+from sqlalchemy import String, Float
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class BookmarkRelated(Base):
+    """预先计算的相关书签 (每个书签保存得分最高的 k 个)"""
+
+    __tablename__ = "bookmark_related"
+
+    bookmark_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    related_id: Mapped[str] = mapped_column(String(255), primary_key=True, index=True)
+    score: Mapped[float] = mapped_column(Float, nullable=False)
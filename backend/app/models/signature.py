@@ -0,0 +1,32 @@
+"""
+书签内容签名模型
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, BigInteger, DateTime, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class BookmarkSignature(Base):
+    """书签网页内容的 MinHash 签名，用于近似重复检测"""
+
+    __tablename__ = "bookmark_signatures"
+
+    bookmark_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    url: Mapped[str] = mapped_column(String(2048), nullable=False)  # 计算签名时的书签地址 (超长时截断)
+    url_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # 完整地址的 SHA-256，地址变化后重新计算
+    minhash: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)  # uint32 数组，为空表示内容不足
+    shingle_count: Mapped[int] = mapped_column(Integer, default=0)
+    computed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class BookmarkLSHBucket(Base):
+    """MinHash 分段 (band) 的桶，同一个桶内的书签是近似重复的候选"""
+
+    __tablename__ = "bookmark_lsh_buckets"
+
+    band: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    bookmark_id: Mapped[str] = mapped_column(String(255), primary_key=True, index=True)
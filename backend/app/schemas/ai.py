@@ -50,12 +50,14 @@ class BatchProcessResponse(BaseModel):
 class QuickAddRequest(BaseModel):
     """快速添加书签请求 - 只需 URL"""
     url: str
+    enrich_later: bool = False  # 立即返回，后台补全
 
 
 class QuickAddWithTitleRequest(BaseModel):
     """快速添加书签请求 - URL + 标题"""
     url: str
     title: str
+    enrich_later: bool = False
 
 
 class QuickAddWithCategoryRequest(BaseModel):
@@ -63,6 +65,7 @@ class QuickAddWithCategoryRequest(BaseModel):
     url: str
     title: str
     category: str
+    enrich_later: bool = False
 
 
 class QuickAddResponse(BaseModel):
@@ -74,3 +77,72 @@ class QuickAddResponse(BaseModel):
     category: str
     tags: str
     visible: bool = True
+    enrich_status: Optional[str] = None  # enrich_later 时为 pending
+
+
+class SearchRequest(BaseModel):
+    """语义搜索请求"""
+    query: str
+    limit: int = 10
+
+
+class SearchResult(BaseModel):
+    """搜索结果"""
+    id: str
+    title: str
+    url: str
+    category: Optional[str] = None
+    description: Optional[str] = None
+    score: float  # 余弦相似度
+
+
+class SearchResponse(BaseModel):
+    """语义搜索响应"""
+    results: List[SearchResult]
+
+
+class OrganizeProposeRequest(BaseModel):
+    """分类整理建议请求"""
+    category: str = "默认分类"  # 待整理的分类
+    num_clusters: Optional[int] = None  # 分组数，为空时按书签数估计
+    sample_size: int = 5  # 每组返回的代表性书签数
+    name_clusters: bool = True  # 是否请求 AI 为分组命名
+
+
+class OrganizeSample(BaseModel):
+    """分组的代表性书签"""
+    id: str
+    title: str
+    url: str
+
+
+class OrganizeCluster(BaseModel):
+    """分组建议"""
+    bookmark_ids: List[str]
+    size: int
+    cohesion: float  # 成员与分组中心的平均相似度
+    suggested_name: str
+    confidence: Optional[float] = None  # AI 命名的置信度，未命名时为空
+    top_terms: List[str]
+    top_domains: List[str]
+    samples: List[OrganizeSample]
+
+
+class OrganizeProposeResponse(BaseModel):
+    """分类整理建议响应"""
+    category: str
+    total: int
+    clusters: List[OrganizeCluster]
+    unclustered_ids: List[str]
+    llm_calls: int
+
+
+class OrganizeGroup(BaseModel):
+    """确认后的分组"""
+    category: str
+    bookmark_ids: List[str]
+
+
+class OrganizeApplyRequest(BaseModel):
+    """应用分类整理请求"""
+    groups: List[OrganizeGroup]
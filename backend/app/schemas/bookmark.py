@@ -13,6 +13,7 @@ class BookmarkBase(BaseModel):
     category: Optional[str] = None
     description: Optional[str] = None
     tags: Optional[str] = None
+    favicon: Optional[str] = None  # 图标地址
     visible: bool = True
 
 
@@ -37,6 +38,13 @@ class BookmarkResponse(BookmarkBase):
     id: str
     order: int
     tags: Optional[str] = None
+    favicon_hash: Optional[str] = None  # 本地图标: /api/favicons/{favicon_hash}
+    enrich_status: Optional[str] = None  # 后台补全状态: pending, done, failed
+    link_status_code: Optional[int] = None
+    link_final_url: Optional[str] = None
+    link_latency_ms: Optional[int] = None
+    link_error: Optional[str] = None
+    link_checked_at: Optional[datetime] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
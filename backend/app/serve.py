@@ -0,0 +1,113 @@
+"""
+生产环境启动入口
+
+    python -m app.serve
+
+按 SERVER_* 配置启动 uvicorn：主进程监听端口后派生 SERVER_WORKERS 个工作进程共享同一个监听套接字，
+工作进程退出时自动拉起。默认使用 uvloop 事件循环和 httptools 解析器，不可用时回退到 asyncio / h11。
+
+信号：
+    SIGTERM / SIGINT  停止接收新连接，等待进行中的请求 (最多 SERVER_GRACEFUL_TIMEOUT 秒) 后退出
+    SIGHUP            逐个重启工作进程 (平滑重载)，监听套接字不关闭，重启期间的连接在队列中等待
+    SIGTTIN / SIGTTOU 增加 / 减少一个工作进程
+
+建表、补列和创建管理员在派生工作进程前由主进程完成一次，工作进程启动时不会同时迁移数据库。
+多个进程共享同一 SQLite 文件时依赖 WAL 模式和 busy_timeout 协调读写。
+未设置 COORDINATION_ENABLED 时，多个工作进程自动开启多进程协调，单个工作进程不开启。
+"""
+import asyncio
+import importlib.util
+import os
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def resolve_workers() -> int:
+    """实际启动的工作进程数"""
+    from app.database import is_sqlite, is_sqlite_file
+
+    workers = settings.server_workers if settings.server_workers > 0 else (os.cpu_count() or 1)
+    if workers > 1 and is_sqlite() and not is_sqlite_file():
+        # 内存数据库属于单个进程，多个工作进程会各自看到一份不同的数据
+        print("⚠ 内存 SQLite 数据库不支持多个工作进程，SERVER_WORKERS 按 1 处理")
+        return 1
+    return workers
+
+
+def resolve_loop() -> str:
+    loop = settings.server_loop.strip().lower() or "auto"
+    if loop == "uvloop" and importlib.util.find_spec("uvloop") is None:
+        print("⚠ 未安装 uvloop，使用 asyncio 事件循环")
+        return "asyncio"
+    return loop
+
+
+def resolve_http() -> str:
+    http = settings.server_http.strip().lower() or "auto"
+    if http == "httptools" and importlib.util.find_spec("httptools") is None:
+        print("⚠ 未安装 httptools，使用 h11 解析 HTTP")
+        return "h11"
+    return http
+
+
+def configure_coordination(workers: int):
+    """多个工作进程时开启多进程协调 (通过环境变量传给工作进程)"""
+    if "coordination_enabled" in settings.model_fields_set:
+        if workers > 1 and not settings.coordination_enabled:
+            print("⚠ COORDINATION_ENABLED=false，各工作进程都会运行定时任务，且看不到其他进程的修改")
+        return
+    os.environ["COORDINATION_ENABLED"] = "true" if workers > 1 else "false"
+
+
+async def prepare_database(workers: int):
+    """派生工作进程前初始化数据库，并释放主进程持有的连接"""
+    from app.database import dispose_engines, get_sqlite_pragmas, init_db, is_sqlite_file
+    from app.services.auth import init_admin
+
+    try:
+        await init_db()
+        await init_admin()
+        if workers > 1 and is_sqlite_file():
+            journal_mode = str((await get_sqlite_pragmas()).get("journal_mode", "")).lower()
+            if journal_mode != "wal":
+                print(f"⚠ SQLite 日志模式为 {journal_mode}，多个工作进程读写会互相阻塞，建议使用 WAL")
+    finally:
+        await dispose_engines()
+
+
+def main():
+    workers = resolve_workers()
+    configure_coordination(workers)
+    asyncio.run(prepare_database(workers))
+
+    config = uvicorn.Config(
+        "app.main:app",
+        host=settings.server_host,
+        port=settings.server_port,
+        workers=workers,
+        loop=resolve_loop(),
+        http=resolve_http(),
+        timeout_graceful_shutdown=settings.server_graceful_timeout or None,
+        timeout_keep_alive=settings.server_keepalive_timeout,
+        limit_max_requests=settings.server_max_requests or None,
+        # 只信任本机 nginx 转发的 X-Forwarded-* 头
+        proxy_headers=True,
+        forwarded_allow_ips="127.0.0.1",
+    )
+    server = uvicorn.Server(config)
+    print(
+        f"LiteMark API 监听 {settings.server_host}:{settings.server_port}，"
+        f"{workers} 个工作进程 ({config.loop} / {config.http})"
+    )
+    # 单个工作进程也由主进程托管，这样 SIGHUP 重载和异常退出后自动拉起的行为一致
+    sock = config.bind_socket()
+    Multiprocess(config, target=server.run, sockets=[sock]).run()
+
+
+if __name__ == "__main__":
+    main()
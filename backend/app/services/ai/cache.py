@@ -0,0 +1,231 @@
+"""
+LLM 响应缓存
+
+按 (模型, system prompt, prompt, 影响输出的请求参数) 内容寻址，持久化到数据库，
+支持 TTL 过期、按条目数和总大小淘汰，并合并并发的相同请求 (single-flight)。
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select, delete, func, update
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.llm_cache import LLMCacheEntry
+from app.services.write_queue import submit_write
+
+settings = get_settings()
+
+# 正在进行中的请求 (key -> Future[(result, tokens)])
+_inflight: Dict[str, asyncio.Future] = {}
+
+# 本进程统计
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "tokens_saved": 0,
+}
+
+# 每写入多少条检查一次淘汰
+EVICT_CHECK_INTERVAL = 50
+_writes_since_evict = 0
+
+
+def make_cache_key(model: str, system_prompt: str, prompt: str, params: Optional[dict] = None) -> str:
+    """生成缓存键 (params 为影响输出的其他请求参数，如 max_tokens、JSON 模式)"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    params_json = json.dumps(params or {}, sort_keys=True, ensure_ascii=False)
+    raw = f"{model}\0{system_hash}\0{prompt_hash}\0{params_json}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _load(key: str) -> Optional[Tuple[dict, int]]:
+    """读取未过期的缓存并记录命中"""
+    now = datetime.now()
+    async with read_session_maker() as session:
+        result = await session.execute(
+            select(LLMCacheEntry.response, LLMCacheEntry.tokens, LLMCacheEntry.expires_at)
+            .where(LLMCacheEntry.key == key)
+        )
+        entry = result.one_or_none()
+    if entry is None or entry.expires_at <= now:
+        return None
+
+    async def record_hit(session):
+        await session.execute(
+            update(LLMCacheEntry)
+            .where(LLMCacheEntry.key == key)
+            .values(hit_count=func.coalesce(LLMCacheEntry.hit_count, 0) + 1, last_used_at=now)
+        )
+
+    await submit_write(record_hit)
+    return json.loads(entry.response), entry.tokens or 0
+
+
+async def _store(key: str, model: str, result: dict, tokens: int):
+    """写入缓存"""
+    global _writes_since_evict
+
+    now = datetime.now()
+    payload = json.dumps(result, ensure_ascii=False)
+
+    async def write(session):
+        entry = await session.get(LLMCacheEntry, key)
+        if entry is None:
+            entry = LLMCacheEntry(key=key)
+            session.add(entry)
+        entry.model = model
+        entry.response = payload
+        entry.tokens = tokens
+        entry.size = len(payload.encode("utf-8"))
+        entry.hit_count = 0
+        entry.last_used_at = now
+        entry.expires_at = now + timedelta(hours=settings.llm_cache_ttl_hours)
+
+    await submit_write(write)
+
+    _writes_since_evict += 1
+    if _writes_since_evict >= EVICT_CHECK_INTERVAL:
+        _writes_since_evict = 0
+        await evict()
+
+
+def _max_bytes() -> int:
+    return max(0, settings.llm_cache_max_mb) * 1024 * 1024
+
+
+async def evict() -> int:
+    """删除过期条目，并按最近使用时间淘汰超出条目数上限或总字节数上限的条目"""
+    async def write(session) -> int:
+        result = await session.execute(
+            delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= datetime.now())
+        )
+        removed = result.rowcount or 0
+
+        count, total_size = (await session.execute(
+            select(func.count(LLMCacheEntry.key), func.coalesce(func.sum(LLMCacheEntry.size), 0))
+        )).one()
+        overflow = count - settings.llm_cache_max_entries
+        excess = total_size - _max_bytes()
+        if overflow <= 0 and excess <= 0:
+            return removed
+
+        # 从最久未使用的条目开始，直到条目数和字节数都回到上限以内
+        stale_keys = []
+        freed = 0
+        result = await session.execute(
+            select(LLMCacheEntry.key, LLMCacheEntry.size).order_by(LLMCacheEntry.last_used_at)
+        )
+        for key, size in result.all():
+            if len(stale_keys) >= overflow and freed >= excess:
+                break
+            stale_keys.append(key)
+            freed += size or 0
+        for i in range(0, len(stale_keys), 500):
+            result = await session.execute(
+                delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(stale_keys[i:i + 500]))
+            )
+            removed += result.rowcount or 0
+        return removed
+
+    return await submit_write(write)
+
+
+async def get_or_compute(
+    key: str,
+    model: str,
+    compute: Callable[[], Awaitable[Tuple[dict, int]]],
+) -> dict:
+    """
+    读取缓存，未命中时调用 compute 并写入缓存
+
+    compute 返回 (结果, 消耗 token 数)；相同 key 的并发请求只会触发一次 compute。
+    """
+    try:
+        cached = await _load(key)
+    except Exception as e:
+        print(f"⚠ 读取 LLM 缓存失败: {e}")
+        cached = None
+
+    if cached is not None:
+        result, tokens = cached
+        _stats["hits"] += 1
+        _stats["tokens_saved"] += tokens
+        return result
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        result, tokens = await asyncio.shield(pending)
+        _stats["coalesced"] += 1
+        _stats["tokens_saved"] += tokens
+        return result
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    _stats["misses"] += 1
+    try:
+        result, tokens = await compute()
+        # 解析失败的空结果不缓存
+        if result:
+            try:
+                await _store(key, model, result, tokens)
+            except Exception as e:
+                print(f"⚠ 写入 LLM 缓存失败: {e}")
+        future.set_result((result, tokens))
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # 标记异常已被读取，避免无等待者时的警告
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+async def get_cache_stats() -> dict:
+    """获取缓存统计"""
+    async with read_session_maker() as session:
+        result = await session.execute(
+            select(
+                func.count(LLMCacheEntry.key),
+                func.coalesce(func.sum(LLMCacheEntry.size), 0),
+                func.coalesce(func.sum(LLMCacheEntry.hit_count), 0),
+                func.coalesce(func.sum(LLMCacheEntry.hit_count * LLMCacheEntry.tokens), 0),
+            )
+        )
+        entries, total_size, total_hits, total_tokens_saved = result.one()
+
+    lookups = _stats["hits"] + _stats["coalesced"] + _stats["misses"]
+    served = _stats["hits"] + _stats["coalesced"]
+    return {
+        "enabled": settings.llm_cache_enabled,
+        "entries": entries,
+        "size_bytes": total_size,
+        "max_entries": settings.llm_cache_max_entries,
+        "max_bytes": _max_bytes(),
+        "ttl_hours": settings.llm_cache_ttl_hours,
+        "hits": _stats["hits"],
+        "coalesced": _stats["coalesced"],
+        "misses": _stats["misses"],
+        "hit_ratio": round(served / lookups, 4) if lookups else 0,
+        "tokens_saved": _stats["tokens_saved"],
+        "lifetime_hits": total_hits,
+        "lifetime_tokens_saved": total_tokens_saved,
+    }
+
+
+async def clear_cache() -> int:
+    """清空缓存"""
+    async def write(session) -> int:
+        result = await session.execute(delete(LLMCacheEntry))
+        return result.rowcount or 0
+
+    return await submit_write(write)
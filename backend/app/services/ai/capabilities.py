@@ -0,0 +1,207 @@
+"""
+LLM 提供商能力探测
+
+按 (base_url, model) 探测并缓存是否支持 JSON 模式、工具调用以及最大上下文长度，
+避免每次请求都先试错再重发。配置重新加载时清空缓存。
+探测请求与普通请求一样受 RPM/TPM 限流并自动重试；探测失败 (结果未知) 时缓存 UNKNOWN_TTL 秒后再重新探测。
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import openai
+from openai import AsyncOpenAI
+
+
+# 请求格式不被支持时提供商返回的错误类型
+UNSUPPORTED_ERRORS = (
+    openai.BadRequestError,
+    openai.UnprocessableEntityError,
+    openai.NotFoundError,
+)
+
+# 探测结果未知 (提供商不可用等) 时，多久之后重新探测
+UNKNOWN_TTL = timedelta(minutes=5)
+
+# 常见模型的上下文长度 (模型接口未返回时使用)
+KNOWN_CONTEXT_WINDOWS = [
+    ("gpt-4.1", 1047576),
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4", 8192),
+    ("gpt-3.5-turbo", 16385),
+    ("o1", 200000),
+    ("o3", 200000),
+    ("o4", 200000),
+    ("claude", 200000),
+    ("deepseek", 64000),
+    ("qwen", 32768),
+    ("glm-4", 128000),
+    ("moonshot-v1-8k", 8192),
+    ("moonshot-v1-32k", 32768),
+    ("moonshot-v1-128k", 131072),
+]
+
+# 模型接口中可能表示上下文长度的字段
+CONTEXT_LENGTH_FIELDS = ("context_length", "context_window", "max_model_len", "max_context_length")
+
+
+@dataclass
+class ProviderCapabilities:
+    """提供商能力 (None 表示未知)"""
+    base_url: str
+    model: str
+    json_mode: Optional[bool] = None
+    tool_calling: Optional[bool] = None
+    max_context: Optional[int] = None
+    probed_at: Optional[datetime] = None
+
+    def is_unknown(self) -> bool:
+        return self.json_mode is None and self.tool_calling is None
+
+    def to_dict(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "json_mode": self.json_mode,
+            "tool_calling": self.tool_calling,
+            "max_context": self.max_context,
+            "probed_at": self.probed_at.isoformat() if self.probed_at else None,
+        }
+
+
+_capabilities: Dict[tuple, ProviderCapabilities] = {}
+_probe_locks: Dict[tuple, asyncio.Lock] = {}
+
+
+def guess_context_window(model: str) -> Optional[int]:
+    """根据模型名称推断上下文长度"""
+    name = model.lower()
+    for prefix, length in KNOWN_CONTEXT_WINDOWS:
+        if prefix in name:
+            return length
+    return None
+
+
+async def _probe_json_mode(client: AsyncOpenAI, model: str) -> Optional[bool]:
+    from app.services.ai.llm import _create_completion
+
+    try:
+        await _create_completion(
+            client,
+            model=model,
+            messages=[{"role": "user", "content": '请以 JSON 格式返回 {"ok": true}'}],
+            max_tokens=10,
+            response_format={"type": "json_object"},
+        )
+        return True
+    except UNSUPPORTED_ERRORS:
+        return False
+    except Exception:
+        return None
+
+
+async def _probe_tool_calling(client: AsyncOpenAI, model: str) -> Optional[bool]:
+    from app.services.ai.llm import _create_completion
+
+    try:
+        await _create_completion(
+            client,
+            model=model,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=10,
+            tools=[{
+                "type": "function",
+                "function": {
+                    "name": "ping",
+                    "description": "连通性测试",
+                    "parameters": {"type": "object", "properties": {}},
+                },
+            }],
+        )
+        return True
+    except UNSUPPORTED_ERRORS:
+        return False
+    except Exception:
+        return None
+
+
+async def _probe_max_context(client: AsyncOpenAI, model: str) -> Optional[int]:
+    from app.services.ai.rate_limit import get_rate_limiter, with_retries
+
+    async def retrieve():
+        await get_rate_limiter().acquire()
+        return await client.models.retrieve(model)
+
+    try:
+        info = await with_retries(retrieve)
+        extra = info.model_dump()
+        for field_name in CONTEXT_LENGTH_FIELDS:
+            value = extra.get(field_name)
+            if isinstance(value, int) and value > 0:
+                return value
+    except Exception:
+        pass
+    return guess_context_window(model)
+
+
+def get_cached_capabilities(base_url: Optional[str], model: str) -> Optional[ProviderCapabilities]:
+    """获取已缓存的能力 (不触发探测)"""
+    return _capabilities.get((base_url or "", model))
+
+
+def _expired(caps: ProviderCapabilities) -> bool:
+    return caps.is_unknown() and (caps.probed_at is None or datetime.now() - caps.probed_at >= UNKNOWN_TTL)
+
+
+async def get_capabilities(
+    client: AsyncOpenAI,
+    base_url: Optional[str],
+    model: str,
+) -> ProviderCapabilities:
+    """获取提供商能力，首次使用时探测 (同一配置只探测一次，结果未知时过期后重新探测)"""
+    key = (base_url or "", model)
+    caps = _capabilities.get(key)
+    if caps is not None and not _expired(caps):
+        return caps
+
+    lock = _probe_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        caps = _capabilities.get(key)
+        if caps is not None and not _expired(caps):
+            return caps
+
+        json_mode, tool_calling, max_context = await asyncio.gather(
+            _probe_json_mode(client, model),
+            _probe_tool_calling(client, model),
+            _probe_max_context(client, model),
+        )
+        caps = ProviderCapabilities(
+            base_url=key[0],
+            model=model,
+            json_mode=json_mode,
+            tool_calling=tool_calling,
+            max_context=max_context,
+            probed_at=datetime.now(),
+        )
+        # 探测请求全部失败 (网络、鉴权等) 时也缓存，UNKNOWN_TTL 之后再重新探测
+        _capabilities[key] = caps
+        print(f"✓ 探测 LLM 能力: {model} json_mode={json_mode} tools={tool_calling} context={max_context}")
+        return caps
+
+
+def mark_json_mode_unsupported(base_url: Optional[str], model: str):
+    """实际请求发现不支持 JSON 模式时更新缓存"""
+    key = (base_url or "", model)
+    caps = _capabilities.get(key)
+    if caps is None:
+        caps = ProviderCapabilities(base_url=key[0], model=model, probed_at=datetime.now())
+        _capabilities[key] = caps
+    caps.json_mode = False
+
+
+def invalidate_capabilities():
+    """清空能力缓存 (配置变更时调用)"""
+    _capabilities.clear()
+    _probe_locks.clear()
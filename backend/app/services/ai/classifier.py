@@ -1,15 +1,21 @@
 """
 智能分类服务
 """
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from datetime import datetime
+import asyncio
+import json
 
+from app.config import get_settings
 from app.models.bookmark import Bookmark
 from app.services.ai.llm import chat_completion_json
+from app.services.ai.local_classifier import classify_locally
+from app.services.ai.pipeline import run_pipeline
 from app.utils.web_scraper import fetch_page_content
 
+settings = get_settings()
+
 
 CLASSIFY_SYSTEM_PROMPT = """你是一个书签分类专家。根据书签的信息，推荐一个合适的分类。
 
@@ -49,10 +55,7 @@ async def classify_bookmark(
     """
     # 获取现有分类
     if existing_categories is None:
-        result = await session.execute(
-            select(Bookmark.category).distinct().where(Bookmark.category.isnot(None))
-        )
-        existing_categories = [r[0] for r in result.all() if r[0]]
+        existing_categories = await get_existing_categories(session)
 
     # 尝试抓取网页内容
     page_content = None
@@ -85,63 +88,208 @@ URL：{url}
     }
 
 
-async def batch_classify(
-    session: AsyncSession,
-    bookmark_ids: Optional[List[str]] = None,
-    task=None
-) -> dict:
-    """批量分类书签"""
-    # 获取需要分类的书签（没有分类的书签）
-    query = select(Bookmark).where(Bookmark.category.is_(None))
-    if bookmark_ids:
-        query = query.where(Bookmark.id.in_(bookmark_ids))
+BATCH_CLASSIFY_SYSTEM_PROMPT = """你是一个书签分类专家。根据每个书签的信息，为其推荐一个合适的分类。
 
-    result = await session.execute(query)
-    bookmarks = result.scalars().all()
+要求：
+1. 分析每个书签的标题、URL、描述和网页内容摘要
+2. 优先从现有分类中选择最匹配的
+3. 如果现有分类都不合适，可以建议一个新分类
+4. 分类名称应该简洁（2-4个字）
+5. 每个书签都必须返回结果，并原样保留其 id
 
-    processed = 0
-    failed = 0
-    errors = []
+请以 JSON 格式返回：
+{
+    "results": [
+        {"id": "1", "category": "分类名称", "confidence": 0.85}
+    ]
+}
+"""
 
-    # 获取现有分类
-    cat_result = await session.execute(
+
+async def _fetch_excerpt(url: str, limit: int = 300) -> str:
+    """抓取网页内容片段 (失败返回空字符串)"""
+    try:
+        page_data = await fetch_page_content(url)
+        if page_data:
+            return (page_data.get("content") or page_data.get("description") or "")[:limit]
+    except Exception:
+        pass
+    return ""
+
+
+async def fetch_packed_excerpts(items: List[dict]) -> List[str]:
+    """为没有描述的书签抓取少量网页内容"""
+    return list(await asyncio.gather(*[
+        _fetch_excerpt(item["url"]) if not item.get("description") else asyncio.sleep(0, result="")
+        for item in items
+    ]))
+
+
+async def classify_bookmarks_packed(
+    items: List[dict],
+    existing_categories: List[str],
+    excerpts: Optional[List[str]] = None,
+) -> Dict[str, dict]:
+    """
+    将多个书签打包到一次 LLM 请求中分类，分类列表只发送一次
+
+    Args:
+        items: [{"id": str, "title": str, "url": str, "description": str}]
+        excerpts: 与 items 对应的网页内容片段，为 None 时自动抓取
+
+    Returns:
+        {书签ID: {"suggested_category": str, "confidence": float}}，
+        模型未返回或结果无效的书签不包含在内
+    """
+    if not items:
+        return {}
+
+    # 没有描述的书签补充少量网页内容
+    if excerpts is None:
+        excerpts = await fetch_packed_excerpts(items)
+
+    # 使用短序号代替 UUID，节省 token
+    entries = []
+    for index, (item, excerpt) in enumerate(zip(items, excerpts), start=1):
+        entry = {
+            "id": str(index),
+            "title": (item.get("title") or "")[:200],
+            "url": item["url"][:300],
+        }
+        if item.get("description"):
+            entry["description"] = item["description"][:200]
+        if excerpt:
+            entry["content"] = excerpt
+        entries.append(entry)
+
+    prompt = f"""现有分类：{', '.join(existing_categories) if existing_categories else '暂无分类'}
+
+请对以下 {len(entries)} 个书签分别进行分类：
+{json.dumps(entries, ensure_ascii=False)}"""
+
+    # 每个结果约 30 token，预留足够的输出长度
+    result = await chat_completion_json(
+        prompt,
+        BATCH_CLASSIFY_SYSTEM_PROMPT,
+        max_tokens=200 + 40 * len(entries),
+    )
+
+    classified = {}
+    for row in result.get("results") or []:
+        if not isinstance(row, dict):
+            continue
+        try:
+            index = int(str(row.get("id")).strip())
+        except (TypeError, ValueError):
+            continue
+        category = str(row.get("category") or "").strip()
+        if not category or not 1 <= index <= len(items):
+            continue
+        classified[items[index - 1]["id"]] = {
+            "suggested_category": category,
+            "confidence": row.get("confidence", 0.5),
+        }
+
+    return classified
+
+
+async def get_existing_categories(session: AsyncSession) -> List[str]:
+    """获取书签中已使用的分类"""
+    result = await session.execute(
         select(Bookmark.category).distinct().where(Bookmark.category.isnot(None))
     )
-    existing_categories = [r[0] for r in cat_result.all() if r[0]]
+    return [r[0] for r in result.all() if r[0]]
 
-    # 更新任务总数
-    if task:
-        task.total = len(bookmarks)
-        task.status = "running"
-        task.started_at = datetime.now()
 
+async def classify_bookmarks(
+    bookmarks: List[Bookmark],
+    existing_categories: List[str],
+    on_item: Optional[Callable[[Bookmark, Optional[Exception]], None]] = None,
+) -> dict:
+    """
+    为一组书签分类并写回书签对象 (不提交事务)
+
+    本地分类器置信度足够的书签直接采用本地结果，其余书签再请求 LLM。
+    新建议的分类会追加到 existing_categories 中供后续书签复用；
+    on_item 在每个书签完成时调用 (bookmark, error)，error 为 None 表示成功
+    """
+    processed = 0
+    failed = 0
+    errors = []
+
+    remaining = []
     for bookmark in bookmarks:
+        local = await classify_locally(bookmark.title, bookmark.url, bookmark.description, bookmark.tags)
+        if local is None:
+            remaining.append(bookmark)
+            continue
+        bookmark.category = local["suggested_category"]
+        processed += 1
+        if on_item:
+            on_item(bookmark, None)
+    bookmarks = remaining
+
+    batch_size = max(1, settings.ai_classify_batch_size)
+    chunks = []
+    for start in range(0, len(bookmarks), batch_size):
+        chunk = bookmarks[start:start + batch_size]
+        chunks.append((chunk, [
+            {"id": b.id, "title": b.title, "url": b.url, "description": b.description}
+            for b in chunk
+        ]))
+
+    async def process(chunk_entry, excerpts) -> Dict[str, dict]:
+        chunk, items = chunk_entry
+        # 打包分类，失败的书签逐个回退
         try:
-            classification = await classify_bookmark(
-                session,
-                bookmark.title,
-                bookmark.url,
-                bookmark.description,
-                existing_categories,
-            )
-            bookmark.category = classification["suggested_category"]
-            processed += 1
-        except Exception as e:
-            failed += 1
-            errors.append(f"{bookmark.title[:20]}: {str(e)[:50]}")
-
-        # 更新进度
-        if task:
-            task.processed = processed
-            task.failed = failed
-            task.errors = errors
-
-    await session.commit()
-
-    # 完成任务
-    if task:
-        task.status = "completed"
-        task.completed_at = datetime.now()
+            classified = await classify_bookmarks_packed(items, existing_categories, excerpts)
+        except Exception:
+            classified = {}
+
+        for bookmark in chunk:
+            if bookmark.id in classified:
+                continue
+            try:
+                classified[bookmark.id] = await classify_bookmark(
+                    None,
+                    bookmark.title,
+                    bookmark.url,
+                    bookmark.description,
+                    existing_categories,
+                )
+            except Exception as e:
+                classified[bookmark.id] = e
+        return classified
+
+    def on_result(chunk_entry, classified, error):
+        nonlocal processed, failed
+        chunk, _ = chunk_entry
+        for bookmark in chunk:
+            classification = error or classified.get(bookmark.id)
+            item_error = None
+            if isinstance(classification, dict):
+                bookmark.category = classification["suggested_category"]
+                if bookmark.category not in existing_categories:
+                    existing_categories.append(bookmark.category)
+                processed += 1
+            else:
+                item_error = classification or ValueError("未返回分类结果")
+                failed += 1
+                errors.append(f"{bookmark.title[:20]}: {str(item_error)[:50]}")
+
+            if on_item:
+                on_item(bookmark, item_error)
+
+    # 抓取与分类并发流水线执行
+    await run_pipeline(
+        chunks,
+        fetch=lambda chunk_entry: fetch_packed_excerpts(chunk_entry[1]),
+        process=process,
+        on_result=on_result,
+        # 每个分块内部已并发抓取，按分块大小折算抓取并发数
+        fetch_concurrency=max(1, settings.ai_scrape_concurrency // batch_size),
+        process_concurrency=settings.ai_llm_concurrency,
+    )
 
     return {
         "processed": processed,
@@ -0,0 +1,292 @@
+"""
+书签智能补全服务
+
+抓取网页一次，通过一次结构化 LLM 请求同时生成摘要、标签和分类，
+供快速添加接口和 MCP 工具共用。
+"""
+import json
+from typing import Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.bookmark import Bookmark
+from app.schemas.bookmark import BookmarkCreate
+from app.services.ai.llm import chat_completion_json
+from app.services.ai.local_classifier import classify_locally
+from app.services.ai.pipeline import run_pipeline
+from app.services.bookmark import create_bookmark, get_categories
+from app.utils.web_scraper import fetch_page_content
+
+settings = get_settings()
+
+
+ENRICH_SYSTEM_PROMPT = """你是一个书签整理专家。请分析网页信息，生成摘要、标签，并推荐分类。
+
+要求：
+1. 生成简洁的摘要（50-150字）
+2. 提取3-5个关键标签
+3. 估算阅读时间（分钟）
+4. 优先从现有分类中选择最匹配的分类；都不合适时可以建议一个新分类（2-4个字）
+
+请以 JSON 格式返回：
+{
+    "summary": "网页内容摘要...",
+    "tags": ["标签1", "标签2", "标签3"],
+    "reading_time": 5,
+    "category": "分类名称",
+    "confidence": 0.85
+}
+"""
+
+ENRICH_WITHOUT_CATEGORY_SYSTEM_PROMPT = """你是一个网页内容分析专家。请分析网页内容并生成摘要。
+
+要求：
+1. 生成简洁的摘要（50-150字）
+2. 提取3-5个关键标签
+3. 估算阅读时间（分钟）
+
+请以 JSON 格式返回：
+{
+    "summary": "网页内容摘要...",
+    "tags": ["标签1", "标签2", "标签3"],
+    "reading_time": 5
+}
+"""
+
+
+async def enrich_url(
+    url: str,
+    title: Optional[str] = None,
+    existing_categories: Optional[List[str]] = None,
+    classify: bool = True,
+    page_data: Optional[dict] = None,
+) -> dict:
+    """
+    抓取网页并一次性生成摘要、标签和分类
+
+    Args:
+        page_data: 已抓取的网页数据，为 None 时自动抓取
+        classify: 是否需要推荐分类
+
+    Returns:
+        {
+            "title": str,
+            "description": str,  # 网页自带描述
+            "favicon": str,
+            "summary": str,
+            "tags": List[str],
+            "reading_time": Optional[int],
+            "suggested_category": Optional[str],
+            "confidence": float,
+        }
+    """
+    if page_data is None:
+        page_data = await fetch_page_content(url)
+    page_data = page_data or {}
+
+    if not page_data and not title:
+        raise ValueError("无法获取网页信息")
+
+    page_title = title or page_data.get("title") or url
+    content = page_data.get("content", "")
+    if not content:
+        # 没有网页正文时不调用 LLM (只能凭标题猜测)，只保留标题、链接和网页自带的描述
+        return {
+            "title": page_title,
+            "description": page_data.get("description", ""),
+            "favicon": page_data.get("favicon", ""),
+            "summary": "",
+            "tags": [],
+            "reading_time": None,
+            "suggested_category": "未分类" if classify else None,
+            "confidence": 0.0,
+        }
+
+    category_hint = ""
+    if classify:
+        category_hint = f"\n现有分类：{', '.join(existing_categories) if existing_categories else '暂无分类'}\n"
+
+    prompt = f"""请分析以下网页：
+
+标题：{page_title}
+URL：{url}
+描述：{page_data.get('description') or '无'}
+
+网页内容：
+{content[:3000]}
+{category_hint}
+请生成摘要、标签和预计阅读时间{'，并推荐最合适的分类' if classify else ''}。"""
+
+    result = await chat_completion_json(
+        prompt,
+        ENRICH_SYSTEM_PROMPT if classify else ENRICH_WITHOUT_CATEGORY_SYSTEM_PROMPT,
+    )
+
+    tags = result.get("tags") or []
+    if not isinstance(tags, list):
+        tags = [str(tags)]
+
+    return {
+        "title": page_title,
+        "description": page_data.get("description", ""),
+        "favicon": page_data.get("favicon", ""),
+        "summary": result.get("summary") or "",
+        "tags": tags,
+        "reading_time": result.get("reading_time"),
+        "suggested_category": (result.get("category") or "未分类") if classify else None,
+        "confidence": result.get("confidence", 0.5),
+    }
+
+
+async def create_enriched_bookmark(
+    session: AsyncSession,
+    url: str,
+    title: Optional[str] = None,
+    category: Optional[str] = None,
+    enrich_later: bool = False,
+) -> Bookmark:
+    """
+    快速添加书签：未提供的标题、描述、标签和分类由 AI 补全
+
+    提供了分类时只生成摘要和标签。
+    enrich_later 为 True 时立即创建书签，补全交给后台任务队列完成。
+    """
+    if enrich_later:
+        bookmark_data = BookmarkCreate(
+            title=title or url,
+            url=url,
+            category=category,
+            visible=True
+        )
+        return await create_bookmark(bookmark_data, enrich_later=True)
+
+    existing_categories = None if category else await get_categories(session)
+
+    page_data = await fetch_page_content(url)
+    if not category:
+        # 本地分类器有把握时 LLM 只需生成摘要和标签
+        local = await classify_locally(
+            title or (page_data or {}).get("title"),
+            url,
+            (page_data or {}).get("description"),
+        )
+        if local is not None:
+            category = local["suggested_category"]
+
+    enriched = await enrich_url(
+        url,
+        title=title,
+        existing_categories=existing_categories,
+        classify=not category,
+        page_data=page_data or {},
+    )
+
+    tags = enriched["tags"]
+    bookmark_data = BookmarkCreate(
+        title=enriched["title"],
+        url=url,
+        description=enriched["summary"] or enriched["description"] or "",
+        tags=json.dumps(tags, ensure_ascii=False) if tags else "",
+        category=category or enriched["suggested_category"],
+        favicon=enriched["favicon"] or None,
+        visible=True
+    )
+
+    return await create_bookmark(bookmark_data)
+
+
+def apply_enrichment(bookmark: Bookmark, enriched: dict) -> List[str]:
+    """
+    将补全结果写入书签，只填充仍为空的字段 (不覆盖用户已填写的内容)
+
+    Returns:
+        被更新的字段名
+    """
+    updates = {}
+    if not bookmark.title or bookmark.title == bookmark.url:
+        if enriched["title"] and enriched["title"] != bookmark.url:
+            updates["title"] = enriched["title"][:500]
+    if not bookmark.description:
+        description = enriched["summary"] or enriched["description"]
+        if description:
+            updates["description"] = description
+    if not bookmark.tags and enriched["tags"]:
+        updates["tags"] = json.dumps(enriched["tags"], ensure_ascii=False)
+    if not bookmark.category and enriched["suggested_category"]:
+        updates["category"] = enriched["suggested_category"]
+    if not bookmark.favicon and enriched["favicon"]:
+        updates["favicon"] = enriched["favicon"]
+
+    for key, value in updates.items():
+        setattr(bookmark, key, value)
+    return list(updates)
+
+
+async def enrich_bookmarks(
+    bookmarks: List[Bookmark],
+    existing_categories: List[str],
+    on_item: Optional[Callable[[Bookmark, Optional[Exception]], None]] = None,
+) -> dict:
+    """
+    后台补全一组书签 (不提交事务)
+
+    on_item 在每个书签完成时调用 (bookmark, error)，error 为 None 表示成功
+    """
+    processed = 0
+    failed = 0
+    errors = []
+
+    def on_result(bookmark, enriched, error):
+        nonlocal processed, failed
+        if error is None:
+            apply_enrichment(bookmark, enriched)
+            bookmark.enrich_status = "done"
+            if bookmark.category and bookmark.category not in existing_categories:
+                existing_categories.append(bookmark.category)
+            processed += 1
+        else:
+            bookmark.enrich_status = "failed"
+            failed += 1
+            errors.append(f"{bookmark.title[:20]}: {str(error)[:50]}")
+
+        if on_item:
+            on_item(bookmark, error)
+
+    async def process(bookmark, page_data) -> dict:
+        page_data = page_data or {}
+        title = None if bookmark.title == bookmark.url else bookmark.title
+        local = None
+        if not bookmark.category:
+            local = await classify_locally(
+                title or page_data.get("title"),
+                bookmark.url,
+                bookmark.description or page_data.get("description"),
+                bookmark.tags,
+            )
+        enriched = await enrich_url(
+            bookmark.url,
+            title=title,
+            existing_categories=existing_categories,
+            classify=not bookmark.category and local is None,
+            page_data=page_data,
+        )
+        if local is not None:
+            enriched["suggested_category"] = local["suggested_category"]
+            enriched["confidence"] = local["confidence"]
+        return enriched
+
+    await run_pipeline(
+        bookmarks,
+        fetch=lambda b: fetch_page_content(b.url),
+        process=process,
+        on_result=on_result,
+        fetch_concurrency=settings.ai_scrape_concurrency,
+        process_concurrency=settings.ai_llm_concurrency,
+    )
+
+    return {
+        "processed": processed,
+        "failed": failed,
+        "errors": errors,
+    }
@@ -0,0 +1,463 @@
+"""
+AI 批量任务队列
+
+任务及每个书签的处理状态保存在数据库中，由 lifespan 启动的后台工作协程领取执行：
+- 按分块提交，崩溃或重启后从未完成的明细继续 (断点续跑)
+- 心跳超时的任务可被其他进程接管
+- 支持取消与重新执行失败项
+任何进程都能查询任务进度。
+"""
+import asyncio
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select, update, delete, or_, and_, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_maker, read_session_maker
+from app.models.ai_job import AIJob, AIJobItem
+from app.models.bookmark import Bookmark
+from app.services.events import publish
+from app.services.write_queue import pending_changes, submit_write
+
+settings = get_settings()
+
+SUPPORTED_OPERATIONS = ("summarize", "classify", "enrich")
+
+# 任务中保留的错误信息条数
+MAX_STORED_ERRORS = 50
+
+# 当前进程的工作者标识
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+_worker_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+async def add_job(
+    session: AsyncSession,
+    operations: List[str],
+    bookmark_ids: Optional[List[str]] = None,
+) -> AIJob:
+    """在 session 的事务中创建任务并生成待处理明细 (不提交，提交后调用 notify_worker)"""
+    operations = [op for op in operations if op in SUPPORTED_OPERATIONS]
+    if not operations:
+        raise ValueError(f"不支持的操作，可选: {', '.join(SUPPORTED_OPERATIONS)}")
+
+    job = AIJob(id=str(uuid.uuid4()), operation="+".join(operations), status="pending")
+    session.add(job)
+
+    total = 0
+    for operation in operations:
+        # 与单次批量处理的筛选条件一致：摘要处理无描述的书签，分类处理无分类的书签，
+        # 补全处理等待补全的书签
+        if operation == "summarize":
+            query = select(Bookmark.id).where(Bookmark.description.is_(None))
+        elif operation == "classify":
+            query = select(Bookmark.id).where(Bookmark.category.is_(None))
+        elif bookmark_ids:
+            query = select(Bookmark.id)
+        else:
+            query = select(Bookmark.id).where(Bookmark.enrich_status == "pending")
+        if bookmark_ids:
+            query = query.where(Bookmark.id.in_(bookmark_ids))
+
+        result = await session.execute(query)
+        ids = [r[0] for r in result.all()]
+        session.add_all([
+            AIJobItem(job_id=job.id, bookmark_id=bid, operation=operation, status="pending")
+            for bid in ids
+        ])
+        total += len(ids)
+
+    job.total = total
+    await session.flush()
+    await session.refresh(job)
+    return job
+
+
+async def create_job(
+    operations: List[str],
+    bookmark_ids: Optional[List[str]] = None,
+) -> AIJob:
+    """创建任务并生成待处理明细"""
+    async def write(session: AsyncSession) -> AIJob:
+        return await add_job(session, operations, bookmark_ids)
+
+    job = await submit_write(write)
+    notify_worker()
+    return job
+
+
+async def get_job(session: AsyncSession, job_id: str) -> Optional[AIJob]:
+    """获取任务"""
+    return await session.get(AIJob, job_id)
+
+
+async def list_jobs(session: AsyncSession, limit: int = 50) -> List[AIJob]:
+    """获取最近的任务"""
+    result = await session.execute(
+        select(AIJob).order_by(AIJob.created_at.desc()).limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def cancel_job(job_id: str) -> Optional[AIJob]:
+    """取消任务 (运行中的任务在当前分块完成后停止)"""
+    async def write(session: AsyncSession) -> Optional[AIJob]:
+        job = await session.get(AIJob, job_id)
+        if job is None:
+            return None
+
+        if job.status == "pending":
+            job.status = "cancelled"
+            job.completed_at = datetime.now()
+        elif job.status == "running":
+            job.cancel_requested = True
+        await session.flush()
+        return job
+
+    return await submit_write(write)
+
+
+async def resume_job(job_id: str, retry_failed: bool = True) -> Optional[AIJob]:
+    """重新排队已取消或失败的任务，可选择重试失败的明细"""
+    async def write(session: AsyncSession) -> Optional[AIJob]:
+        job = await session.get(AIJob, job_id)
+        if job is None or job.status in ("pending", "running"):
+            return job
+
+        if retry_failed:
+            await session.execute(
+                update(AIJobItem)
+                .where(AIJobItem.job_id == job_id, AIJobItem.status == "failed")
+                .values(status="pending", error=None)
+            )
+            job.failed = 0
+            job.errors = None
+
+        job.status = "pending"
+        job.cancel_requested = False
+        job.completed_at = None
+        await session.flush()
+        return job
+
+    job = await submit_write(write)
+    if job is not None and job.status == "pending":
+        notify_worker()
+    return job
+
+
+async def cleanup_old_jobs(max_age_hours: Optional[int] = None):
+    """清理已结束的旧任务及其明细"""
+    if max_age_hours is None:
+        max_age_hours = settings.ai_job_retention_hours
+    cutoff = datetime.now() - timedelta(hours=max_age_hours)
+    finished = select(AIJob.id).where(
+        AIJob.status.in_(("completed", "failed", "cancelled")),
+        AIJob.completed_at < cutoff,
+    )
+
+    async with read_session_maker() as session:
+        if (await session.execute(finished.limit(1))).first() is None:
+            return
+
+    async def write(session: AsyncSession):
+        old_ids = [r[0] for r in (await session.execute(finished)).all()]
+        for i in range(0, len(old_ids), 500):
+            await session.execute(delete(AIJobItem).where(AIJobItem.job_id.in_(old_ids[i:i + 500])))
+            await session.execute(delete(AIJob).where(AIJob.id.in_(old_ids[i:i + 500])))
+
+    await submit_write(write)
+
+
+async def _claim_job() -> Optional[str]:
+    """领取一个待执行或心跳超时的任务"""
+    stale_before = datetime.now() - timedelta(seconds=settings.ai_job_stale_seconds)
+    claimable = or_(
+        AIJob.status == "pending",
+        and_(AIJob.status == "running", AIJob.heartbeat_at < stale_before),
+    )
+
+    async with read_session_maker() as session:
+        # 单个书签的补全任务优先于批量任务
+        result = await session.execute(
+            select(AIJob.id)
+            .where(claimable)
+            .order_by(case((AIJob.operation == "enrich", 0), else_=1), AIJob.created_at)
+            .limit(1)
+        )
+        job_id = result.scalar_one_or_none()
+    if job_id is None:
+        return None
+
+    async def write(session: AsyncSession) -> bool:
+        # 条件更新保证多个进程中只有一个能领取成功
+        now = datetime.now()
+        result = await session.execute(
+            update(AIJob)
+            .where(AIJob.id == job_id, claimable)
+            .values(
+                status="running",
+                worker_id=WORKER_ID,
+                heartbeat_at=now,
+                started_at=func.coalesce(AIJob.started_at, now),
+            )
+        )
+        return result.rowcount == 1
+
+    return job_id if await submit_write(write) else None
+
+
+async def _heartbeat(job_id: str):
+    """定期刷新心跳，防止长分块执行期间被其他进程接管"""
+    interval = max(5, settings.ai_job_stale_seconds // 3)
+    while True:
+        await asyncio.sleep(interval)
+
+        async def write(session: AsyncSession):
+            await session.execute(
+                update(AIJob)
+                .where(AIJob.id == job_id, AIJob.worker_id == WORKER_ID)
+                .values(heartbeat_at=datetime.now())
+            )
+
+        try:
+            await submit_write(write)
+        except Exception as e:
+            print(f"⚠ 更新任务心跳失败 {job_id}: {e}")
+
+
+async def _process_chunk(job_id: str, operation: str, existing_categories: List[str]) -> str:
+    """
+    处理一个分块并在同一事务中提交书签修改和明细状态
+
+    Returns:
+        "continue" 还有待处理明细, "done" 该操作已完成, "cancelled" 任务已取消, "lost" 任务被其他进程接管
+    """
+    from app.services.ai.classifier import classify_bookmarks
+    from app.services.ai.enrichment import enrich_bookmarks
+    from app.services.ai.summarizer import summarize_bookmarks
+    from app.services.bookmark import ensure_category_exists
+    from app.services.favicon import schedule_prefetch
+    from app.services.coordination import bookmarks_changed
+
+    async with async_session_maker() as session:
+        job = await session.get(AIJob, job_id)
+        if job is None or job.worker_id != WORKER_ID:
+            return "lost"
+        if job.cancel_requested:
+            return "cancelled"
+
+        result = await session.execute(
+            select(AIJobItem)
+            .where(
+                AIJobItem.job_id == job_id,
+                AIJobItem.operation == operation,
+                AIJobItem.status == "pending",
+            )
+            .order_by(AIJobItem.id)
+            .limit(settings.ai_job_chunk_size)
+        )
+        items = list(result.scalars().all())
+        if not items:
+            return "done"
+
+        result = await session.execute(
+            select(Bookmark).where(Bookmark.id.in_([item.bookmark_id for item in items]))
+        )
+        bookmarks = {b.id: b for b in result.scalars().all()}
+
+        outcomes = {}
+
+        def on_item(bookmark, error):
+            outcomes[bookmark.id] = error
+
+        targets = [bookmarks[item.bookmark_id] for item in items if item.bookmark_id in bookmarks]
+        if operation == "summarize":
+            await summarize_bookmarks(targets, on_item=on_item)
+        elif operation == "classify":
+            await classify_bookmarks(targets, existing_categories, on_item=on_item)
+        else:
+            await enrich_bookmarks(targets, existing_categories, on_item=on_item)
+
+        errors = job.error_list
+        item_results = []
+        for item in items:
+            bookmark = bookmarks.get(item.bookmark_id)
+            if bookmark is None:
+                error = "书签不存在"
+            elif item.bookmark_id not in outcomes:
+                error = "未返回处理结果"
+            else:
+                error = str(outcomes[item.bookmark_id])[:200] if outcomes[item.bookmark_id] else None
+
+            item_results.append((item.id, error))
+            if error is not None:
+                title = bookmark.title[:20] if bookmark else item.bookmark_id
+                errors.append(f"{title}: {error[:50]}")
+
+        # 书签修改在读取会话中完成，只把修改过的列交给写入队列
+        bookmark_changes = {b.id: pending_changes(b) for b in targets}
+        categories = {b.category for b in targets if b.category} if operation == "enrich" else set()
+        processed = sum(1 for _, error in item_results if error is None)
+        failed = len(item_results) - processed
+
+    async def write(write_session: AsyncSession) -> bool:
+        # 书签修改和明细状态在同一事务中提交
+        result = await write_session.execute(
+            update(AIJob)
+            .where(AIJob.id == job_id, AIJob.worker_id == WORKER_ID)
+            .values(
+                processed=func.coalesce(AIJob.processed, 0) + processed,
+                failed=func.coalesce(AIJob.failed, 0) + failed,
+                errors=json.dumps(errors[-MAX_STORED_ERRORS:], ensure_ascii=False),
+                heartbeat_at=datetime.now(),
+            )
+        )
+        if not result.rowcount:
+            return False
+        for bookmark_id, values in bookmark_changes.items():
+            if values:
+                await write_session.execute(
+                    update(Bookmark).where(Bookmark.id == bookmark_id).values(**values)
+                )
+        for category in categories:
+            await ensure_category_exists(write_session, category)
+        for item_id, error in item_results:
+            await write_session.execute(
+                update(AIJobItem)
+                .where(AIJobItem.id == item_id)
+                .values(status="done" if error is None else "failed", error=error)
+            )
+        return True
+
+    if not await submit_write(write):
+        return "lost"
+
+    # 通知前端书签已更新
+    for bookmark in targets:
+        publish("bookmark.updated", {
+            "id": bookmark.id,
+            "operation": operation,
+            "visible": bool(bookmark.visible),
+            "bookmark": bookmark.to_dict(),
+        })
+    if operation == "enrich":
+        schedule_prefetch([b.id for b in targets if not b.favicon_hash])
+    bookmarks_changed([b.id for b in targets])
+    return "continue"
+
+
+async def _finish_job(job_id: str, status: str, error: Optional[str] = None):
+    async def write(session: AsyncSession):
+        job = await session.get(AIJob, job_id)
+        if job is None or job.worker_id != WORKER_ID:
+            return
+        job.status = status
+        job.completed_at = datetime.now()
+        if error:
+            errors = job.error_list
+            errors.append(error[:200])
+            job.errors = json.dumps(errors[-MAX_STORED_ERRORS:], ensure_ascii=False)
+
+    await submit_write(write)
+
+
+async def run_job(job_id: str):
+    """执行已领取的任务，从未完成的明细处继续"""
+    from app.services.ai.classifier import get_existing_categories
+
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        async with read_session_maker() as session:
+            job = await session.get(AIJob, job_id)
+            operations = job.operations if job else []
+            existing_categories = await get_existing_categories(session)
+
+        for operation in operations:
+            while True:
+                state = await _process_chunk(job_id, operation, existing_categories)
+                if state == "continue":
+                    continue
+                if state == "cancelled":
+                    await _finish_job(job_id, "cancelled")
+                    return
+                if state == "lost":
+                    return
+                break
+
+        await _finish_job(job_id, "completed")
+    except asyncio.CancelledError:
+        # 进程关闭：保持 running 状态，心跳超时后由其他进程或重启后的本进程继续
+        raise
+    except Exception as e:
+        await _finish_job(job_id, "failed", str(e))
+    finally:
+        heartbeat.cancel()
+
+
+async def _worker_loop():
+    """后台工作循环，最多同时执行 ai_job_concurrency 个任务"""
+    print(f"✓ AI 任务队列已启动: {WORKER_ID}")
+    running = set()
+
+    def on_job_done(task: asyncio.Task):
+        running.discard(task)
+        notify_worker()
+
+    try:
+        while True:
+            try:
+                while len(running) < max(1, settings.ai_job_concurrency):
+                    job_id = await _claim_job()
+                    if not job_id:
+                        break
+                    job_task = asyncio.create_task(run_job(job_id))
+                    running.add(job_task)
+                    job_task.add_done_callback(on_job_done)
+            except Exception as e:
+                print(f"⚠ AI 任务队列异常: {e}")
+
+            # 等待新任务通知、任务结束或轮询间隔
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.ai_job_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for job_task in list(running):
+            job_task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def notify_worker():
+    """唤醒本进程的工作协程"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def start_worker():
+    """启动后台工作协程"""
+    global _worker_task, _wakeup
+    if _worker_task is None or _worker_task.done():
+        _wakeup = asyncio.Event()
+        _worker_task = asyncio.create_task(_worker_loop())
+
+
+async def stop_worker():
+    """停止后台工作协程"""
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
+        print("✓ AI 任务队列已停止")
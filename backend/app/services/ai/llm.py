@@ -1,12 +1,20 @@
 from openai import AsyncOpenAI
-from typing import Optional
+from typing import Optional, Set
+import asyncio
+import httpx
 import json
 import re
 
 from app.config import get_settings
+from app.services.ai import cache as llm_cache
+from app.services.ai import capabilities
+from app.services.ai.rate_limit import get_rate_limiter, estimate_tokens, with_retries
 
 settings = get_settings()
 
+# JSON 请求使用的温度
+JSON_TEMPERATURE = 0.3
+
 
 runtime_config = {
     "api_key": None,
@@ -24,13 +32,91 @@ def get_effective_config():
     }
 
 
+# 长连接客户端 (按 api_key + base_url 复用)
+_client: Optional[AsyncOpenAI] = None
+_client_key: Optional[tuple] = None
+
+# 被替换后正在关闭的旧客户端 (保留任务引用，避免被回收)
+_closing: Set[asyncio.Task] = set()
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """创建带连接池的 HTTP 客户端"""
+    try:
+        import h2  # noqa: F401
+        http2 = settings.llm_http2
+    except ImportError:
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(settings.llm_timeout, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        ),
+    )
+
+
 def get_openai_client() -> AsyncOpenAI:
-    """获取 LLM 客户端"""
+    """获取 LLM 客户端 (配置不变时复用同一个连接池)"""
+    global _client, _client_key
+
     config = get_effective_config()
-    return AsyncOpenAI(
-        api_key=config["api_key"],
-        base_url=config["base_url"],
-    )
+    key = (config["api_key"], config["base_url"])
+    if _client is None or _client_key != key:
+        if _client is not None:
+            # 配置在 update_runtime_config 之外变化时，在后台关闭旧客户端的连接池
+            task = asyncio.get_running_loop().create_task(_client.close())
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        _client = AsyncOpenAI(
+            api_key=config["api_key"],
+            base_url=config["base_url"],
+            http_client=_build_http_client(),
+            max_retries=0,  # 由 with_retries 统一退避重试
+        )
+        _client_key = key
+    return _client
+
+
+async def close_openai_client():
+    """关闭 LLM 客户端连接池"""
+    global _client, _client_key
+
+    client = _client
+    _client = None
+    _client_key = None
+    if client is not None:
+        await client.close()
+
+
+async def update_runtime_config(config: dict):
+    """更新运行时配置，连接参数变化时重建客户端"""
+    global runtime_config
+
+    old_config = get_effective_config()
+    runtime_config = config
+    new_config = get_effective_config()
+
+    # 提供商可能已变化，重新探测能力
+    capabilities.invalidate_capabilities()
+
+    if (old_config["api_key"], old_config["base_url"]) != (new_config["api_key"], new_config["base_url"]):
+        await close_openai_client()
+
+
+async def _create_completion(client: AsyncOpenAI, **kwargs):
+    """发送请求 (受 RPM/TPM 限流，429/5xx 自动重试)"""
+    text = "".join(m["content"] for m in kwargs["messages"])
+    estimated = estimate_tokens(text, kwargs.get("max_tokens") or 0)
+
+    async def call():
+        await get_rate_limiter().acquire(estimated)
+        return await client.chat.completions.create(**kwargs)
+
+    return await with_retries(call)
 
 
 async def chat_completion(
@@ -49,7 +135,8 @@ async def chat_completion(
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": prompt})
 
-    response = await client.chat.completions.create(
+    response = await _create_completion(
+        client,
         model=model or config["model"],
         messages=messages,
         temperature=temperature,
@@ -87,15 +174,15 @@ def extract_json_from_text(text: str) -> dict:
     return {}
 
 
-async def chat_completion_json(
+async def _request_json(
     prompt: str,
-    system_prompt: str = "",
-    model: Optional[str] = None,
-    use_json_mode: bool = True,
-) -> dict:
-    """调用 LLM 并返回 JSON"""
+    system_prompt: str,
+    model: str,
+    use_json_mode: bool,
+    max_tokens: int = 1000,
+) -> tuple:
+    """实际请求 LLM，返回 (JSON 结果, 消耗 token 数)"""
     client = get_openai_client()
-    config = get_effective_config()
 
     # 增强 system prompt 确保返回 JSON
     enhanced_system = system_prompt
@@ -109,28 +196,73 @@ async def chat_completion_json(
         {"role": "user", "content": prompt}
     ]
 
-    effective_model = model or config["model"]
+    # 根据探测到的能力直接选择请求格式
+    config = get_effective_config()
+    json_mode = False
+    if use_json_mode:
+        caps = await capabilities.get_capabilities(client, config["base_url"], model)
+        json_mode = caps.json_mode is not False
 
-    # 尝试使用 json_object 格式 (OpenAI 支持)
-    try:
-        if use_json_mode:
-            response = await client.chat.completions.create(
-                model=effective_model,
-                messages=messages,
-                temperature=0.3,
-                max_tokens=1000,
+    request_kwargs = {
+        "model": model,
+        "messages": messages,
+        "temperature": JSON_TEMPERATURE,
+        "max_tokens": max_tokens,
+    }
+
+    if json_mode:
+        try:
+            response = await _create_completion(
+                client,
+                **request_kwargs,
                 response_format={"type": "json_object"},
             )
-        else:
-            raise Exception("Skip json_mode")
-    except Exception:
-        # 不支持 json_object 格式，使用普通模式
-        response = await client.chat.completions.create(
-            model=effective_model,
-            messages=messages,
-            temperature=0.3,
-            max_tokens=1000,
-        )
+        except capabilities.UNSUPPORTED_ERRORS:
+            # 探测结果不准确时记录下来，之后不再尝试 JSON 模式
+            capabilities.mark_json_mode_unsupported(config["base_url"], model)
+            response = await _create_completion(client, **request_kwargs)
+    else:
+        response = await _create_completion(client, **request_kwargs)
 
     content = response.choices[0].message.content
-    return extract_json_from_text(content)
+    tokens = response.usage.total_tokens if response.usage else 0
+    return extract_json_from_text(content), tokens
+
+
+async def chat_completion_json(
+    prompt: str,
+    system_prompt: str = "",
+    model: Optional[str] = None,
+    use_json_mode: bool = True,
+    use_cache: bool = True,
+    max_tokens: int = 1000,
+) -> dict:
+    """调用 LLM 并返回 JSON (相同请求优先读取缓存)"""
+    config = get_effective_config()
+    effective_model = model or config["model"]
+
+    if not use_cache or not settings.llm_cache_enabled:
+        result, _ = await _request_json(
+            prompt, system_prompt, effective_model, use_json_mode, max_tokens
+        )
+        return result
+
+    # 输出上限、JSON 模式、温度和服务地址不同的请求不能共用缓存
+    key = llm_cache.make_cache_key(
+        effective_model,
+        system_prompt,
+        prompt,
+        {
+            "base_url": config["base_url"],
+            "max_tokens": max_tokens,
+            "json_mode": use_json_mode,
+            "temperature": JSON_TEMPERATURE,
+        },
+    )
+    return await llm_cache.get_or_compute(
+        key,
+        effective_model,
+        lambda: _request_json(
+            prompt, system_prompt, effective_model, use_json_mode, max_tokens
+        ),
+    )
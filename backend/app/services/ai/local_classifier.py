@@ -0,0 +1,338 @@
+"""
+本地分类器
+
+用已有书签的分类训练多项式朴素贝叶斯模型 (特征哈希 + NumPy)，为书签给出分类和置信度。
+批量分类、快速添加和后台补全都先经过本地分类器，置信度达到
+AI_LOCAL_CLASSIFIER_THRESHOLD 时直接采用，不再请求 LLM。
+
+特征为标题、标签、描述的分词 (与搜索索引相同) 和网站域名。模型首次使用时从数据库加载，
+之后随书签增删改增量更新 (加减对应书签的词频计数)；导入时填充的占位分类不参与训练。
+"""
+import asyncio
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.bookmark import Bookmark
+from app.services.ai.vector_index import document_fields, tokenize
+
+settings = get_settings()
+
+# 特征哈希桶数
+FEATURE_BUCKETS = 1 << 16
+
+# 标题和域名的特征重复次数 (相当于权重)
+TITLE_REPEAT = 2
+HOST_REPEAT = 2
+
+# 参与训练的描述最大长度
+MAX_DESCRIPTION_LENGTH = 500
+
+# 平滑系数
+SMOOTHING = 0.1
+
+# 不代表用户分类意图的分类
+IGNORED_CATEGORIES = ("默认分类", "未分类")
+
+# 变更合并等待时间 (秒)
+UPDATE_DEBOUNCE = 0.5
+
+
+def extract_features(
+    title: Optional[str],
+    url: Optional[str],
+    tags: Optional[str] = None,
+    description: Optional[str] = None,
+) -> np.ndarray:
+    """书签特征：分词和域名的哈希桶编号 (可重复，重复次数即词频)"""
+    title_text, tags_text, description_text = document_fields(title, tags, description)
+    tokens = tokenize(title_text) * TITLE_REPEAT
+    tokens += tokenize(tags_text)
+    tokens += tokenize(description_text[:MAX_DESCRIPTION_LENGTH])
+
+    host = urlparse(url or "").netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host:
+        tokens += [f"host:{host}"] * HOST_REPEAT
+
+    return np.fromiter(
+        (zlib.crc32(token.encode("utf-8")) % FEATURE_BUCKETS for token in tokens),
+        dtype=np.int32,
+        count=len(tokens),
+    )
+
+
+class NaiveBayesModel:
+    """按分类累计特征计数的多项式朴素贝叶斯，支持逐个书签加减"""
+
+    def __init__(self, buckets: int = FEATURE_BUCKETS):
+        self.buckets = buckets
+        self.categories: List[str] = []
+        self.category_index: Dict[str, int] = {}
+        self.counts = np.zeros((0, buckets), dtype=np.float32)
+        self.totals = np.zeros(0, dtype=np.float64)
+        self.docs = np.zeros(0, dtype=np.int64)
+        self.feature_counts = np.zeros(buckets, dtype=np.float32)
+        self.records: Dict[str, Tuple[int, np.ndarray]] = {}
+        self._vocabulary: Optional[int] = None
+
+    def _category_slot(self, category: str) -> int:
+        slot = self.category_index.get(category)
+        if slot is None:
+            slot = len(self.categories)
+            self.categories.append(category)
+            self.category_index[category] = slot
+            self.counts = np.vstack([self.counts, np.zeros((1, self.buckets), dtype=np.float32)])
+            self.totals = np.append(self.totals, 0.0)
+            self.docs = np.append(self.docs, 0)
+        return slot
+
+    def add(self, bookmark_id: str, category: str, features: np.ndarray):
+        self.remove(bookmark_id)
+        slot = self._category_slot(category)
+        np.add.at(self.counts[slot], features, 1)
+        np.add.at(self.feature_counts, features, 1)
+        self.totals[slot] += len(features)
+        self.docs[slot] += 1
+        self.records[bookmark_id] = (slot, features)
+        self._vocabulary = None
+
+    def remove(self, bookmark_id: str):
+        record = self.records.pop(bookmark_id, None)
+        if record is None:
+            return
+        slot, features = record
+        np.subtract.at(self.counts[slot], features, 1)
+        np.subtract.at(self.feature_counts, features, 1)
+        self.totals[slot] -= len(features)
+        self.docs[slot] -= 1
+        self._vocabulary = None
+
+    def vocabulary(self) -> int:
+        if self._vocabulary is None:
+            self._vocabulary = int(np.count_nonzero(self.feature_counts > 0))
+        return self._vocabulary
+
+    def predict(self, features: np.ndarray, min_samples: int) -> Optional[Tuple[str, float]]:
+        """返回 (分类, 后验概率)；可比较的分类不足两个或特征全部未见过时返回 None"""
+        eligible = np.flatnonzero(self.docs >= max(1, min_samples))
+        if len(eligible) < 2:
+            return None
+        # 训练集中没出现过的特征对各分类没有区分度
+        known = features[self.feature_counts[features] > 0]
+        if len(known) == 0:
+            return None
+
+        counts = self.counts[np.ix_(eligible, known)].astype(np.float64)
+        denominators = self.totals[eligible] + SMOOTHING * self.vocabulary()
+        scores = np.log(counts + SMOOTHING).sum(axis=1) - len(known) * np.log(denominators)
+        docs = self.docs[eligible]
+        scores += np.log(docs / docs.sum())
+
+        scores -= scores.max()
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        return self.categories[eligible[best]], float(probabilities[best])
+
+
+class LocalClassifier:
+    """本地分类器：加载、增量更新与预测"""
+
+    def __init__(self):
+        self.model = NaiveBayesModel()
+        self.local_hits = 0
+        self.fallbacks = 0
+        self._ready = asyncio.Event()
+        self._build_lock = asyncio.Lock()
+        self._pending: Set[str] = set()
+        self._update_task: Optional[asyncio.Task] = None
+        self._full_sync_requested = False
+
+    # ---------- 训练 ----------
+
+    async def ensure_ready(self):
+        if not self._ready.is_set():
+            async with self._build_lock:
+                if not self._ready.is_set():
+                    await self._build()
+                    self._ready.set()
+            if self._pending or self._full_sync_requested:
+                self._schedule()
+
+    @staticmethod
+    def _training_query():
+        return select(
+            Bookmark.id, Bookmark.title, Bookmark.url, Bookmark.tags, Bookmark.description, Bookmark.category
+        ).where(
+            Bookmark.category.is_not(None),
+            Bookmark.category != "",
+            Bookmark.category.not_in(IGNORED_CATEGORIES),
+        )
+
+    async def _build(self):
+        async with read_session_maker() as session:
+            rows = (await session.execute(self._training_query())).all()
+
+        def train():
+            model = NaiveBayesModel()
+            for row in rows:
+                model.add(row.id, row.category, extract_features(row.title, row.url, row.tags, row.description))
+            return model
+
+        self.model = await asyncio.to_thread(train)
+        print(f"✓ 本地分类器已加载: {len(rows)} 个书签，{int(np.count_nonzero(self.model.docs))} 个分类")
+
+    def mark_changed(self, bookmark_ids: Iterable[str]):
+        self._pending.update(bookmark_ids)
+        self._schedule()
+
+    def request_full_sync(self):
+        self._full_sync_requested = True
+        self._schedule()
+
+    def _schedule(self):
+        if self._update_task is None or self._update_task.done():
+            try:
+                self._update_task = asyncio.get_running_loop().create_task(self._run_updates())
+            except RuntimeError:
+                pass
+
+    async def _run_updates(self):
+        await asyncio.sleep(UPDATE_DEBOUNCE)
+        while self._pending or self._full_sync_requested:
+            try:
+                if not self._ready.is_set():
+                    # 模型尚未加载完成：加载可能已读过这些书签的旧数据，保留待处理项，加载完成后再应用
+                    return
+                if self._full_sync_requested:
+                    self._full_sync_requested = False
+                    self._pending.clear()
+                    async with self._build_lock:
+                        await self._build()
+                    continue
+                ids = list(self._pending)
+                self._pending.clear()
+                async with self._build_lock:
+                    await self._apply(ids)
+            except Exception as e:
+                print(f"⚠ 更新本地分类器失败: {e}")
+
+    async def _apply(self, bookmark_ids: List[str]):
+        rows = []
+        async with read_session_maker() as session:
+            for i in range(0, len(bookmark_ids), 500):
+                result = await session.execute(
+                    self._training_query().where(Bookmark.id.in_(bookmark_ids[i:i + 500]))
+                )
+                rows.extend(result.all())
+
+        # 已删除或分类被清空的书签移出训练集
+        found = {row.id for row in rows}
+        for bookmark_id in bookmark_ids:
+            if bookmark_id not in found:
+                self.model.remove(bookmark_id)
+        for row in rows:
+            self.model.add(row.id, row.category, extract_features(row.title, row.url, row.tags, row.description))
+
+    # ---------- 预测 ----------
+
+    async def classify(
+        self,
+        title: Optional[str],
+        url: Optional[str],
+        description: Optional[str] = None,
+        tags: Optional[str] = None,
+        threshold: Optional[float] = None,
+    ) -> Optional[dict]:
+        """
+        本地分类，置信度不低于阈值时返回结果，否则返回 None (应交给 LLM)
+
+        Returns:
+            {
+                "suggested_category": str,
+                "confidence": float,
+                "reasoning": str,
+            }
+        """
+        if not settings.ai_local_classifier:
+            return None
+        await self.ensure_ready()
+
+        threshold = settings.ai_local_classifier_threshold if threshold is None else threshold
+        prediction = self.model.predict(
+            extract_features(title, url, tags, description),
+            settings.ai_local_classifier_min_samples,
+        )
+        if prediction is None or prediction[1] < threshold:
+            self.fallbacks += 1
+            return None
+
+        category, confidence = prediction
+        self.local_hits += 1
+        samples = int(self.model.docs[self.model.category_index[category]])
+        return {
+            "suggested_category": category,
+            "confidence": round(confidence, 4),
+            "reasoning": f"本地分类器：与该分类下 {samples} 个书签相似",
+        }
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.fallbacks
+        return {
+            "enabled": settings.ai_local_classifier,
+            "ready": self._ready.is_set(),
+            "threshold": settings.ai_local_classifier_threshold,
+            "training_bookmarks": len(self.model.records),
+            "categories": int(np.count_nonzero(self.model.docs >= max(1, settings.ai_local_classifier_min_samples))),
+            "local_hits": self.local_hits,
+            "llm_fallbacks": self.fallbacks,
+            "local_ratio": round(self.local_hits / lookups, 4) if lookups else 0.0,
+            "memory_bytes": int(self.model.counts.nbytes),
+        }
+
+
+_local_classifier = LocalClassifier()
+
+
+def get_local_classifier() -> LocalClassifier:
+    return _local_classifier
+
+
+async def warm_up():
+    """启动时在后台加载模型"""
+    if not settings.ai_local_classifier:
+        return
+    try:
+        await _local_classifier.ensure_ready()
+    except Exception as e:
+        print(f"⚠ 加载本地分类器失败: {e}")
+
+
+def mark_changed(bookmark_ids: Iterable[str]):
+    """书签新增、修改或删除后调用，模型在后台更新"""
+    _local_classifier.mark_changed(bookmark_ids)
+
+
+def request_full_sync():
+    _local_classifier.request_full_sync()
+
+
+async def classify_locally(
+    title: Optional[str],
+    url: Optional[str],
+    description: Optional[str] = None,
+    tags: Optional[str] = None,
+) -> Optional[dict]:
+    """置信度足够时返回本地分类结果，否则返回 None；本地分类器出错时同样返回 None"""
+    try:
+        return await _local_classifier.classify(title, url, description, tags)
+    except Exception as e:
+        print(f"⚠ 本地分类失败: {e}")
+        return None
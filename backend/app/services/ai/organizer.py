@@ -0,0 +1,355 @@
+"""
+分类自动整理
+
+导入时放入占位分类 (默认 "默认分类") 的书签按标题、标签、描述和网站域名向量化 (TF-IDF)，
+用球面 k-means 离线聚类，给出分组建议和每组的代表性书签。LLM 只负责为每个分组命名，
+整理几千个书签只需要几十次请求；用户确认后再按分组写回分类。
+"""
+import asyncio
+import math
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.bookmark import Bookmark
+from app.services.ai.llm import chat_completion_json
+from app.services.ai.vector_index import document_fields, tokenize
+from app.services.related import site_of
+
+settings = get_settings()
+
+# 特征权重
+TITLE_WEIGHT = 2.0
+TAGS_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+HOST_WEIGHT = 2.0
+
+# 参与聚类的描述最大长度
+MAX_DESCRIPTION_LENGTH = 500
+
+# 词表：至少出现在 2 个书签中、不超过半数书签中，按文档频率保留前 N 个
+MIN_DOCUMENT_FREQUENCY = 2
+MAX_DOCUMENT_RATIO = 0.5
+MAX_FEATURES = 1500
+
+# 聚类数上限 (未指定时按 sqrt(n/2) 估计)
+MAX_CLUSTERS = 60
+
+# k-means 最大迭代次数和随机种子 (固定种子使相同数据得到相同分组)
+MAX_ITERATIONS = 30
+RANDOM_SEED = 42
+
+# 成员数不足或与分组中心相似度过低的书签不归入任何分组
+MIN_CLUSTER_SIZE = 3
+MIN_MEMBER_SIMILARITY = 0.1
+
+# 分组的关键词和网站数
+TOP_TERMS = 5
+TOP_DOMAINS = 3
+
+# 命名时发给 LLM 的样本数
+NAMING_SAMPLES = 10
+
+# 单次整理的书签数上限 (特征矩阵为 n × MAX_FEATURES 的 float32)
+MAX_BOOKMARKS = 20000
+
+
+CLUSTER_NAME_SYSTEM_PROMPT = """你是一个书签分类专家。下面是一组内容相近的书签，请为这一组书签起一个分类名称。
+
+要求：
+1. 根据关键词、常见网站和书签标题判断这组书签的共同主题
+2. 如果现有分类中有合适的，优先使用现有分类
+3. 分类名称应该简洁（2-4个字）
+4. 给出置信度
+
+请以 JSON 格式返回：
+{
+    "category": "分类名称",
+    "confidence": 0.85
+}
+"""
+
+
+def _weighted_tokens(row) -> Dict[str, float]:
+    """书签的加权词频 (域名以 host: 前缀区分)"""
+    title, tags, description = document_fields(row.title, row.tags, row.description)
+    weights: Dict[str, float] = {}
+    for text, weight in (
+        (title, TITLE_WEIGHT),
+        (tags, TAGS_WEIGHT),
+        (description[:MAX_DESCRIPTION_LENGTH], DESCRIPTION_WEIGHT),
+    ):
+        for token in tokenize(text):
+            weights[token] = weights.get(token, 0.0) + weight
+    host = site_of(row.url)
+    if host:
+        weights[f"host:{host}"] = HOST_WEIGHT
+    return weights
+
+
+def build_features(rows) -> tuple:
+    """
+    构建 TF-IDF 特征矩阵 (行已归一化)
+
+    Returns:
+        (矩阵, 词表)；没有有效特征的书签对应全零行
+    """
+    documents = [_weighted_tokens(row) for row in rows]
+    n = len(documents)
+    document_frequency = Counter(token for weights in documents for token in weights)
+    max_df = max(MIN_DOCUMENT_FREQUENCY, int(n * MAX_DOCUMENT_RATIO))
+    vocabulary = [
+        token for token, df in sorted(document_frequency.items(), key=lambda item: (-item[1], item[0]))
+        if MIN_DOCUMENT_FREQUENCY <= df <= max_df
+    ][:MAX_FEATURES]
+    columns = {token: i for i, token in enumerate(vocabulary)}
+    idf = np.array(
+        [math.log((1 + n) / (1 + document_frequency[token])) + 1.0 for token in vocabulary],
+        dtype=np.float32,
+    )
+
+    matrix = np.zeros((n, len(vocabulary)), dtype=np.float32)
+    for i, weights in enumerate(documents):
+        for token, tf in weights.items():
+            column = columns.get(token)
+            if column is not None:
+                matrix[i, column] = 1.0 + math.log(tf)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix, vocabulary
+
+
+def default_cluster_count(n: int) -> int:
+    return int(min(MAX_CLUSTERS, max(2, round(math.sqrt(n / 2)))))
+
+
+def spherical_kmeans(matrix: np.ndarray, k: int, seed: int = RANDOM_SEED) -> tuple:
+    """
+    球面 k-means (余弦相似度)，k-means++ 初始化
+
+    Returns:
+        (每行所属分组, 每行与分组中心的相似度, 分组中心)
+    """
+    n = matrix.shape[0]
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # k-means++：按与已选中心的距离平方概率选择下一个中心
+    centroids = np.empty((k, matrix.shape[1]), dtype=np.float32)
+    centroids[0] = matrix[rng.integers(n)]
+    distances = np.clip(1.0 - matrix @ centroids[0], 0.0, None) ** 2
+    for c in range(1, k):
+        total = float(distances.sum())
+        index = int(rng.choice(n, p=distances / total)) if total > 0 else int(rng.integers(n))
+        centroids[c] = matrix[index]
+        distances = np.minimum(distances, np.clip(1.0 - matrix @ centroids[c], 0.0, None) ** 2)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(MAX_ITERATIONS):
+        similarities = matrix @ centroids.T
+        new_labels = np.argmax(similarities, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, matrix)
+        counts = np.bincount(labels, minlength=k)
+        best = similarities[np.arange(n), labels]
+        for c in np.flatnonzero(counts == 0):
+            # 空分组改用离当前中心最远的书签重新开始
+            farthest = int(np.argmin(best))
+            sums[c] = matrix[farthest]
+            best[farthest] = np.inf
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = np.divide(sums, norms, out=np.zeros_like(sums), where=norms > 0)
+
+    similarities = matrix @ centroids.T
+    labels = np.argmax(similarities, axis=1)
+    return labels, similarities[np.arange(n), labels], centroids
+
+
+def _cluster(rows, num_clusters: Optional[int], sample_size: int) -> dict:
+    matrix, vocabulary = build_features(rows)
+    has_features = np.linalg.norm(matrix, axis=1) > 0
+    candidates = np.flatnonzero(has_features)
+    unclustered = [rows[i].id for i in np.flatnonzero(~has_features)]
+    if len(candidates) < MIN_CLUSTER_SIZE:
+        return {"clusters": [], "unclustered_ids": [row.id for row in rows]}
+
+    k = num_clusters or default_cluster_count(len(candidates))
+    labels, similarities, centroids = spherical_kmeans(matrix[candidates], k)
+
+    clusters = []
+    for c in range(centroids.shape[0]):
+        members = np.flatnonzero((labels == c) & (similarities >= MIN_MEMBER_SIMILARITY))
+        outliers = np.flatnonzero((labels == c) & (similarities < MIN_MEMBER_SIMILARITY))
+        unclustered.extend(rows[candidates[i]].id for i in outliers)
+        if len(members) < MIN_CLUSTER_SIZE:
+            unclustered.extend(rows[candidates[i]].id for i in members)
+            continue
+
+        # 代表性书签：与分组中心最相似的成员
+        members = members[np.argsort(-similarities[members], kind="stable")]
+        member_rows = [rows[candidates[i]] for i in members]
+        terms = [
+            vocabulary[i] for i in np.argsort(-centroids[c], kind="stable")
+            if centroids[c][i] > 0 and not vocabulary[i].startswith("host:")
+        ][:TOP_TERMS]
+        domains = Counter(site_of(row.url) for row in member_rows if row.url)
+        clusters.append({
+            "bookmark_ids": [row.id for row in member_rows],
+            "size": len(member_rows),
+            "cohesion": round(float(similarities[members].mean()), 4),
+            "top_terms": terms,
+            "top_domains": [domain for domain, count in domains.most_common(TOP_DOMAINS) if count > 1],
+            "samples": [
+                {"id": row.id, "title": row.title, "url": row.url}
+                for row in member_rows[:max(sample_size, NAMING_SAMPLES)]
+            ],
+        })
+
+    clusters.sort(key=lambda cluster: -cluster["size"])
+    return {"clusters": clusters, "unclustered_ids": unclustered}
+
+
+def _fallback_name(cluster: dict) -> str:
+    if cluster["top_terms"]:
+        return cluster["top_terms"][0]
+    if cluster["top_domains"]:
+        return cluster["top_domains"][0]
+    return "未分类"
+
+
+async def name_cluster(cluster: dict, existing_categories: List[str]) -> dict:
+    """请求 LLM 为分组命名，返回 {"category", "confidence"}"""
+    samples = "\n".join(
+        f"- {sample['title']} ({sample['url']})" for sample in cluster["samples"][:NAMING_SAMPLES]
+    )
+    prompt = f"""这组共有 {cluster['size']} 个书签。
+
+关键词：{', '.join(cluster['top_terms']) or '无'}
+常见网站：{', '.join(cluster['top_domains']) or '无'}
+代表性书签：
+{samples}
+
+现有分类：{', '.join(existing_categories) if existing_categories else '暂无分类'}
+
+请为这组书签起一个分类名称。"""
+
+    result = await chat_completion_json(prompt, CLUSTER_NAME_SYSTEM_PROMPT, max_tokens=200)
+    category = str(result.get("category") or "").strip()
+    if not category:
+        raise ValueError("未返回分类名称")
+    return {"category": category[:50], "confidence": result.get("confidence", 0.5)}
+
+
+async def propose_groups(
+    session: AsyncSession,
+    category: str = "默认分类",
+    num_clusters: Optional[int] = None,
+    sample_size: int = 5,
+    name_clusters: bool = True,
+) -> dict:
+    """
+    为指定分类下的书签生成分组建议 (不修改数据)
+
+    Returns:
+        {
+            "category": str,
+            "total": int,
+            "clusters": [
+                {"bookmark_ids", "size", "cohesion", "top_terms", "top_domains",
+                 "samples", "suggested_name", "confidence"}
+            ],
+            "unclustered_ids": List[str],
+            "llm_calls": int,
+        }
+    """
+    result = await session.execute(
+        select(Bookmark.id, Bookmark.title, Bookmark.url, Bookmark.tags, Bookmark.description)
+        .where(Bookmark.category == category)
+        .order_by(Bookmark.id)
+    )
+    rows = result.all()
+    if len(rows) > MAX_BOOKMARKS:
+        raise ValueError(f"分类下书签过多 ({len(rows)})，单次最多整理 {MAX_BOOKMARKS} 个")
+
+    proposal = await asyncio.to_thread(_cluster, rows, num_clusters, sample_size)
+    clusters = proposal["clusters"]
+
+    llm_calls = 0
+    if name_clusters and clusters:
+        from app.services.ai.classifier import get_existing_categories
+
+        existing_categories = [c for c in await get_existing_categories(session) if c != category]
+        semaphore = asyncio.Semaphore(max(1, settings.ai_llm_concurrency))
+
+        async def name(cluster):
+            nonlocal llm_calls
+            async with semaphore:
+                llm_calls += 1
+                try:
+                    return await name_cluster(cluster, existing_categories)
+                except Exception as e:
+                    print(f"⚠ 分组命名失败: {e}")
+                    return None
+
+        names = await asyncio.gather(*(name(cluster) for cluster in clusters))
+    else:
+        names = [None] * len(clusters)
+
+    for cluster, named in zip(clusters, names):
+        cluster["suggested_name"] = named["category"] if named else _fallback_name(cluster)
+        cluster["confidence"] = named["confidence"] if named else None
+        cluster["samples"] = cluster["samples"][:sample_size]
+
+    return {
+        "category": category,
+        "total": len(rows),
+        "clusters": clusters,
+        "unclustered_ids": proposal["unclustered_ids"],
+        "llm_calls": llm_calls,
+    }
+
+
+async def apply_groups(groups: List[dict]) -> int:
+    """
+    按分组写回分类 (通过写入队列在一个事务中完成)
+
+    Args:
+        groups: [{"category": str, "bookmark_ids": List[str]}]
+
+    Returns:
+        更新的书签数
+    """
+    from app.services.bookmark import ensure_category_exists
+    from app.services.coordination import categories_changed
+    from app.services.write_queue import submit_write
+
+    groups = [
+        ((group.get("category") or "").strip(), list(dict.fromkeys(group.get("bookmark_ids") or [])))
+        for group in groups
+    ]
+    groups = [(category, bookmark_ids) for category, bookmark_ids in groups if category and bookmark_ids]
+
+    async def write(session: AsyncSession) -> int:
+        updated = 0
+        for category, bookmark_ids in groups:
+            await ensure_category_exists(session, category)
+            # 分批更新，避免 IN 参数过多
+            for i in range(0, len(bookmark_ids), 500):
+                result = await session.execute(
+                    update(Bookmark).where(Bookmark.id.in_(bookmark_ids[i:i + 500])).values(category=category)
+                )
+                updated += result.rowcount or 0
+        return updated
+
+    updated = await submit_write(write)
+    categories_changed([bookmark_id for _, bookmark_ids in groups for bookmark_id in bookmark_ids])
+    return updated
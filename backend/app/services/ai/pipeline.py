@@ -0,0 +1,90 @@
+"""
+AI 批量处理流水线
+
+抓取和 LLM 推理分别由独立的工作协程池执行，两阶段之间通过有界队列衔接，
+使网页抓取与模型推理重叠进行，同时限制各自的并发数。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+# 队列结束标记
+_DONE = object()
+
+
+async def run_pipeline(
+    items: Iterable[Any],
+    fetch: Callable[[Any], Awaitable[Any]],
+    process: Callable[[Any, Any], Awaitable[Any]],
+    on_result: Callable[[Any, Any, Optional[Exception]], None],
+    fetch_concurrency: int = 8,
+    process_concurrency: int = 4,
+):
+    """
+    执行两阶段流水线
+
+    Args:
+        items: 待处理项目
+        fetch: 抓取阶段，返回传给 process 的数据
+        process: 推理阶段，返回最终结果
+        on_result: 每个项目完成时调用 (item, result, error)，error 为 None 表示成功
+        fetch_concurrency: 抓取并发数
+        process_concurrency: 推理并发数
+    """
+    items = list(items)
+    if not items:
+        return
+
+    fetch_queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        fetch_queue.put_nowait(item)
+
+    # 有界队列形成背压，抓取不会远远领先于推理
+    process_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, process_concurrency) * 2)
+
+    async def fetch_worker():
+        while True:
+            try:
+                item = fetch_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                payload, error = await fetch(item), None
+            except Exception as e:
+                payload, error = None, e
+            await process_queue.put((item, payload, error))
+
+    async def process_worker():
+        while True:
+            entry = await process_queue.get()
+            if entry is _DONE:
+                return
+            item, payload, error = entry
+            result = None
+            if error is None:
+                try:
+                    result = await process(item, payload)
+                except Exception as e:
+                    error = e
+            try:
+                on_result(item, result, error)
+            except Exception as e:
+                print(f"⚠ 处理结果回调失败: {e}")
+
+    fetchers = [
+        asyncio.create_task(fetch_worker())
+        for _ in range(max(1, min(fetch_concurrency, len(items))))
+    ]
+    processors = [
+        asyncio.create_task(process_worker())
+        for _ in range(max(1, min(process_concurrency, len(items))))
+    ]
+
+    try:
+        await asyncio.gather(*fetchers)
+        for _ in processors:
+            await process_queue.put(_DONE)
+        await asyncio.gather(*processors)
+    finally:
+        for task in fetchers + processors:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,130 @@
+"""
+LLM 请求限流与重试
+
+令牌桶限制每分钟请求数 (RPM) 和 token 数 (TPM)，
+遇到 429 / 5xx / 网络错误时按带抖动的指数退避重试。
+"""
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import openai
+
+from app.config import get_settings
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """令牌桶 (按分钟配额匀速补充)"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.fill_rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1):
+        """取出令牌，不足时等待补充"""
+        # 单次请求超过桶容量时按容量计，避免永久等待
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.fill_rate)
+
+
+class RateLimiter:
+    """同时限制 RPM 和 TPM，配额为 0 表示不限制"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    async def acquire(self, estimated_tokens: int = 0):
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens and estimated_tokens > 0:
+            await self.tokens.acquire(estimated_tokens)
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取全局限流器"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(settings.ai_rpm_limit, settings.ai_tpm_limit)
+    return _limiter
+
+
+def estimate_tokens(text: str, max_tokens: int = 0) -> int:
+    """粗略估算请求消耗的 token 数 (中文约 1 字 1 token，英文约 4 字符 1 token)"""
+    return len(text) // 2 + max_tokens
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """判断错误是否值得重试"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """读取 Retry-After 响应头 (秒)"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+async def with_retries(
+    func: Callable[[], Awaitable[T]],
+    max_retries: Optional[int] = None,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> T:
+    """执行 func，可重试错误按带抖动的指数退避重试"""
+    if max_retries is None:
+        max_retries = settings.ai_max_retries
+
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            # Full jitter: 在 [0, base * 2^n] 内随机等待，避免并发请求同时重试
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            retry_after = _retry_after(e)
+            if retry_after:
+                delay = max(delay, min(retry_after, max_delay))
+            attempt += 1
+            await asyncio.sleep(delay)
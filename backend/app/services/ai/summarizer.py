@@ -1,16 +1,20 @@
 """
 内容摘要服务
 """
-from typing import Optional, List
+from typing import Callable, Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import json
-from datetime import datetime
 
+from app.config import get_settings
 from app.models.bookmark import Bookmark
 from app.services.ai.llm import chat_completion_json
+from app.services.ai.pipeline import run_pipeline
+from app.services.write_queue import submit_changes
 from app.utils.web_scraper import fetch_page_content
 
+settings = get_settings()
+
 
 SUMMARIZE_SYSTEM_PROMPT = """你是一个网页内容分析专家。请分析网页内容并生成摘要。
 
@@ -41,7 +45,15 @@ async def summarize_url(url: str, title: Optional[str] = None) -> dict:
     """
     # 抓取网页内容
     page_data = await fetch_page_content(url)
+    return await summarize_page(url, page_data, title)
+
 
+async def summarize_page(
+    url: str,
+    page_data: Optional[dict],
+    title: Optional[str] = None,
+) -> dict:
+    """根据已抓取的网页数据生成摘要"""
     if not page_data:
         return {
             "summary": "无法获取网页内容",
@@ -96,56 +108,46 @@ async def summarize_bookmark(
     # 更新书签
     bookmark.description = summary_data["summary"]
     bookmark.tags = json.dumps(summary_data["tags"], ensure_ascii=False)
-    await session.commit()
+    await submit_changes([bookmark])
 
     return summary_data
 
 
-async def batch_summarize(
-    session: AsyncSession,
-    bookmark_ids: Optional[List[str]] = None,
-    task=None
+async def summarize_bookmarks(
+    bookmarks: List[Bookmark],
+    on_item: Optional[Callable[[Bookmark, Optional[Exception]], None]] = None,
 ) -> dict:
-    """批量生成摘要"""
-    query = select(Bookmark).where(Bookmark.description.is_(None))
-    if bookmark_ids:
-        query = query.where(Bookmark.id.in_(bookmark_ids))
-
-    result = await session.execute(query)
-    bookmarks = result.scalars().all()
+    """
+    为一组书签生成摘要并写回书签对象 (不提交事务)
 
+    on_item 在每个书签完成时调用 (bookmark, error)，error 为 None 表示成功
+    """
     processed = 0
     failed = 0
     errors = []
 
-    # 更新任务总数
-    if task:
-        task.total = len(bookmarks)
-        task.status = "running"
-        task.started_at = datetime.now()
-
-    for bookmark in bookmarks:
-        try:
-            summary_data = await summarize_url(bookmark.url, bookmark.title)
+    def on_result(bookmark, summary_data, error):
+        nonlocal processed, failed
+        if error is None:
             bookmark.description = summary_data["summary"]
             bookmark.tags = json.dumps(summary_data["tags"], ensure_ascii=False)
             processed += 1
-        except Exception as e:
+        else:
             failed += 1
-            errors.append(f"{bookmark.title[:20]}: {str(e)[:50]}")
-
-        # 更新进度
-        if task:
-            task.processed = processed
-            task.failed = failed
-            task.errors = errors
-
-    await session.commit()
-
-    # 完成任务
-    if task:
-        task.status = "completed"
-        task.completed_at = datetime.now()
+            errors.append(f"{bookmark.title[:20]}: {str(error)[:50]}")
+
+        if on_item:
+            on_item(bookmark, error)
+
+    # 抓取与摘要生成并发流水线执行
+    await run_pipeline(
+        bookmarks,
+        fetch=lambda b: fetch_page_content(b.url),
+        process=lambda b, page_data: summarize_page(b.url, page_data, b.title),
+        on_result=on_result,
+        fetch_concurrency=settings.ai_scrape_concurrency,
+        process_concurrency=settings.ai_llm_concurrency,
+    )
 
     return {
         "processed": processed,
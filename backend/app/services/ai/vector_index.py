@@ -0,0 +1,568 @@
+"""
+书签向量索引
+
+书签的标题、标签和描述被转换为 L2 归一化的 float32 向量，持久化在 bookmark_embeddings 表，
+运行时放在一块连续的 NumPy 矩阵中，搜索时一次矩阵乘法得到全部余弦相似度，再取 top-k。
+
+向量化方式：
+- hashing (默认)：本地确定性向量化，不发网络请求。文档向量为对数词频 + 字段权重，
+  经特征哈希 (带符号) 映射到固定维度；查询向量额外乘以 IDF (SMART lnc.ltc)，
+  因此文档向量与语料无关，可以增量更新。中文按单字和相邻双字切分。
+- openai：调用 OpenAI 兼容的 embedding 接口，查询时也需要请求接口。
+
+书签增删改后调用 mark_changed / mark_removed，索引在后台批量增量更新。
+"""
+import asyncio
+import hashlib
+import json
+import math
+import re
+import zlib
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select, delete
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.bookmark import Bookmark
+from app.models.embedding import BookmarkEmbedding
+from app.services.write_queue import submit_write
+
+settings = get_settings()
+
+# 拉丁字母数字词、CJK 连续片段
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+")
+
+# 字段权重
+TITLE_WEIGHT = 2.0
+TAGS_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+
+# 参与向量化的描述最大长度
+MAX_DESCRIPTION_LENGTH = 2000
+
+# 文档频率按词哈希计数的桶数
+DF_BUCKETS = 1 << 20
+
+# 变更合并等待时间 (秒)
+UPDATE_DEBOUNCE = 0.5
+
+# embedding 接口每次请求的文本数
+EMBEDDING_BATCH_SIZE = 100
+
+# 查询向量缓存 (openai 模式)
+QUERY_CACHE_SIZE = 256
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：英文按词，中日韩文字按单字和相邻双字"""
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        if match[0] < "\u3040":
+            if len(match) > 1 or match.isdigit():
+                tokens.append(match)
+        else:
+            tokens.extend(match)
+            tokens.extend(match[i:i + 2] for i in range(len(match) - 1))
+    return tokens
+
+
+def _parse_tags(tags: Optional[str]) -> str:
+    if not tags:
+        return ""
+    try:
+        parsed = json.loads(tags)
+        if isinstance(parsed, list):
+            return " ".join(str(t) for t in parsed)
+    except (ValueError, TypeError):
+        pass
+    return tags
+
+
+def document_fields(title: Optional[str], tags: Optional[str], description: Optional[str]) -> Tuple[str, str, str]:
+    return (
+        title or "",
+        _parse_tags(tags),
+        (description or "")[:MAX_DESCRIPTION_LENGTH],
+    )
+
+
+def text_hash(fields: Tuple[str, str, str]) -> str:
+    return hashlib.sha256("\0".join(fields).encode("utf-8")).hexdigest()
+
+
+def _token_hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+class HashingVectorizer:
+    """本地特征哈希向量化"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _vector(self, weights: Dict[str, float], idf=None) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token, tf in weights.items():
+            h = _token_hash(token)
+            weight = 1.0 + math.log(tf)
+            if idf is not None:
+                weight *= idf(h)
+            # 最高位决定符号，抵消哈希冲突带来的偏差
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_document(self, fields: Tuple[str, str, str]) -> np.ndarray:
+        weights: Dict[str, float] = {}
+        for text, field_weight in zip(fields, (TITLE_WEIGHT, TAGS_WEIGHT, DESCRIPTION_WEIGHT)):
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0.0) + field_weight
+        return self._vector(weights)
+
+    def embed_query(self, query: str, idf) -> np.ndarray:
+        return self._vector(Counter(tokenize(query)), idf)
+
+
+class OpenAIVectorizer:
+    """OpenAI 兼容 embedding 接口"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.name = f"openai:{model}"
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    async def embed_texts(self, texts: List[str]) -> List[np.ndarray]:
+        from app.services.ai.llm import get_openai_client
+
+        client = get_openai_client()
+        vectors = []
+        for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            batch = [t or " " for t in texts[i:i + EMBEDDING_BATCH_SIZE]]
+            response = await client.embeddings.create(model=self.model, input=batch)
+            for item in sorted(response.data, key=lambda d: d.index):
+                vector = np.asarray(item.embedding, dtype=np.float32)
+                norm = float(np.linalg.norm(vector))
+                vectors.append(vector / norm if norm > 0 else vector)
+        return vectors
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        cached = self._query_cache.get(query)
+        if cached is not None:
+            self._query_cache.move_to_end(query)
+            return cached
+        vector = (await self.embed_texts([query]))[0]
+        self._query_cache[query] = vector
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return vector
+
+
+def get_vectorizer():
+    if settings.ai_search_backend == "openai":
+        return OpenAIVectorizer(settings.ai_embedding_model)
+    return HashingVectorizer(settings.ai_search_dim)
+
+
+class VectorIndex:
+    """连续 float32 矩阵 + 行号映射，删除时用最后一行填补空位"""
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self.size = 0
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.visible = np.zeros(capacity, dtype=bool)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+
+    def _grow(self, needed: int):
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        visible = np.zeros(capacity, dtype=bool)
+        visible[:self.size] = self.visible[:self.size]
+        self.matrix, self.visible = matrix, visible
+
+    def upsert(self, bookmark_id: str, vector: np.ndarray, visible: bool):
+        row = self.rows.get(bookmark_id)
+        if row is None:
+            self._grow(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.ids.append(bookmark_id)
+            self.rows[bookmark_id] = row
+        self.matrix[row] = vector
+        self.visible[row] = visible
+
+    def remove(self, bookmark_id: str):
+        row = self.rows.pop(bookmark_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.visible[row] = self.visible[last]
+            self.ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.ids.pop()
+        self.size -= 1
+
+    def search(self, query: np.ndarray, limit: int, include_hidden: bool, min_score: float) -> List[Tuple[str, float]]:
+        if self.size == 0 or limit <= 0:
+            return []
+        scores = self.matrix[:self.size] @ query
+        if not include_hidden:
+            scores = np.where(self.visible[:self.size], scores, -1.0)
+
+        k = min(limit, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (self.ids[row], float(scores[row]))
+            for row in top
+            if scores[row] >= min_score
+        ]
+
+
+class SearchIndex:
+    """书签搜索索引：加载、增量更新与查询"""
+
+    def __init__(self):
+        self.vectorizer = None
+        self.index: Optional[VectorIndex] = None
+        self.df = np.zeros(DF_BUCKETS, dtype=np.int32)
+        self.documents = 0
+        self._ready = asyncio.Event()
+        self._build_lock = asyncio.Lock()
+        self._pending: Set[str] = set()
+        self._update_task: Optional[asyncio.Task] = None
+        self._full_sync_requested = False
+        self._listeners: List[Callable[[List[str], List[str], bool], Awaitable[None]]] = []
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """持有期间索引不会被修改"""
+        return self._build_lock
+
+    def add_listener(self, callback: Callable[[List[str], List[str], bool], Awaitable[None]]):
+        """
+        注册索引更新回调 callback(changed_ids, removed_ids, rebuilt)
+
+        增量更新后传入变化和删除的书签，全量重建后 rebuilt 为 True。
+        """
+        self._listeners.append(callback)
+
+    async def _notify(self, changed: List[str], removed: List[str], rebuilt: bool):
+        for callback in self._listeners:
+            try:
+                await callback(changed, removed, rebuilt)
+            except Exception as e:
+                print(f"⚠ 搜索索引更新回调失败: {e}")
+
+    # ---------- 构建 ----------
+
+    async def ensure_ready(self):
+        if not self._ready.is_set():
+            async with self._build_lock:
+                if not self._ready.is_set():
+                    await self._build()
+                    self._ready.set()
+            if self._pending or self._full_sync_requested:
+                self._schedule()
+
+    async def _build(self):
+        """从数据库加载向量，只为新增或文本变化的书签重新计算"""
+        vectorizer = get_vectorizer()
+
+        async with read_session_maker() as session:
+            result = await session.execute(
+                select(Bookmark.id, Bookmark.title, Bookmark.tags, Bookmark.description, Bookmark.visible)
+            )
+            bookmarks = result.all()
+            result = await session.execute(
+                select(
+                    BookmarkEmbedding.bookmark_id,
+                    BookmarkEmbedding.model,
+                    BookmarkEmbedding.text_hash,
+                    BookmarkEmbedding.vector,
+                )
+            )
+            stored = {row.bookmark_id: row for row in result.all()}
+
+        def prepare():
+            df = np.zeros(DF_BUCKETS, dtype=np.int32)
+            documents = []
+            for b in bookmarks:
+                fields = document_fields(b.title, b.tags, b.description)
+                for h in {_token_hash(t) for t in tokenize(" ".join(fields))}:
+                    df[h % DF_BUCKETS] += 1
+                documents.append((b.id, bool(b.visible), fields, text_hash(fields)))
+            return df, documents
+
+        df, documents = await asyncio.to_thread(prepare)
+
+        reused = {}
+        changed = []
+        for bookmark_id, visible, fields, digest in documents:
+            row = stored.get(bookmark_id)
+            if row is not None and row.model == vectorizer.name and row.text_hash == digest:
+                reused[bookmark_id] = np.frombuffer(row.vector, dtype=np.float32)
+            else:
+                changed.append((bookmark_id, fields, digest))
+
+        computed = await self._embed_documents(vectorizer, changed)
+        try:
+            await self._store_vectors(vectorizer, changed, computed)
+        except Exception as e:
+            # 多个工作进程同时启动时可能都在补算同一批书签，保存失败不影响本进程的索引
+            print(f"⚠ 保存书签向量失败: {str(e).splitlines()[0]}")
+
+        present = {bookmark_id for bookmark_id, _, _, _ in documents}
+        orphaned = [bookmark_id for bookmark_id in stored if bookmark_id not in present]
+        if orphaned:
+            await self._delete_vectors(orphaned)
+
+        dim = vectorizer.dim if isinstance(vectorizer, HashingVectorizer) else None
+        if dim is None:
+            sample = next(iter(reused.values()), None)
+            if sample is None and computed:
+                sample = computed[0]
+            dim = len(sample) if sample is not None else 1
+
+        vectors = dict(reused)
+        vectors.update({bookmark_id: v for (bookmark_id, _, _), v in zip(changed, computed)})
+
+        index = VectorIndex(dim, capacity=max(1024, len(documents)))
+        for bookmark_id, visible, _, _ in documents:
+            vector = vectors.get(bookmark_id)
+            if vector is not None and len(vector) == dim:
+                index.upsert(bookmark_id, vector, visible)
+
+        self.vectorizer = vectorizer
+        self.index = index
+        self.df = df
+        self.documents = len(documents)
+        print(f"✓ 搜索索引已加载: {index.size} 个书签 ({vectorizer.name}，重新计算 {len(changed)} 个)")
+
+    async def _embed_documents(self, vectorizer, documents) -> List[np.ndarray]:
+        if not documents:
+            return []
+        if isinstance(vectorizer, HashingVectorizer):
+            return await asyncio.to_thread(
+                lambda: [vectorizer.embed_document(fields) for _, fields, _ in documents]
+            )
+        return await vectorizer.embed_texts(["\n".join(fields) for _, fields, _ in documents])
+
+    async def _store_vectors(self, vectorizer, documents, vectors):
+        if not documents:
+            return
+        ids = [bookmark_id for bookmark_id, _, _ in documents]
+
+        async def write(session):
+            for i in range(0, len(ids), 500):
+                await session.execute(
+                    delete(BookmarkEmbedding).where(BookmarkEmbedding.bookmark_id.in_(ids[i:i + 500]))
+                )
+            session.add_all([
+                BookmarkEmbedding(
+                    bookmark_id=bookmark_id,
+                    model=vectorizer.name,
+                    text_hash=digest,
+                    dim=len(vector),
+                    vector=np.ascontiguousarray(vector, dtype=np.float32).tobytes(),
+                )
+                for (bookmark_id, _, digest), vector in zip(documents, vectors)
+            ])
+        await submit_write(write)
+
+    async def _delete_vectors(self, bookmark_ids: List[str]):
+        async def write(session):
+            for i in range(0, len(bookmark_ids), 500):
+                await session.execute(
+                    delete(BookmarkEmbedding).where(BookmarkEmbedding.bookmark_id.in_(bookmark_ids[i:i + 500]))
+                )
+        await submit_write(write)
+
+    # ---------- 增量更新 ----------
+
+    def mark_changed(self, bookmark_ids: Iterable[str]):
+        self._pending.update(bookmark_ids)
+        self._schedule()
+
+    def request_full_sync(self):
+        """批量覆盖书签后 (如恢复备份) 重新对齐索引"""
+        self._full_sync_requested = True
+        self._schedule()
+
+    def _schedule(self):
+        if self._update_task is None or self._update_task.done():
+            try:
+                self._update_task = asyncio.get_running_loop().create_task(self._run_updates())
+            except RuntimeError:
+                # 没有事件循环 (如命令行脚本)，下次构建时再对齐
+                pass
+
+    async def _run_updates(self):
+        await asyncio.sleep(UPDATE_DEBOUNCE)
+        while self._pending or self._full_sync_requested:
+            try:
+                if not self._ready.is_set():
+                    # 索引尚未加载完成：加载可能已读过这些书签的旧数据，保留待处理项，加载完成后再应用
+                    return
+                if self._full_sync_requested:
+                    self._full_sync_requested = False
+                    self._pending.clear()
+                    async with self._build_lock:
+                        await self._build()
+                    await self._notify([], [], True)
+                    continue
+                ids = list(self._pending)
+                self._pending.clear()
+                async with self._build_lock:
+                    changed, removed = await self._apply(ids)
+                await self._notify(changed, removed, False)
+            except Exception as e:
+                print(f"⚠ 更新搜索索引失败: {e}")
+
+    async def _apply(self, bookmark_ids: List[str]) -> Tuple[List[str], List[str]]:
+        """更新指定书签的向量，返回 (变化的书签, 删除的书签)"""
+        vectorizer = self.vectorizer
+        rows = []
+        async with read_session_maker() as session:
+            for i in range(0, len(bookmark_ids), 500):
+                result = await session.execute(
+                    select(Bookmark.id, Bookmark.title, Bookmark.tags, Bookmark.description, Bookmark.visible)
+                    .where(Bookmark.id.in_(bookmark_ids[i:i + 500]))
+                )
+                rows.extend(result.all())
+
+        found = {row.id for row in rows}
+        removed = [bookmark_id for bookmark_id in bookmark_ids if bookmark_id not in found]
+        for bookmark_id in removed:
+            self.index.remove(bookmark_id)
+        if removed:
+            await self._delete_vectors(removed)
+            self.documents = max(0, self.documents - len(removed))
+
+        changed = []
+        for row in rows:
+            fields = document_fields(row.title, row.tags, row.description)
+            changed.append((row.id, fields, text_hash(fields)))
+            if row.id not in self.index.rows:
+                self.documents += 1
+                # 文档频率只增不减，重启或全量对齐时重新统计
+                for h in {_token_hash(t) for t in tokenize(" ".join(fields))}:
+                    self.df[h % DF_BUCKETS] += 1
+
+        # 文本未变的书签 (如只修改了可见性) 或其他工作进程已计算过的书签直接使用保存的向量
+        stored = {}
+        async with read_session_maker() as session:
+            ids = [bookmark_id for bookmark_id, _, _ in changed]
+            for i in range(0, len(ids), 500):
+                result = await session.execute(
+                    select(BookmarkEmbedding.bookmark_id, BookmarkEmbedding.text_hash, BookmarkEmbedding.vector)
+                    .where(
+                        BookmarkEmbedding.bookmark_id.in_(ids[i:i + 500]),
+                        BookmarkEmbedding.model == vectorizer.name,
+                    )
+                )
+                stored.update({row.bookmark_id: row for row in result.all()})
+        missing = [
+            document for document in changed
+            if document[0] not in stored or stored[document[0]].text_hash != document[2]
+        ]
+        computed = await self._embed_documents(vectorizer, missing)
+        try:
+            await self._store_vectors(vectorizer, missing, computed)
+        except Exception as e:
+            # 其他工作进程可能同时保存了同一书签的向量，保存失败不影响本进程的索引
+            print(f"⚠ 保存书签向量失败: {e}")
+        computed = {bookmark_id: vector for (bookmark_id, _, _), vector in zip(missing, computed)}
+        vectors = [
+            computed[bookmark_id] if bookmark_id in computed
+            else np.frombuffer(stored[bookmark_id].vector, dtype=np.float32)
+            for bookmark_id, _, _ in changed
+        ]
+        if vectors and self.index.size == 0 and len(vectors[0]) != self.index.dim:
+            # 空索引首次得到 embedding 接口返回的向量，按实际维度重建
+            self.index = VectorIndex(len(vectors[0]))
+        visible = {row.id: bool(row.visible) for row in rows}
+        for (bookmark_id, _, _), vector in zip(changed, vectors):
+            if len(vector) == self.index.dim:
+                self.index.upsert(bookmark_id, vector, visible[bookmark_id])
+        return [bookmark_id for bookmark_id, _, _ in changed], removed
+
+    # ---------- 查询 ----------
+
+    def _idf(self, token_hash: int) -> float:
+        df = int(self.df[token_hash % DF_BUCKETS])
+        return math.log((self.documents + 1) / (df + 1)) + 1.0
+
+    async def search(
+        self,
+        query: str,
+        limit: int = 10,
+        include_hidden: bool = False,
+    ) -> List[Tuple[str, float]]:
+        """返回 [(bookmark_id, 相似度)]，按相似度降序"""
+        await self.ensure_ready()
+        vectorizer = self.vectorizer
+        if isinstance(vectorizer, HashingVectorizer):
+            vector = vectorizer.embed_query(query, self._idf)
+        else:
+            vector = await vectorizer.embed_query(query)
+        if not vector.any() or len(vector) != self.index.dim:
+            return []
+        return self.index.search(vector, limit, include_hidden, settings.ai_search_min_score)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self._ready.is_set(),
+            "backend": self.vectorizer.name if self.vectorizer else None,
+            "size": self.index.size if self.index else 0,
+            "dim": self.index.dim if self.index else 0,
+            "memory_bytes": int(self.index.matrix.nbytes) if self.index else 0,
+        }
+
+
+_search_index = SearchIndex()
+
+
+def get_search_index() -> SearchIndex:
+    return _search_index
+
+
+async def warm_up():
+    """启动时在后台加载索引"""
+    try:
+        await _search_index.ensure_ready()
+    except Exception as e:
+        print(f"⚠ 加载搜索索引失败: {e}")
+
+
+def mark_changed(bookmark_ids: Iterable[str]):
+    """书签新增或修改后调用，索引在后台更新"""
+    _search_index.mark_changed(bookmark_ids)
+
+
+def mark_removed(bookmark_ids: Iterable[str]):
+    """书签删除后调用 (与修改走同一流程，查不到的书签会被移出索引)"""
+    _search_index.mark_changed(bookmark_ids)
+
+
+def request_full_sync():
+    _search_index.request_full_sync()
+
+
+async def search_bookmarks(query: str, limit: int = 10, include_hidden: bool = False):
+    return await _search_index.search(query, limit=limit, include_hidden=include_hidden)
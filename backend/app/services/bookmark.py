@@ -11,13 +11,15 @@ import asyncio
 from app.models.bookmark import Bookmark
 from app.models.category import CategoryOrder
 from app.schemas.bookmark import BookmarkCreate, BookmarkUpdate
+from app.services.write_queue import submit_write
 
 
 async def get_bookmarks(
     session: AsyncSession,
     include_hidden: bool = False,
+    broken_only: bool = False,
 ) -> List[Bookmark]:
-    """获取所有书签 (按分类和顺序排列)"""
+    """获取所有书签 (按分类和顺序排列)，broken_only 时只返回链接失效的书签"""
     # 先获取分类顺序
     cat_result = await session.execute(
         select(CategoryOrder).order_by(CategoryOrder.order)
@@ -28,6 +30,9 @@ async def get_bookmarks(
     query = select(Bookmark)
     if not include_hidden:
         query = query.where(Bookmark.visible == True)
+    if broken_only:
+        from app.services.link_checker import broken_link_condition
+        query = query.where(broken_link_condition())
 
     result = await session.execute(query)
     bookmarks = result.scalars().all()
@@ -52,92 +57,138 @@ async def get_bookmark_by_id(
 
 
 async def create_bookmark(
-    session: AsyncSession,
-    data: BookmarkCreate
+    data: BookmarkCreate,
+    enrich_later: bool = False,
 ) -> Bookmark:
-    """创建书签"""
-    # 获取该分类的最大顺序
-    result = await session.execute(
-        select(func.max(Bookmark.order)).where(Bookmark.category == data.category)
-    )
-    max_order = result.scalar() or 0
-
-    bookmark = Bookmark(
-        id=str(uuid.uuid4()),
-        title=data.title,
-        url=data.url,
-        category=data.category,
-        description=data.description,
-        tags=data.tags,
-        visible=data.visible,
-        order=max_order + 1,
-    )
-    session.add(bookmark)
+    """
+    创建书签
+
+    enrich_later 为 True 时，标题、图标、描述、标签和分类由后台任务补全，
+    本次请求只写入书签和补全任务 (同一事务，不会出现没有补全任务的待补全书签)。
+    """
+    async def write(write_session: AsyncSession) -> Bookmark:
+        # 获取该分类的最大顺序
+        result = await write_session.execute(
+            select(func.max(Bookmark.order)).where(Bookmark.category == data.category)
+        )
+        max_order = result.scalar() or 0
+
+        bookmark = Bookmark(
+            id=str(uuid.uuid4()),
+            title=data.title,
+            url=data.url,
+            category=data.category,
+            description=data.description,
+            tags=data.tags,
+            visible=data.visible,
+            order=max_order + 1,
+            favicon=data.favicon,
+            enrich_status="pending" if enrich_later else None,
+        )
+        write_session.add(bookmark)
+
+        # 确保分类在排序表中
+        if data.category:
+            await ensure_category_exists(write_session, data.category)
 
-    # 确保分类在排序表中
-    if data.category:
-        await ensure_category_exists(session, data.category)
+        await write_session.flush()
+        if enrich_later:
+            from app.services.ai.job_queue import add_job
 
-    await session.commit()
-    await session.refresh(bookmark)
+            await add_job(write_session, ["enrich"], [bookmark.id])
+        await write_session.refresh(bookmark)
+        return bookmark
+
+    bookmark = await submit_write(write)
+
+    if enrich_later:
+        from app.services.ai.job_queue import notify_worker
+
+        notify_worker()
+
+    from app.services.favicon import schedule_prefetch
+    from app.services.coordination import bookmarks_changed
+
+    schedule_prefetch([bookmark.id])
+    bookmarks_changed([bookmark.id])
 
     return bookmark
 
 
 async def update_bookmark(
-    session: AsyncSession,
     bookmark_id: str,
     data: BookmarkUpdate
 ) -> Optional[Bookmark]:
     """更新书签"""
-    bookmark = await get_bookmark_by_id(session, bookmark_id)
-    if bookmark is None:
-        return None
-
     update_data = data.model_dump(exclude_unset=True)
 
-    for key, value in update_data.items():
-        setattr(bookmark, key, value)
+    async def write(write_session: AsyncSession) -> Optional[Bookmark]:
+        bookmark = await get_bookmark_by_id(write_session, bookmark_id)
+        if bookmark is None:
+            return None
+
+        # 链接变了，清除旧的检查结果，下次检查时优先处理
+        if update_data.get("url") and update_data["url"] != bookmark.url:
+            bookmark.link_status_code = None
+            bookmark.link_final_url = None
+            bookmark.link_latency_ms = None
+            bookmark.link_error = None
+            bookmark.link_checked_at = None
+
+        for key, value in update_data.items():
+            setattr(bookmark, key, value)
 
-    # 如果分类变了，确保新分类存在
-    if "category" in update_data and update_data["category"]:
-        await ensure_category_exists(session, update_data["category"])
+        # 如果分类变了，确保新分类存在
+        if "category" in update_data and update_data["category"]:
+            await ensure_category_exists(write_session, update_data["category"])
 
-    await session.commit()
-    await session.refresh(bookmark)
+        await write_session.flush()
+        await write_session.refresh(bookmark)
+        return bookmark
+
+    bookmark = await submit_write(write)
+    if bookmark is None:
+        return None
+
+    from app.services.coordination import bookmarks_changed
+
+    bookmarks_changed([bookmark.id])
 
     return bookmark
 
 
 async def delete_bookmark(
-    session: AsyncSession,
     bookmark_id: str
 ) -> bool:
     """删除书签"""
-    bookmark = await get_bookmark_by_id(session, bookmark_id)
-    if bookmark is None:
+    async def write(write_session: AsyncSession) -> bool:
+        result = await write_session.execute(delete(Bookmark).where(Bookmark.id == bookmark_id))
+        return bool(result.rowcount)
+
+    if not await submit_write(write):
         return False
 
-    await session.delete(bookmark)
-    await session.commit()
+    from app.services.coordination import bookmarks_removed
+
+    bookmarks_removed([bookmark_id])
     return True
 
 
 async def reorder_bookmarks(
-    session: AsyncSession,
     category: str,
     bookmark_ids: List[str]
 ) -> bool:
     """重新排序分类内的书签"""
-    for index, bid in enumerate(bookmark_ids):
-        result = await session.execute(
-            select(Bookmark).where(Bookmark.id == bid)
-        )
-        bookmark = result.scalar_one_or_none()
-        if bookmark:
-            bookmark.order = index
-
-    await session.commit()
+    async def write(write_session: AsyncSession):
+        for index, bid in enumerate(bookmark_ids):
+            result = await write_session.execute(
+                select(Bookmark).where(Bookmark.id == bid)
+            )
+            bookmark = result.scalar_one_or_none()
+            if bookmark:
+                bookmark.order = index
+
+    await submit_write(write)
     return True
 
 
@@ -172,121 +223,140 @@ async def get_category_order(session: AsyncSession) -> List[CategoryOrder]:
 
 
 async def reorder_categories(
-    session: AsyncSession,
     categories: List[str]
 ) -> bool:
     """重新排序分类"""
-    for index, cat in enumerate(categories):
-        result = await session.execute(
-            select(CategoryOrder).where(CategoryOrder.category == cat)
-        )
-        cat_order = result.scalar_one_or_none()
-        if cat_order:
-            cat_order.order = index
-        else:
-            session.add(CategoryOrder(category=cat, order=index))
-
-    await session.commit()
+    async def write(write_session: AsyncSession):
+        for index, cat in enumerate(categories):
+            result = await write_session.execute(
+                select(CategoryOrder).where(CategoryOrder.category == cat)
+            )
+            cat_order = result.scalar_one_or_none()
+            if cat_order:
+                cat_order.order = index
+            else:
+                write_session.add(CategoryOrder(category=cat, order=index))
+
+    await submit_write(write)
     return True
 
 
-async def create_category(session: AsyncSession, category: str) -> CategoryOrder:
+async def create_category(category: str) -> CategoryOrder:
     """创建新分类"""
-    # 检查是否已存在
-    result = await session.execute(
-        select(CategoryOrder).where(CategoryOrder.category == category)
-    )
-    existing = result.scalar_one_or_none()
-    if existing:
-        return existing
+    async def write(write_session: AsyncSession) -> CategoryOrder:
+        # 检查是否已存在
+        result = await write_session.execute(
+            select(CategoryOrder).where(CategoryOrder.category == category)
+        )
+        existing = result.scalar_one_or_none()
+        if existing:
+            return existing
 
-    # 获取最大顺序
-    max_result = await session.execute(select(func.max(CategoryOrder.order)))
-    max_order = max_result.scalar() or 0
+        # 获取最大顺序
+        max_result = await write_session.execute(select(func.max(CategoryOrder.order)))
+        max_order = max_result.scalar() or 0
 
-    cat_order = CategoryOrder(category=category, order=max_order + 1)
-    session.add(cat_order)
-    await session.commit()
-    await session.refresh(cat_order)
-    return cat_order
+        cat_order = CategoryOrder(category=category, order=max_order + 1)
+        write_session.add(cat_order)
+        await write_session.flush()
+        await write_session.refresh(cat_order)
+        return cat_order
 
+    return await submit_write(write)
 
-async def update_category(session: AsyncSession, old_name: str, new_name: str) -> bool:
+
+async def update_category(old_name: str, new_name: str) -> bool:
     """更新分类名称（同时更新 CategoryOrder 和所有书签）"""
-    # 检查新名称是否已存在
-    result = await session.execute(
-        select(CategoryOrder).where(CategoryOrder.category == new_name)
-    )
-    if result.scalar_one_or_none():
-        return False  # 新名称已存在
+    async def write(write_session: AsyncSession) -> Optional[List[str]]:
+        # 检查新名称是否已存在
+        result = await write_session.execute(
+            select(CategoryOrder).where(CategoryOrder.category == new_name)
+        )
+        if result.scalar_one_or_none():
+            return None  # 新名称已存在
 
-    # 更新 CategoryOrder 表
-    result = await session.execute(
-        select(CategoryOrder).where(CategoryOrder.category == old_name)
-    )
-    cat_order = result.scalar_one_or_none()
-    if not cat_order:
-        return False  # 旧分类不存在
+        # 更新 CategoryOrder 表
+        result = await write_session.execute(
+            select(CategoryOrder).where(CategoryOrder.category == old_name)
+        )
+        cat_order = result.scalar_one_or_none()
+        if not cat_order:
+            return None  # 旧分类不存在
 
-    cat_order.category = new_name
+        cat_order.category = new_name
 
-    # 更新所有使用该分类的书签
-    result = await session.execute(
-        select(Bookmark).where(Bookmark.category == old_name)
-    )
-    bookmarks = result.scalars().all()
-    for bookmark in bookmarks:
-        bookmark.category = new_name
+        # 更新所有使用该分类的书签
+        result = await write_session.execute(
+            select(Bookmark).where(Bookmark.category == old_name)
+        )
+        bookmarks = result.scalars().all()
+        for bookmark in bookmarks:
+            bookmark.category = new_name
+        return [bookmark.id for bookmark in bookmarks]
 
-    await session.commit()
+    bookmark_ids = await submit_write(write)
+    if bookmark_ids is None:
+        return False
+
+    from app.services.coordination import categories_changed
+
+    categories_changed(bookmark_ids)
     return True
 
 
-async def delete_category(session: AsyncSession, category: str) -> bool:
+async def delete_category(category: str) -> bool:
     """删除分类（仅从排序表中删除，不影响书签）"""
-    result = await session.execute(
-        select(CategoryOrder).where(CategoryOrder.category == category)
-    )
-    cat_order = result.scalar_one_or_none()
-    if cat_order:
-        await session.delete(cat_order)
-        await session.commit()
-        return True
-    return False
+    async def write(write_session: AsyncSession) -> bool:
+        result = await write_session.execute(
+            delete(CategoryOrder).where(CategoryOrder.category == category)
+        )
+        return bool(result.rowcount)
+
+    return await submit_write(write)
 
 
 async def import_bookmarks(
-    session: AsyncSession,
     bookmarks_data: List[dict],
     skip_category: bool = False
 ) -> int:
-    """批量导入书签"""
-    count = 0
-    added_categories = set()
+    """批量导入书签 (整批在写入队列的一个操作中写入)"""
     default_category = "默认分类"  # 默认分类名
 
-    for data in bookmarks_data:
-        # 若分类为空，使用默认分类名
-        category = data.get("category") or default_category
-        
-        bookmark = Bookmark(
-            id=data.get("id") or str(uuid.uuid4()),
-            title=data["title"],
-            url=data["url"],
-            category=category,
-            description=data.get("description"),
-            tags=data.get("tags"),
-            visible=data.get("visible", True),
-            order=data.get("order", 0),
-        )
-        session.add(bookmark)
-
-        # 处理分类：自动创建分类记录
-        if not skip_category and category not in added_categories:
-            await ensure_category_exists(session, category)
-            added_categories.add(category)
-
-        count += 1
+    async def write(write_session: AsyncSession) -> List[str]:
+        added_categories = set()
+        imported_ids = []
+
+        for data in bookmarks_data:
+            # 若分类为空，使用默认分类名
+            category = data.get("category") or default_category
+
+            bookmark = Bookmark(
+                id=data.get("id") or str(uuid.uuid4()),
+                title=data["title"],
+                url=data["url"],
+                category=category,
+                description=data.get("description"),
+                tags=data.get("tags"),
+                favicon=data.get("favicon"),
+                visible=data.get("visible", True),
+                order=data.get("order", 0),
+            )
+            write_session.add(bookmark)
+            imported_ids.append(bookmark.id)
+
+            # 处理分类：自动创建分类记录
+            if not skip_category and category not in added_categories:
+                await ensure_category_exists(write_session, category)
+                added_categories.add(category)
+        return imported_ids
+
+    imported_ids = await submit_write(write)
+    count = len(imported_ids)
+
+    from app.services.favicon import schedule_prefetch
+    from app.services.coordination import bookmarks_changed
+
+    schedule_prefetch(imported_ids)
+    bookmarks_changed(imported_ids)
 
-    await session.commit()
     return count
@@ -0,0 +1,439 @@
+"""
+多进程协调
+
+python -m app.serve 可以启动多个工作进程，每个进程都有自己的定时任务调度器、LLM 运行时配置、
+搜索索引、本地分类器和 SSE 订阅者。这里通过数据库让各进程保持一致：
+
+- 领导者租约：service_leases 表中的一行，持有者每 1/3 租期续约一次。只有持有租约的进程运行定时任务
+  (WebDAV 备份、链接检查、近似重复扫描)；持有者退出时释放租约，异常退出时最多 COORDINATION_LEASE_SECONDS
+  秒后由其他进程接替。
+- 变更事件：书签增删改、AI 配置和备份时间修改、SSE 事件写入 change_events 表，各进程每
+  COORDINATION_POLL_SECONDS 秒读取其他进程产生的新事件并更新自己的内存状态，
+  其他进程最多延迟约一个轮询间隔看到变化。
+
+写入队列按进程运行，多个进程的写事务依靠 BEGIN IMMEDIATE + busy_timeout 在数据库层面排队；
+AI 任务队列按 worker_id 认领任务，不需要额外协调。
+"""
+import asyncio
+import json
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, or_, select, update
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.coordination import ChangeEvent, ServiceLease
+from app.services.write_queue import submit_write
+
+settings = get_settings()
+
+# 当前进程的标识
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# 运行定时任务的租约名
+SCHEDULER_LEASE = "scheduler"
+
+# 每次轮询读取的事件数上限
+POLL_BATCH_SIZE = 500
+
+# 轮询时回看已读过的 ID 范围：并发提交的事务可能让较小的 ID 晚于较大的 ID 可见
+POLL_LOOKBACK = 256
+
+# 清理过期事件的间隔 (秒)
+PRUNE_INTERVAL = 300
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Coordinator:
+    """领导者租约 + 变更事件的发送和轮询"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._outbox: List[Tuple[str, dict]] = []
+        self._handlers: Dict[str, Handler] = {}
+        self._last_id = 0
+        self._seen: deque = deque(maxlen=POLL_LOOKBACK * 4)
+        self._seen_set: set = set()
+        self._leader = False
+        self._lease_renewed_at: Optional[datetime] = None
+        self._pruned_at: Optional[datetime] = None
+        self._on_elected: Optional[Callable[[], Awaitable[None]]] = None
+        self._on_demoted: Optional[Callable[[], None]] = None
+        self.sent = 0
+        self.received = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader
+
+    def register(self, topic: str, handler: Handler):
+        """注册其他进程事件的处理函数"""
+        self._handlers[topic] = handler
+
+    # ---------- 发送 ----------
+
+    def broadcast(self, topic: str, payload: Optional[dict] = None):
+        """在后台把事件发送给其他进程 (同一轮发送中相同主题的书签 ID 合并为一个事件)"""
+        if not settings.coordination_enabled:
+            return
+        payload = payload or {}
+        for i, (pending_topic, pending_payload) in enumerate(self._outbox):
+            if pending_topic == topic and "ids" in payload and "ids" in pending_payload:
+                self._outbox[i] = (topic, {"ids": list(dict.fromkeys(pending_payload["ids"] + payload["ids"]))})
+                break
+        else:
+            self._outbox.append((topic, payload))
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+            except RuntimeError:
+                # 没有事件循环 (如命令行脚本)，其他进程也不存在
+                self._outbox.clear()
+
+    async def notify(self, topic: str, payload: Optional[dict] = None):
+        """发送事件并等待写入完成"""
+        if settings.coordination_enabled:
+            await self._write([(topic, payload or {})])
+
+    async def _flush(self):
+        while self._outbox:
+            events, self._outbox = self._outbox, []
+            try:
+                await self._write(events)
+            except Exception as e:
+                print(f"⚠ 发送变更事件失败: {e}")
+
+    async def _write(self, events: List[Tuple[str, dict]]):
+        async def write(session):
+            session.add_all([
+                ChangeEvent(topic=topic, payload=json.dumps(payload, ensure_ascii=False), origin=PROCESS_ID)
+                for topic, payload in events
+            ])
+
+        await submit_write(write)
+        self.sent += len(events)
+
+    # ---------- 轮询 ----------
+
+    async def _poll(self):
+        async with read_session_maker() as session:
+            result = await session.execute(
+                select(ChangeEvent.id, ChangeEvent.topic, ChangeEvent.payload, ChangeEvent.origin)
+                .where(ChangeEvent.id > self._last_id - POLL_LOOKBACK)
+                .order_by(ChangeEvent.id)
+                .limit(POLL_BATCH_SIZE + POLL_LOOKBACK)
+            )
+            rows = [row for row in result.all() if row.id not in self._seen_set]
+
+        for row in rows[:POLL_BATCH_SIZE]:
+            self._remember(row.id)
+            if row.origin == PROCESS_ID:
+                continue
+            handler = self._handlers.get(row.topic)
+            if handler is None:
+                continue
+            self.received += 1
+            try:
+                await handler(json.loads(row.payload) if row.payload else {})
+            except Exception as e:
+                print(f"⚠ 处理变更事件 {row.topic} 失败: {e}")
+
+    def _remember(self, event_id: int):
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_set.discard(self._seen[0])
+        self._seen.append(event_id)
+        self._seen_set.add(event_id)
+        self._last_id = max(self._last_id, event_id)
+
+    async def _skip_history(self):
+        """启动时跳过已有事件 (内存状态随后从数据库加载)"""
+        async with read_session_maker() as session:
+            result = await session.execute(
+                select(ChangeEvent.id).order_by(ChangeEvent.id.desc()).limit(POLL_LOOKBACK)
+            )
+            for event_id in reversed(result.scalars().all()):
+                self._remember(event_id)
+
+    async def _prune(self):
+        before = datetime.now() - timedelta(minutes=settings.coordination_event_retention_minutes)
+
+        async def prune(session):
+            await session.execute(delete(ChangeEvent).where(ChangeEvent.created_at < before))
+
+        await submit_write(prune)
+
+    # ---------- 租约 ----------
+
+    async def _acquire_lease(self) -> bool:
+        """获取或续约定时任务租约，返回当前进程是否持有"""
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=settings.coordination_lease_seconds)
+
+        async def acquire(session):
+            result = await session.execute(
+                update(ServiceLease)
+                .where(
+                    ServiceLease.name == SCHEDULER_LEASE,
+                    or_(ServiceLease.holder == PROCESS_ID, ServiceLease.expires_at < now),
+                )
+                .values(holder=PROCESS_ID, expires_at=expires_at)
+            )
+            if result.rowcount:
+                return True
+            if await session.get(ServiceLease, SCHEDULER_LEASE) is not None:
+                return False
+            session.add(ServiceLease(name=SCHEDULER_LEASE, holder=PROCESS_ID, expires_at=expires_at))
+            await session.flush()
+            return True
+
+        try:
+            return await submit_write(acquire)
+        except Exception:
+            # 同时插入时主键冲突，由另一个进程持有
+            return False
+
+    async def _release_lease(self):
+        async def release(session):
+            await session.execute(
+                delete(ServiceLease).where(ServiceLease.name == SCHEDULER_LEASE, ServiceLease.holder == PROCESS_ID)
+            )
+
+        await submit_write(release)
+
+    async def _update_leadership(self):
+        held = await self._acquire_lease()
+        if held and not self._leader:
+            self._leader = True
+            print(f"✓ 当前进程负责运行定时任务 ({PROCESS_ID})")
+            if self._on_elected is not None:
+                await self._on_elected()
+        elif not held and self._leader:
+            self._leader = False
+            print("⚠ 定时任务租约已被其他进程接管")
+            if self._on_demoted is not None:
+                self._on_demoted()
+        self._lease_renewed_at = datetime.now()
+
+    # ---------- 生命周期 ----------
+
+    async def start(
+        self,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], None],
+    ):
+        """启动协调；成为领导者时调用 on_elected，失去租约时调用 on_demoted"""
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        if not settings.coordination_enabled:
+            # 单进程部署：当前进程直接运行定时任务
+            self._leader = True
+            await on_elected()
+            return
+        await self._skip_history()
+        await self._update_leadership()
+        self._task = asyncio.create_task(self._run())
+        print(f"✓ 多进程协调已启动，每 {settings.coordination_poll_seconds:g} 秒同步一次")
+
+    async def _run(self):
+        renew_interval = max(1.0, settings.coordination_lease_seconds / 3)
+        poll_interval = max(0.1, settings.coordination_poll_seconds)
+        while True:
+            await asyncio.sleep(poll_interval)
+            try:
+                await self._poll()
+                now = datetime.now()
+                if (now - self._lease_renewed_at).total_seconds() >= renew_interval:
+                    await self._update_leadership()
+                if self._leader and (self._pruned_at is None or (now - self._pruned_at).total_seconds() >= PRUNE_INTERVAL):
+                    self._pruned_at = now
+                    await self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠ 多进程协调失败: {e}")
+
+    async def stop(self):
+        """停止轮询，发送未发出的事件并释放租约"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        if self._leader:
+            self._leader = False
+            if self._on_demoted is not None:
+                self._on_demoted()
+            if settings.coordination_enabled:
+                try:
+                    await self._release_lease()
+                except Exception as e:
+                    print(f"⚠ 释放定时任务租约失败: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.coordination_enabled,
+            "process_id": PROCESS_ID,
+            "leader": self._leader,
+            "last_event_id": self._last_id,
+            "sent": self.sent,
+            "received": self.received,
+        }
+
+
+_coordinator = Coordinator()
+
+
+def get_coordinator() -> Coordinator:
+    return _coordinator
+
+
+def is_leader() -> bool:
+    """当前进程是否负责运行定时任务"""
+    return _coordinator.is_leader
+
+
+# ---------- 书签变更 ----------
+
+def bookmarks_changed(bookmark_ids: Iterable[str]):
+    """书签新增或修改后调用：更新本进程的索引并通知其他进程"""
+    bookmark_ids = list(bookmark_ids)
+    if not bookmark_ids:
+        return
+    _apply_bookmarks_changed(bookmark_ids)
+    _coordinator.broadcast("bookmarks.changed", {"ids": bookmark_ids})
+
+
+def bookmarks_removed(bookmark_ids: Iterable[str]):
+    """书签删除后调用"""
+    bookmark_ids = list(bookmark_ids)
+    if not bookmark_ids:
+        return
+    _apply_bookmarks_removed(bookmark_ids)
+    _coordinator.broadcast("bookmarks.removed", {"ids": bookmark_ids})
+
+
+def categories_changed(bookmark_ids: Iterable[str]):
+    """只修改了书签分类时调用 (搜索索引不受影响)"""
+    bookmark_ids = list(bookmark_ids)
+    if not bookmark_ids:
+        return
+    _apply_categories_changed(bookmark_ids)
+    _coordinator.broadcast("bookmarks.categorized", {"ids": bookmark_ids})
+
+
+def bookmarks_reloaded():
+    """批量覆盖书签后 (如恢复备份) 调用，各进程的索引重新与数据库对齐"""
+    _apply_bookmarks_reloaded()
+    _coordinator.broadcast("bookmarks.reloaded")
+
+
+def _apply_bookmarks_changed(bookmark_ids: List[str]):
+    from app.services.ai import local_classifier, vector_index
+
+    vector_index.mark_changed(bookmark_ids)
+    local_classifier.mark_changed(bookmark_ids)
+
+
+def _apply_bookmarks_removed(bookmark_ids: List[str]):
+    from app.services.ai import local_classifier, vector_index
+
+    vector_index.mark_removed(bookmark_ids)
+    local_classifier.mark_changed(bookmark_ids)
+
+
+def _apply_categories_changed(bookmark_ids: List[str]):
+    from app.services.ai import local_classifier
+
+    local_classifier.mark_changed(bookmark_ids)
+
+
+def _apply_bookmarks_reloaded():
+    from app.services.ai import local_classifier, vector_index
+
+    vector_index.request_full_sync()
+    local_classifier.request_full_sync()
+
+
+# ---------- 配置变更 ----------
+
+async def ai_config_changed():
+    """AI 配置保存后调用 (本进程已重新加载)，其他进程在下次轮询时从数据库重新加载"""
+    await _coordinator.notify("config.ai")
+
+
+async def backup_schedule_changed(backup_time: str):
+    """备份时间保存后调用，由运行定时任务的进程更新调度"""
+    from app.services.scheduler import update_backup_schedule
+
+    if is_leader():
+        await update_backup_schedule(backup_time)
+    await _coordinator.notify("schedule.backup", {"time": backup_time})
+
+
+async def _on_ai_config(payload: dict):
+    from app.api.settings import reload_ai_config
+
+    async with read_session_maker() as session:
+        await reload_ai_config(session)
+
+
+async def _on_backup_schedule(payload: dict):
+    from app.services.scheduler import update_backup_schedule
+
+    if is_leader() and payload.get("time"):
+        await update_backup_schedule(payload["time"])
+
+
+async def _on_bookmarks_changed(payload: dict):
+    _apply_bookmarks_changed(payload.get("ids") or [])
+
+
+async def _on_bookmarks_removed(payload: dict):
+    _apply_bookmarks_removed(payload.get("ids") or [])
+
+
+async def _on_categories_changed(payload: dict):
+    _apply_categories_changed(payload.get("ids") or [])
+
+
+async def _on_bookmarks_reloaded(payload: dict):
+    _apply_bookmarks_reloaded()
+
+
+async def _on_event(payload: dict):
+    from app.services.events import deliver
+
+    deliver(payload["event"], payload.get("data") or {})
+
+
+_coordinator.register("bookmarks.changed", _on_bookmarks_changed)
+_coordinator.register("bookmarks.removed", _on_bookmarks_removed)
+_coordinator.register("bookmarks.categorized", _on_categories_changed)
+_coordinator.register("bookmarks.reloaded", _on_bookmarks_reloaded)
+_coordinator.register("config.ai", _on_ai_config)
+_coordinator.register("schedule.backup", _on_backup_schedule)
+_coordinator.register("event", _on_event)
+
+
+# ---------- 生命周期 ----------
+
+async def start_coordination():
+    """启动多进程协调，由取得租约的进程运行定时任务"""
+    from app.services.scheduler import init_scheduler, shutdown_scheduler
+
+    await _coordinator.start(on_elected=init_scheduler, on_demoted=shutdown_scheduler)
+
+
+async def stop_coordination():
+    await _coordinator.stop()
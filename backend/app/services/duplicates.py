@@ -0,0 +1,368 @@
+"""
+近似重复检测
+
+为书签的标题和网页正文 (fetch_page_content 提取的文本) 计算 MinHash 签名：
+文本切成连续 3 个词的片段 (中日韩文字按单字)，128 个哈希函数各取最小值，
+两个签名相同位置相等的比例即片段集合 Jaccard 相似度的估计。
+
+签名分成 16 段 (每段 8 个值)，每段的哈希作为一个桶写入 bookmark_lsh_buckets 表，
+至少有一段完全相同的书签才作为候选比较 (LSH)，Jaccard 约 0.7 以上的书签大概率落在同一个桶，
+查找候选只需按桶查索引，不做两两比较。镜像站、AMP 页面和转载文章即使 URL 不同也能被发现。
+
+签名由定时任务补算：新书签、地址变化的书签，以及内容不足、过了重试时间的书签。
+"""
+import asyncio
+import hashlib
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, delete, func, tuple_
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.bookmark import Bookmark
+from app.models.signature import BookmarkSignature, BookmarkLSHBucket
+from app.services.ai.vector_index import TOKEN_PATTERN
+from app.services.write_queue import submit_write
+from app.utils.web_scraper import fetch_page_content
+
+settings = get_settings()
+
+# 片段长度 (词数)
+SHINGLE_SIZE = 3
+
+# 哈希函数个数 = 分段数 × 每段行数
+NUM_PERM = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# 参与签名计算的文本最大长度
+MAX_TEXT_LENGTH = 20000
+
+# 哈希函数 (a * x + b) mod p 的参数，固定种子保证各进程、重启前后签名一致
+_PRIME = (1 << 32) + 15
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_run_lock = asyncio.Lock()
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def shingles(text: str) -> List[int]:
+    """文本片段的 32 位哈希 (去重)"""
+    words = []
+    for match in TOKEN_PATTERN.findall(text[:MAX_TEXT_LENGTH].lower()):
+        if match[0] < "\u3040":
+            words.append(match)
+        else:
+            words.extend(match)
+    if len(words) < SHINGLE_SIZE:
+        return []
+    return list({
+        zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    })
+
+
+def compute_minhash(hashes: List[int]) -> np.ndarray:
+    """MinHash 签名 (uint32 × NUM_PERM)"""
+    values = np.asarray(hashes, dtype=np.uint64)
+    # a < 2^32、x < 2^32、b < 2^32，乘加不会溢出 uint64
+    permuted = (np.outer(values, _PERM_A) + _PERM_B) % _PRIME
+    return (permuted.min(axis=0) & 0xFFFFFFFF).astype(np.uint32)
+
+
+def lsh_buckets(signature: np.ndarray) -> List[int]:
+    """每段签名的 64 位桶编号 (有符号，便于数据库存储)"""
+    buckets = []
+    for band in range(LSH_BANDS):
+        chunk = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+def estimate_similarity(a: bytes, b: bytes) -> float:
+    """两个签名的 Jaccard 相似度估计"""
+    return float(np.mean(np.frombuffer(a, dtype=np.uint32) == np.frombuffer(b, dtype=np.uint32)))
+
+
+def _signature_text(title: Optional[str], description: Optional[str], page: Optional[dict]) -> str:
+    """标题 + 网页正文；抓取不到正文时使用描述"""
+    page = page or {}
+    body = page.get("content") or page.get("description") or description or ""
+    return f"{title or page.get('title') or ''}\n{body}".strip()
+
+
+def _sign(text: str) -> Tuple[Optional[np.ndarray], int]:
+    """计算签名，返回 (签名, 片段数)，内容不足时签名为 None"""
+    if len(text) < settings.duplicate_min_text_length:
+        return None, 0
+    hashes = shingles(text)
+    if not hashes:
+        return None, 0
+    return compute_minhash(hashes), len(hashes)
+
+
+def is_duplicate_scan_running() -> bool:
+    """本进程是否正在扫描"""
+    return _run_lock.locked()
+
+
+async def run_duplicate_scan(time_budget: Optional[int] = None) -> dict:
+    """
+    为缺少签名的书签计算签名，直到全部完成或用完时间
+
+    同一进程同时只运行一轮。
+    """
+    if _run_lock.locked():
+        return {"skipped": True, "computed": 0}
+
+    async with _run_lock:
+        budget = time_budget or settings.duplicate_scan_time_budget
+        deadline = time.monotonic() + budget
+        semaphore = asyncio.Semaphore(settings.duplicate_scan_concurrency)
+        computed = 0
+
+        # 清理已删除书签的签名
+        async def cleanup(session):
+            await session.execute(
+                delete(BookmarkSignature).where(BookmarkSignature.bookmark_id.not_in(select(Bookmark.id)))
+            )
+            await session.execute(
+                delete(BookmarkLSHBucket).where(BookmarkLSHBucket.bookmark_id.not_in(select(Bookmark.id)))
+            )
+        await submit_write(cleanup)
+
+        async def fetch(url: str) -> Optional[dict]:
+            async with semaphore:
+                # 超时后不再发起新请求，剩下的留到下一轮
+                if time.monotonic() >= deadline:
+                    return None
+                try:
+                    return await fetch_page_content(url) or {}
+                except Exception:
+                    return {}
+
+        stale = await _stale_bookmarks()
+        batch_size = max(1, settings.duplicate_scan_batch_size)
+        for i in range(0, len(stale), batch_size):
+            if time.monotonic() >= deadline:
+                break
+            async with read_session_maker() as session:
+                result = await session.execute(
+                    select(Bookmark.id, Bookmark.url, Bookmark.title, Bookmark.description)
+                    .where(Bookmark.id.in_(stale[i:i + batch_size]))
+                )
+                rows = result.all()
+            if not rows:
+                continue
+
+            # 相同 URL 只抓取一次
+            tasks = {}
+            for row in rows:
+                if row.url not in tasks:
+                    tasks[row.url] = asyncio.create_task(fetch(row.url))
+            await asyncio.gather(*tasks.values())
+
+            documents = []
+            for row in rows:
+                page = tasks[row.url].result()
+                if page is not None:
+                    documents.append((row, _signature_text(row.title, row.description, page)))
+
+            signatures = await asyncio.to_thread(lambda: [_sign(text) for _, text in documents])
+            if documents:
+                now = datetime.now()
+                ids = [row.id for row, _ in documents]
+
+                async def write(session):
+                    await session.execute(delete(BookmarkSignature).where(BookmarkSignature.bookmark_id.in_(ids)))
+                    await session.execute(delete(BookmarkLSHBucket).where(BookmarkLSHBucket.bookmark_id.in_(ids)))
+                    for (row, _), (signature, shingle_count) in zip(documents, signatures):
+                        session.add(BookmarkSignature(
+                            bookmark_id=row.id,
+                            url=row.url[:2048],
+                            url_hash=url_hash(row.url),
+                            minhash=signature.tobytes() if signature is not None else None,
+                            shingle_count=shingle_count,
+                            computed_at=now,
+                        ))
+                        if signature is None:
+                            continue
+                        session.add_all([
+                            BookmarkLSHBucket(band=band, bucket=bucket, bookmark_id=row.id)
+                            for band, bucket in enumerate(lsh_buckets(signature))
+                        ])
+                await submit_write(write)
+                computed += len(documents)
+
+            if len(documents) < len(rows):
+                break
+
+        print(f"[{datetime.now()}] 近似重复扫描完成: 计算 {computed} 个签名")
+        return {"skipped": False, "computed": computed}
+
+
+async def _stale_bookmarks() -> List[str]:
+    """
+    需要计算签名的书签 (没有签名、地址已变化、内容不足且到了重试时间)，最久未计算的在前
+
+    地址比较使用完整地址的哈希，数据库中无法计算，因此在这里过滤。
+    """
+    retry_before = datetime.now() - timedelta(hours=settings.duplicate_retry_hours)
+    async with read_session_maker() as session:
+        result = await session.execute(
+            select(
+                Bookmark.id,
+                Bookmark.url,
+                BookmarkSignature.url_hash,
+                BookmarkSignature.computed_at,
+                BookmarkSignature.minhash.is_(None).label("empty"),
+            )
+            .outerjoin(BookmarkSignature, BookmarkSignature.bookmark_id == Bookmark.id)
+            .where(Bookmark.url.like("http%"))
+            .order_by(BookmarkSignature.computed_at.asc().nullsfirst())
+        )
+        return [
+            row.id for row in result.all()
+            if row.computed_at is None
+            or row.url_hash != url_hash(row.url)
+            or (row.empty and row.computed_at < retry_before)
+        ]
+
+
+def _min_similarity(min_similarity: Optional[float]) -> float:
+    value = settings.duplicate_min_similarity if min_similarity is None else min_similarity
+    return max(0.0, min(value, 1.0))
+
+
+async def _load_signatures(session, bookmark_ids) -> Dict[str, bytes]:
+    bookmark_ids = list(bookmark_ids)
+    signatures = {}
+    for i in range(0, len(bookmark_ids), 500):
+        result = await session.execute(
+            select(BookmarkSignature.bookmark_id, BookmarkSignature.minhash).where(
+                BookmarkSignature.bookmark_id.in_(bookmark_ids[i:i + 500]),
+                BookmarkSignature.minhash.is_not(None),
+            )
+        )
+        signatures.update({bookmark_id: minhash for bookmark_id, minhash in result.all()})
+    return signatures
+
+
+async def find_duplicate_clusters(session, min_similarity: Optional[float] = None) -> List[List[Tuple[str, float]]]:
+    """
+    查找近似重复的书签分组
+
+    只取出有两个以上书签的桶，在桶内比较签名，再用并查集合并成组。
+
+    Returns:
+        [[(bookmark_id, 与组内第一个书签的相似度)]]，按组大小降序
+    """
+    min_similarity = _min_similarity(min_similarity)
+    shared = (
+        select(BookmarkLSHBucket.band, BookmarkLSHBucket.bucket)
+        .group_by(BookmarkLSHBucket.band, BookmarkLSHBucket.bucket)
+        .having(func.count() > 1)
+    )
+    result = await session.execute(
+        select(BookmarkLSHBucket.band, BookmarkLSHBucket.bucket, BookmarkLSHBucket.bookmark_id)
+        .where(tuple_(BookmarkLSHBucket.band, BookmarkLSHBucket.bucket).in_(shared))
+    )
+    buckets = defaultdict(list)
+    for band, bucket, bookmark_id in result.all():
+        buckets[(band, bucket)].append(bookmark_id)
+
+    candidates = set()
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                candidates.add((a, b) if a < b else (b, a))
+    if not candidates:
+        return []
+
+    signatures = await _load_signatures(session, {m for pair in candidates for m in pair})
+    parent = {bookmark_id: bookmark_id for bookmark_id in signatures}
+
+    def find(x: str) -> str:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in candidates:
+        if a in signatures and b in signatures and estimate_similarity(signatures[a], signatures[b]) >= min_similarity:
+            parent[find(a)] = find(b)
+
+    groups = defaultdict(list)
+    for bookmark_id in parent:
+        groups[find(bookmark_id)].append(bookmark_id)
+
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members.sort()
+        first = signatures[members[0]]
+        clusters.append([(m, round(estimate_similarity(first, signatures[m]), 4)) for m in members])
+    clusters.sort(key=len, reverse=True)
+    return clusters
+
+
+async def find_near_duplicates(
+    session,
+    bookmark_id: str,
+    min_similarity: Optional[float] = None,
+) -> List[Tuple[str, float]]:
+    """按桶索引查找单个书签的近似重复，返回 [(bookmark_id, 相似度)]"""
+    min_similarity = _min_similarity(min_similarity)
+    signature = await session.get(BookmarkSignature, bookmark_id)
+    if signature is None or signature.minhash is None:
+        return []
+
+    own_buckets = select(BookmarkLSHBucket.band, BookmarkLSHBucket.bucket).where(
+        BookmarkLSHBucket.bookmark_id == bookmark_id
+    )
+    result = await session.execute(
+        select(BookmarkLSHBucket.bookmark_id).distinct().where(
+            tuple_(BookmarkLSHBucket.band, BookmarkLSHBucket.bucket).in_(own_buckets),
+            BookmarkLSHBucket.bookmark_id != bookmark_id,
+        )
+    )
+    candidates = await _load_signatures(session, result.scalars().all())
+
+    matches = []
+    for other_id, minhash in candidates.items():
+        similarity = estimate_similarity(signature.minhash, minhash)
+        if similarity >= min_similarity:
+            matches.append((other_id, round(similarity, 4)))
+    matches.sort(key=lambda m: m[1], reverse=True)
+    return matches
+
+
+async def get_duplicate_scan_summary(session) -> dict:
+    """签名计算进度"""
+    result = await session.execute(
+        select(
+            func.count(BookmarkSignature.bookmark_id),
+            func.count(BookmarkSignature.minhash),
+        )
+    )
+    signed, usable = result.one()
+    total = (await session.execute(select(func.count(Bookmark.id)))).scalar() or 0
+    return {
+        "total": total,
+        "signed": usable,
+        "insufficient_content": signed - usable,
+        "pending": max(0, total - signed),
+        "running": is_duplicate_scan_running(),
+    }
@@ -0,0 +1,45 @@
+"""
+书签变更事件
+
+进程内发布/订阅，用于通过 SSE 向前端推送后台补全等异步更新。
+多进程部署时事件同时转发给其他工作进程 (见 app.services.coordination)，连接到任一进程的客户端都能收到。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Set
+
+# 每个订阅者的队列上限，客户端过慢时丢弃旧事件
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers: Set[asyncio.Queue] = set()
+
+
+def publish(event: str, data: dict):
+    """发布事件"""
+    from app.services.coordination import get_coordinator
+
+    deliver(event, data)
+    get_coordinator().broadcast("event", {"event": event, "data": data})
+
+
+def deliver(event: str, data: dict):
+    """把事件交给本进程的订阅者"""
+    message = {"event": event, "data": data}
+    for queue in list(_subscribers):
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(message)
+
+
+@asynccontextmanager
+async def subscribe() -> AsyncIterator[asyncio.Queue]:
+    """订阅事件，退出时自动取消订阅"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.add(queue)
+    try:
+        yield queue
+    finally:
+        _subscribers.discard(queue)
@@ -0,0 +1,261 @@
+"""
+网站图标服务
+
+下载书签的网站图标，按内容 sha256 去重后存入数据库，通过 /api/favicons/{hash} 提供，
+页面渲染时不再依赖第三方网站。图标地址和下载结果会被记录，同一站点只下载一次。
+"""
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.bookmark import Bookmark
+from app.models.favicon import Favicon, FaviconSource
+from app.services.write_queue import submit_write
+from app.utils.web_scraper import fetch_page_metadata, get_scraper_client, host_slot
+
+settings = get_settings()
+
+# 通过文件头识别的图片类型
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"BM", "image/bmp"),
+)
+
+# 后台预取任务 (保持引用，避免被回收)
+_background_tasks: Set[asyncio.Task] = set()
+
+# 进行中的下载 (图标地址 -> Future[hash])
+_inflight = {}
+
+# 预取时每批处理的书签数
+PREFETCH_BATCH_SIZE = 500
+
+
+def default_favicon_url(page_url: str) -> Optional[str]:
+    """网站根目录下的 /favicon.ico"""
+    parsed = urlparse(page_url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+    return f"{parsed.scheme}://{parsed.netloc}/favicon.ico"
+
+
+def sniff_content_type(data: bytes, declared: str) -> Optional[str]:
+    """确认内容是图片，返回内容类型；HTML 错误页等返回 None"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    head = data[:256].lstrip().lower()
+    if head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in data[:1024].lower()):
+        return "image/svg+xml"
+    # 其他图片格式以服务器声明为准 (SVG 必须通过上面的内容检查)
+    declared = declared.split(";")[0].strip().lower()
+    if declared.startswith("image/") and declared != "image/svg+xml":
+        return declared
+    return None
+
+
+async def download_icon(icon_url: str) -> Optional[Tuple[bytes, str]]:
+    """下载图标，返回 (内容, 内容类型)，不是图片或超过大小上限时返回 None"""
+    max_bytes = settings.favicon_max_bytes
+    try:
+        async with host_slot(icon_url):
+            async with get_scraper_client().stream("GET", icon_url, timeout=10) as response:
+                if response.status_code != 200:
+                    return None
+                data = b""
+                async for chunk in response.aiter_bytes():
+                    data += chunk
+                    if len(data) > max_bytes:
+                        return None
+                declared = response.headers.get("content-type", "")
+    except Exception as e:
+        print(f"下载图标失败 {icon_url}: {e}")
+        return None
+
+    content_type = sniff_content_type(data, declared)
+    if not data or content_type is None:
+        return None
+    return data, content_type
+
+
+async def _store_icon(source_url: str, icon: Optional[Tuple[bytes, str]]) -> Optional[str]:
+    """保存图标内容和来源记录，返回内容 hash"""
+    icon_hash = hashlib.sha256(icon[0]).hexdigest() if icon is not None else None
+
+    async def write(session):
+        if icon is not None and await session.get(Favicon, icon_hash) is None:
+            data, content_type = icon
+            session.add(Favicon(
+                hash=icon_hash,
+                content_type=content_type,
+                data=data,
+                size=len(data),
+            ))
+
+        source = await session.get(FaviconSource, source_url)
+        if source is None:
+            source = FaviconSource(url=source_url)
+            session.add(source)
+        source.hash = icon_hash
+        source.fetched_at = datetime.now()
+        await session.flush()
+
+    for attempt in range(2):
+        try:
+            await submit_write(write)
+            break
+        except IntegrityError:
+            # 相同内容的图标被其他进程并发写入，重试时会查到已有记录
+            if attempt:
+                raise
+    return icon_hash
+
+
+async def _lookup_source(source_url: str) -> Tuple[bool, Optional[str]]:
+    """查询来源记录，返回 (是否可直接使用, hash)"""
+    async with read_session_maker() as session:
+        source = await session.get(FaviconSource, source_url)
+    if source is None:
+        return False, None
+    if source.hash:
+        return True, source.hash
+    # 失败记录过了重试时间才重新下载
+    retry_after = source.fetched_at + timedelta(hours=settings.favicon_retry_hours)
+    return datetime.now() < retry_after, None
+
+
+async def _resolve_source(source_url: str, page_url: str) -> Optional[str]:
+    usable, icon_hash = await _lookup_source(source_url)
+    if usable:
+        return icon_hash
+
+    icon = await download_icon(source_url)
+    if icon is None and source_url == default_favicon_url(page_url):
+        # 没有 /favicon.ico 时读取网页 <head> 中声明的图标
+        metadata = await fetch_page_metadata(page_url)
+        declared = (metadata or {}).get("favicon")
+        if declared and declared != source_url:
+            icon = await download_icon(declared)
+    return await _store_icon(source_url, icon)
+
+
+async def resolve_favicon(page_url: str, icon_url: Optional[str] = None) -> Optional[str]:
+    """
+    获取网页图标的内容 hash，必要时下载
+
+    icon_url 为网页声明的图标地址，为空时使用站点 /favicon.ico。
+    相同图标地址的并发请求只下载一次。
+    """
+    source_url = icon_url if icon_url and icon_url.startswith(("http://", "https://")) \
+        else default_favicon_url(page_url)
+    if not source_url or len(source_url) > 2048:
+        return None
+
+    pending = _inflight.get(source_url)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[source_url] = future
+    try:
+        icon_hash = await _resolve_source(source_url, page_url)
+        future.set_result(icon_hash)
+        return icon_hash
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_result(None)
+        print(f"获取图标失败 {page_url}: {e}")
+        return None
+    finally:
+        _inflight.pop(source_url, None)
+
+
+async def prefetch_favicons(bookmark_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    为没有本地图标的书签下载图标
+
+    Args:
+        bookmark_ids: 为 None 时处理所有缺少图标的书签
+
+    Returns:
+        获取到图标的书签数
+    """
+    query = select(Bookmark.id, Bookmark.url, Bookmark.favicon, Bookmark.updated_at).where(
+        Bookmark.favicon_hash.is_(None)
+    )
+    if bookmark_ids is None:
+        batches = [query]
+    else:
+        # 分批查询，避免 IN 参数过多
+        bookmark_ids = list(bookmark_ids)
+        batches = [
+            query.where(Bookmark.id.in_(bookmark_ids[i:i + PREFETCH_BATCH_SIZE]))
+            for i in range(0, len(bookmark_ids), PREFETCH_BATCH_SIZE)
+        ]
+
+    semaphore = asyncio.Semaphore(settings.favicon_concurrency)
+
+    async def resolve(row):
+        async with semaphore:
+            return row, await resolve_favicon(row.url, row.favicon)
+
+    found = 0
+    for batch in batches:
+        async with read_session_maker() as session:
+            rows = (await session.execute(batch)).all()
+        if not rows:
+            continue
+
+        results = await asyncio.gather(*(resolve(row) for row in rows))
+        values = [
+            # 图标不算内容修改，保留原更新时间
+            {"id": row.id, "favicon_hash": icon_hash, "updated_at": row.updated_at}
+            for row, icon_hash in results
+            if icon_hash
+        ]
+        if values:
+            async def write(session, values=values):
+                await session.execute(update(Bookmark), values)
+
+            await submit_write(write)
+        found += len(values)
+    return found
+
+
+def schedule_prefetch(bookmark_ids: Iterable[str]):
+    """在后台为指定书签下载图标"""
+    if not settings.favicon_prefetch:
+        return
+    bookmark_ids = list(bookmark_ids)
+    if not bookmark_ids:
+        return
+
+    async def run():
+        try:
+            await prefetch_favicons(bookmark_ids)
+        except Exception as e:
+            print(f"⚠ 预取图标失败: {e}")
+
+    task = asyncio.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def get_favicon(session, icon_hash: str) -> Optional[Favicon]:
+    """按 hash 读取图标"""
+    return await session.get(Favicon, icon_hash)
@@ -0,0 +1,120 @@
+"""
+关键词搜索
+
+在书签的标题、链接、分类、描述和标签中查找关键词 (不区分大小写)，用于书签列表筛选和 MCP 工具。
+语义搜索见 app/services/ai/vector_index.py。
+
+搜索词按空白分隔，所有关键词都需作为子串出现 (不区分大小写)；不支持排除词和引号短语，
+各数据库返回的书签集合相同，只是排序不同。
+
+- PostgreSQL：先按全文检索 (simple 分词，GIN 索引) 查找同时整词匹配的书签并按相关度排序，
+  不足 limit 条时再用子串匹配补充 (pg_trgm GIN 索引，可匹配中文和单词的一部分)。
+  未安装 pg_trgm 时子串匹配退回顺序扫描，结果不变。
+- 其他数据库：每个关键词都作为子串出现 (LIKE 顺序扫描)。
+"""
+from typing import List, Optional
+
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine, is_postgresql
+from app.models.bookmark import Bookmark
+
+# 匹配用的文本；索引和查询必须使用完全相同的表达式，PostgreSQL 才会使用表达式索引
+SEARCH_DOCUMENT = (
+    "lower(coalesce(title, '') || ' ' || coalesce(url, '') || ' ' || coalesce(category, '') || ' ' "
+    "|| coalesce(description, '') || ' ' || coalesce(tags, ''))"
+)
+SEARCH_VECTOR = f"to_tsvector('simple', {SEARCH_DOCUMENT})"
+
+# 最多使用的关键词数
+MAX_TERMS = 8
+
+
+def _terms(query: str) -> List[str]:
+    return list(dict.fromkeys(query.lower().split()))[:MAX_TERMS]
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _base_query(include_hidden: bool, category: Optional[str]):
+    query = select(Bookmark)
+    if not include_hidden:
+        query = query.where(Bookmark.visible == True)
+    if category is not None:
+        query = query.where(Bookmark.category == category)
+    return query
+
+
+def _substring_conditions(terms: List[str]):
+    document = literal_column(SEARCH_DOCUMENT)
+    return [document.like(_like_pattern(term), escape="\\") for term in terms]
+
+
+async def keyword_search(
+    session: AsyncSession,
+    query: str,
+    include_hidden: bool = False,
+    category: Optional[str] = None,
+    limit: int = 50,
+) -> List[Bookmark]:
+    """返回包含所有关键词的书签，PostgreSQL 下整词匹配的结果排在前面"""
+    terms = _terms(query)
+    if not terms or limit <= 0:
+        return []
+
+    if not is_postgresql():
+        result = await session.execute(
+            _base_query(include_hidden, category)
+            .where(*_substring_conditions(terms))
+            .order_by(Bookmark.order, Bookmark.created_at)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    # 全文检索只用于缩小范围和排序：plainto_tsquery 不解析运算符，并且仍要求满足子串条件，
+    # 因此 "-词"、引号等和子串匹配按同样的方式处理
+    ts_query = func.plainto_tsquery("simple", " ".join(terms))
+    vector = literal_column(SEARCH_VECTOR)
+    result = await session.execute(
+        _base_query(include_hidden, category)
+        .where(vector.op("@@")(ts_query), *_substring_conditions(terms))
+        .order_by(func.ts_rank_cd(vector, ts_query).desc(), Bookmark.order)
+        .limit(limit)
+    )
+    bookmarks = list(result.scalars().all())
+    if len(bookmarks) >= limit:
+        return bookmarks
+
+    found = [b.id for b in bookmarks]
+    supplement = _base_query(include_hidden, category).where(*_substring_conditions(terms))
+    if found:
+        supplement = supplement.where(Bookmark.id.not_in(found))
+    result = await session.execute(
+        supplement.order_by(Bookmark.order, Bookmark.created_at).limit(limit - len(bookmarks))
+    )
+    return bookmarks + list(result.scalars().all())
+
+
+async def create_postgresql_search_indexes():
+    """创建关键词搜索使用的全文索引和 pg_trgm 索引 (已存在时跳过)"""
+    statements = [
+        ("全文索引", f"CREATE INDEX IF NOT EXISTS ix_bookmarks_search_fts ON bookmarks USING gin (({SEARCH_VECTOR}))"),
+        ("pg_trgm 扩展", "CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+        (
+            "子串索引",
+            f"CREATE INDEX IF NOT EXISTS ix_bookmarks_search_trgm ON bookmarks USING gin (({SEARCH_DOCUMENT}) gin_trgm_ops)",
+        ),
+    ]
+    for name, statement in statements:
+        # 每条语句单独提交；pg_trgm 不可用时跳过子串索引，子串匹配退回顺序扫描
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(statement))
+        except Exception as e:
+            print(f"⚠ 创建关键词搜索{name}失败: {str(e).splitlines()[0]}")
+            if name == "pg_trgm 扩展":
+                break
@@ -0,0 +1,182 @@
+"""
+链接健康检查
+
+定时按检查时间从旧到新复查书签链接：先发 HEAD，服务器不支持或返回错误时再发 GET，
+通过共享抓取客户端执行，受全局和单主机并发限制；每次运行有时间上限，
+未检查到的书签留到下次继续。
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update, func, or_, and_
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.bookmark import Bookmark
+from app.services.write_queue import submit_write
+from app.utils.web_scraper import get_scraper_client, host_slot
+
+settings = get_settings()
+
+# 需要登录、拒绝爬虫或限流，不代表链接失效
+IGNORED_STATUS_CODES = (401, 403, 429)
+
+_run_lock = asyncio.Lock()
+
+
+def broken_link_condition():
+    """失效链接的查询条件：请求失败或返回 4xx/5xx (忽略 401/403/429)"""
+    return or_(
+        Bookmark.link_error.is_not(None),
+        and_(
+            Bookmark.link_status_code >= 400,
+            Bookmark.link_status_code.not_in(IGNORED_STATUS_CODES),
+        ),
+    )
+
+
+async def check_url(url: str, timeout: Optional[float] = None) -> dict:
+    """
+    检查单个链接
+
+    Returns:
+        {
+            "status_code": Optional[int],
+            "final_url": Optional[str],
+            "latency_ms": Optional[int],
+            "error": Optional[str],
+        }
+    """
+    timeout = timeout or settings.link_check_timeout
+    client = get_scraper_client()
+    try:
+        async with host_slot(url):
+            start = time.monotonic()
+            response = await client.head(url, timeout=timeout)
+            if response.status_code >= 400:
+                # 不少服务器不支持 HEAD，用 GET 确认，只读响应头
+                async with client.stream("GET", url, timeout=timeout) as response:
+                    pass
+            latency = time.monotonic() - start
+
+        return {
+            "status_code": response.status_code,
+            "final_url": str(response.url),
+            "latency_ms": int(latency * 1000),
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "status_code": None,
+            "final_url": None,
+            "latency_ms": None,
+            "error": f"{type(e).__name__}: {e}"[:255],
+        }
+
+
+async def run_link_check(time_budget: Optional[int] = None) -> dict:
+    """
+    检查一轮链接：从未检查或最早检查的书签开始，直到全部检查完或用完时间
+
+    同一进程同时只运行一轮。
+    """
+    if _run_lock.locked():
+        return {"skipped": True, "checked": 0, "broken": 0}
+
+    async with _run_lock:
+        budget = time_budget or settings.link_check_time_budget
+        deadline = time.monotonic() + budget
+        semaphore = asyncio.Semaphore(settings.link_check_concurrency)
+        checked = 0
+        broken = 0
+
+        async def check(url: str) -> Optional[dict]:
+            async with semaphore:
+                # 超时后不再发起新请求，剩下的留到下一轮
+                if time.monotonic() >= deadline:
+                    return None
+                return await check_url(url)
+
+        while time.monotonic() < deadline:
+            recheck_before = datetime.now() - timedelta(hours=settings.link_check_recheck_hours)
+            async with read_session_maker() as session:
+                result = await session.execute(
+                    select(Bookmark.id, Bookmark.url, Bookmark.updated_at)
+                    .where(
+                        Bookmark.url.like("http%"),
+                        or_(
+                            Bookmark.link_checked_at.is_(None),
+                            Bookmark.link_checked_at < recheck_before,
+                        ),
+                    )
+                    .order_by(Bookmark.link_checked_at.asc().nullsfirst())
+                    .limit(settings.link_check_batch_size)
+                )
+                rows = result.all()
+            if not rows:
+                break
+
+            # 相同 URL 只请求一次
+            tasks = {}
+            for row in rows:
+                if row.url not in tasks:
+                    tasks[row.url] = asyncio.create_task(check(row.url))
+            await asyncio.gather(*tasks.values())
+
+            now = datetime.now()
+            values = []
+            for row in rows:
+                outcome = tasks[row.url].result()
+                if outcome is None:
+                    continue
+                values.append({
+                    "id": row.id,
+                    "link_status_code": outcome["status_code"],
+                    "link_final_url": outcome["final_url"],
+                    "link_latency_ms": outcome["latency_ms"],
+                    "link_error": outcome["error"],
+                    "link_checked_at": now,
+                    # 检查结果不算内容修改，保留原更新时间
+                    "updated_at": row.updated_at,
+                })
+                if outcome["error"] or (
+                    outcome["status_code"] >= 400
+                    and outcome["status_code"] not in IGNORED_STATUS_CODES
+                ):
+                    broken += 1
+
+            if values:
+                async def write(session, values=values):
+                    await session.execute(update(Bookmark), values)
+
+                await submit_write(write)
+                checked += len(values)
+
+            if len(values) < len(rows):
+                break
+
+        print(f"[{datetime.now()}] 链接检查完成: 检查 {checked} 个，失效 {broken} 个")
+        return {"skipped": False, "checked": checked, "broken": broken}
+
+
+async def get_link_health_summary(session) -> dict:
+    """链接检查统计"""
+    result = await session.execute(
+        select(
+            func.count(Bookmark.id),
+            func.count(Bookmark.link_checked_at),
+            func.count(Bookmark.id).filter(broken_link_condition()),
+            func.min(Bookmark.link_checked_at),
+        )
+    )
+    total, checked, broken, oldest = result.one()
+    return {
+        "total": total,
+        "checked": checked,
+        "unchecked": total - checked,
+        "broken": broken,
+        "oldest_checked_at": oldest.isoformat() if oldest else None,
+        "running": _run_lock.locked(),
+    }
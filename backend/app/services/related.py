@@ -0,0 +1,402 @@
+"""
+相关书签
+
+两个书签的相关度 = 文本向量余弦相似度 (搜索索引中的向量) × 0.6 + 标签 Jaccard 相似度 × 0.3
++ 同一网站 × 0.1。每个书签得分最高的 k 个写入 bookmark_related 表，
+查询相关书签时只需按主键读取一次。
+
+相关度是对称的，书签变化后只刷新受影响的书签：
+- 变化的书签自身重新计算；
+- 原来把它列为相关的书签：它仍在前 k 名时就地更新得分，否则重新计算；
+- 它的新得分超过某个书签当前第 k 名 (或该书签列表未满) 时插入该书签的列表。
+删除的书签从所有列表中移除，受影响的书签重新计算。
+
+注册为搜索索引的更新回调，随索引增量更新；启动时后台为尚未计算的书签补算。
+"""
+import asyncio
+import json
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+from sqlalchemy import select, update, delete
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.bookmark import Bookmark
+from app.models.related import BookmarkRelated
+from app.services.ai.vector_index import get_search_index
+from app.services.write_queue import submit_write
+
+settings = get_settings()
+
+# 相关度权重
+TEXT_WEIGHT = 0.6
+TAGS_WEIGHT = 0.3
+DOMAIN_WEIGHT = 0.1
+
+# 全量计算时每批处理的书签数
+BLOCK_SIZE = 256
+
+# 未计算的书签超过该比例时全量计算，否则按增量流程处理
+FULL_RECOMPUTE_RATIO = 0.2
+
+# 一次变化的书签超过该数量时 (如批量导入) 改为分批全量计算，增量流程逐个书签计算并逐个更新受影响的列表
+PROPAGATE_LIMIT = 64
+
+TAG_SEPARATOR = re.compile(r"[,，;；]")
+
+
+def parse_tag_set(tags: Optional[str]) -> frozenset:
+    if not tags:
+        return frozenset()
+    try:
+        parsed = json.loads(tags)
+        values = parsed if isinstance(parsed, list) else [parsed]
+    except (ValueError, TypeError):
+        values = TAG_SEPARATOR.split(tags)
+    return frozenset(str(t).strip().lower() for t in values if str(t).strip())
+
+
+def site_of(url: Optional[str]) -> str:
+    host = urlparse(url or "").netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class RelatedIndex:
+    """相关书签的内存状态 (标签、网站、当前相关列表) 与增量刷新"""
+
+    def __init__(self):
+        self.tags: Dict[str, frozenset] = {}
+        self.sites: Dict[str, str] = {}
+        self.tag_members: Dict[str, Set[str]] = defaultdict(set)
+        self.site_members: Dict[str, Set[str]] = defaultdict(set)
+        self.neighbours: Dict[str, Dict[str, float]] = {}
+        self.referrers: Dict[str, Set[str]] = defaultdict(set)
+        self._ready = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._early_changes: Set[str] = set()
+        self._early_removals: Set[str] = set()
+
+    # ---------- 内存状态 ----------
+
+    def _set_meta(self, bookmark_id: str, url: Optional[str], tags: Optional[str]):
+        self._drop_meta(bookmark_id)
+        tag_set = parse_tag_set(tags)
+        site = site_of(url)
+        self.tags[bookmark_id] = tag_set
+        self.sites[bookmark_id] = site
+        for tag in tag_set:
+            self.tag_members[tag].add(bookmark_id)
+        if site:
+            self.site_members[site].add(bookmark_id)
+
+    def _drop_meta(self, bookmark_id: str):
+        for tag in self.tags.pop(bookmark_id, ()):
+            self.tag_members[tag].discard(bookmark_id)
+        site = self.sites.pop(bookmark_id, "")
+        if site:
+            self.site_members[site].discard(bookmark_id)
+
+    def _set_list(self, bookmark_id: str, related: Optional[Dict[str, float]]):
+        for other in self.neighbours.pop(bookmark_id, {}):
+            self.referrers[other].discard(bookmark_id)
+        if related is None:
+            return
+        self.neighbours[bookmark_id] = related
+        for other in related:
+            self.referrers[other].add(bookmark_id)
+
+    # ---------- 计算 ----------
+
+    def _scores(self, index, bookmark_id: str, text_scores: Optional[np.ndarray] = None) -> np.ndarray:
+        """指定书签与索引中每一行的相关度 (自身为 -1)"""
+        size = index.size
+        row = index.rows.get(bookmark_id)
+        if text_scores is None:
+            if row is not None:
+                text_scores = index.matrix[:size] @ index.matrix[row]
+            else:
+                text_scores = np.zeros(size, dtype=np.float32)
+        scores = TEXT_WEIGHT * np.clip(text_scores, 0.0, None)
+
+        tags = self.tags.get(bookmark_id)
+        if tags:
+            overlap = Counter()
+            for tag in tags:
+                overlap.update(self.tag_members[tag])
+            for other, shared in overlap.items():
+                other_row = index.rows.get(other)
+                if other_row is not None:
+                    scores[other_row] += TAGS_WEIGHT * shared / (len(tags) + len(self.tags[other]) - shared)
+
+        site = self.sites.get(bookmark_id)
+        if site:
+            for other in self.site_members[site]:
+                other_row = index.rows.get(other)
+                if other_row is not None:
+                    scores[other_row] += DOMAIN_WEIGHT
+
+        if row is not None:
+            scores[row] = -1.0
+        return scores
+
+    @staticmethod
+    def _top_k(index, scores: np.ndarray) -> Dict[str, float]:
+        k = min(settings.related_top_k, len(scores))
+        if k <= 0:
+            return {}
+        top = np.argpartition(-scores, k - 1)[:k]
+        return {
+            index.ids[row]: round(float(scores[row]), 4)
+            for row in top
+            if scores[row] >= settings.related_min_score
+        }
+
+    def _compute_block(self, index, bookmark_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        """一次矩阵乘法得到一批书签的文本相似度，再叠加标签和网站得分"""
+        rows = [index.rows[b] for b in bookmark_ids]
+        text_scores = index.matrix[rows] @ index.matrix[:index.size].T
+        return {
+            bookmark_id: self._top_k(index, self._scores(index, bookmark_id, text_scores[i]))
+            for i, bookmark_id in enumerate(bookmark_ids)
+        }
+
+    def _propagate(self, index, changed: List[str], removed: List[str]) -> Dict[str, Optional[Dict[str, float]]]:
+        """计算变化涉及的所有列表，返回 {书签: 新列表}，None 表示删除"""
+        top_k = settings.related_top_k
+        min_score = settings.related_min_score
+        results: Dict[str, Optional[Dict[str, float]]] = {}
+        recompute: Set[str] = set()
+        changed_set = set(changed)
+        removed_set = set(removed)
+
+        for bookmark_id in removed:
+            recompute.update(self.referrers.get(bookmark_id, ()))
+            results[bookmark_id] = None
+
+        for bookmark_id in changed:
+            if bookmark_id not in index.rows:
+                continue
+            scores = self._scores(index, bookmark_id)
+            results[bookmark_id] = self._top_k(index, scores)
+
+            candidates = set(self.referrers.get(bookmark_id, ()))
+            candidates.update(index.ids[row] for row in np.flatnonzero(scores >= min_score))
+            for other in candidates:
+                # 变化的书签会完整重新计算
+                if other in recompute or other in changed_set or other in removed_set:
+                    continue
+                other_row = index.rows.get(other)
+                score = round(float(scores[other_row]), 4) if other_row is not None else 0.0
+                related = dict(results[other] if other in results else self.neighbours.get(other, {}))
+                if bookmark_id in related:
+                    rest = [s for key, s in related.items() if key != bookmark_id]
+                    if len(related) < top_k or score >= min(rest, default=0.0):
+                        # 列表未满说明其余书签都不够格，或者仍在前 k 名：就地更新
+                        if score >= min_score:
+                            related[bookmark_id] = score
+                        else:
+                            del related[bookmark_id]
+                    else:
+                        recompute.add(other)
+                        continue
+                elif score >= min_score and (len(related) < top_k or score > min(related.values())):
+                    related[bookmark_id] = score
+                    if len(related) > top_k:
+                        del related[min(related, key=related.get)]
+                else:
+                    continue
+                results[other] = related
+
+        for other in recompute:
+            if other not in index.rows or other in removed_set:
+                continue
+            results[other] = self._top_k(index, self._scores(index, other))
+        return results
+
+    # ---------- 持久化 ----------
+
+    async def _persist(self, results: Dict[str, Optional[Dict[str, float]]]):
+        ids = list(results)
+        now = datetime.now()
+
+        async def write(session):
+            for i in range(0, len(ids), 500):
+                await session.execute(
+                    delete(BookmarkRelated).where(BookmarkRelated.bookmark_id.in_(ids[i:i + 500]))
+                )
+            session.add_all([
+                BookmarkRelated(bookmark_id=bookmark_id, related_id=other, score=score)
+                for bookmark_id, related in results.items()
+                if related
+                for other, score in related.items()
+            ])
+            computed = [bookmark_id for bookmark_id, related in results.items() if related is not None]
+            for i in range(0, len(computed), 500):
+                # 不算内容修改，保留原更新时间
+                await session.execute(
+                    update(Bookmark)
+                    .where(Bookmark.id.in_(computed[i:i + 500]))
+                    .values(related_computed_at=now, updated_at=Bookmark.updated_at)
+                )
+        await submit_write(write)
+
+    async def _save(self, results: Dict[str, Optional[Dict[str, float]]]):
+        if not results:
+            return
+        try:
+            await self._persist(results)
+        except Exception as e:
+            # 多个工作进程同时补算时可能写入冲突，计算结果相同，只更新本进程的内存状态
+            print(f"⚠ 保存相关书签失败: {str(e).splitlines()[0]}")
+
+        for bookmark_id, related in results.items():
+            self._set_list(bookmark_id, related)
+
+    # ---------- 构建与更新 ----------
+
+    async def ensure_ready(self):
+        if not self._ready.is_set():
+            async with self._lock:
+                if not self._ready.is_set():
+                    await self._build()
+                    self._ready.set()
+            await self._apply_early_changes()
+
+    async def _build(self):
+        """加载已保存的相关列表，为尚未计算的书签补算"""
+        search_index = get_search_index()
+        await search_index.ensure_ready()
+
+        async with read_session_maker() as session:
+            bookmarks = (await session.execute(
+                select(Bookmark.id, Bookmark.url, Bookmark.tags, Bookmark.related_computed_at)
+            )).all()
+            stored = (await session.execute(
+                select(BookmarkRelated.bookmark_id, BookmarkRelated.related_id, BookmarkRelated.score)
+            )).all()
+
+        self._reset_state()
+        for row in bookmarks:
+            self._set_meta(row.id, row.url, row.tags)
+        lists = defaultdict(dict)
+        for bookmark_id, related_id, score in stored:
+            lists[bookmark_id][related_id] = score
+        for bookmark_id, related in lists.items():
+            self._set_list(bookmark_id, related)
+
+        pending = [row.id for row in bookmarks if row.related_computed_at is None]
+        if pending and len(pending) > len(bookmarks) * FULL_RECOMPUTE_RATIO:
+            await self._compute_all([row.id for row in bookmarks])
+        elif pending:
+            await self._refresh(pending, [])
+        print(f"✓ 相关书签已加载: {len(self.neighbours)} 个书签，补算 {len(pending)} 个")
+
+    def _reset_state(self):
+        self.tags.clear()
+        self.sites.clear()
+        self.tag_members.clear()
+        self.site_members.clear()
+        self.neighbours.clear()
+        self.referrers.clear()
+
+    async def _compute_all(self, bookmark_ids: List[str]):
+        """分批全量计算，每批在线程中执行，期间搜索索引不会被修改"""
+        search_index = get_search_index()
+        for i in range(0, len(bookmark_ids), BLOCK_SIZE):
+            async with search_index.lock:
+                index = search_index.index
+                block = [b for b in bookmark_ids[i:i + BLOCK_SIZE] if b in index.rows]
+                if not block:
+                    continue
+                results = await asyncio.to_thread(self._compute_block, index, block)
+            await self._save(results)
+
+    async def _refresh(self, changed: List[str], removed: List[str]):
+        """增量更新在线程中执行；变化较多时分批全量计算"""
+        search_index = get_search_index()
+        if len(changed) + len(removed) > PROPAGATE_LIMIT:
+            await self._save({bookmark_id: None for bookmark_id in removed})
+            await self._compute_all(list(search_index.index.rows))
+            return
+        async with search_index.lock:
+            results = await asyncio.to_thread(self._propagate, search_index.index, changed, removed)
+        await self._save(results)
+
+    async def on_index_update(self, changed: List[str], removed: List[str], rebuilt: bool):
+        """搜索索引更新回调"""
+        if not settings.related_enabled:
+            return
+        if not self._ready.is_set():
+            # 加载完成后再处理
+            self._early_changes.update(changed)
+            self._early_removals.update(removed)
+            return
+
+        async with self._lock:
+            if rebuilt:
+                await self._build()
+                return
+            rows = []
+            async with read_session_maker() as session:
+                for i in range(0, len(changed), 500):
+                    result = await session.execute(
+                        select(Bookmark.id, Bookmark.url, Bookmark.tags).where(Bookmark.id.in_(changed[i:i + 500]))
+                    )
+                    rows.extend(result.all())
+            for row in rows:
+                self._set_meta(row.id, row.url, row.tags)
+            for bookmark_id in removed:
+                self._drop_meta(bookmark_id)
+            await self._refresh([row.id for row in rows], removed)
+
+    async def _apply_early_changes(self):
+        changed = list(self._early_changes - self._early_removals)
+        removed = list(self._early_removals)
+        self._early_changes.clear()
+        self._early_removals.clear()
+        if changed or removed:
+            await self.on_index_update(changed, removed, False)
+
+
+_related_index = RelatedIndex()
+
+
+def get_related_index() -> RelatedIndex:
+    return _related_index
+
+
+async def warm_up():
+    """注册搜索索引回调，并在后台加载或补算相关书签"""
+    if not settings.related_enabled:
+        return
+    get_search_index().add_listener(_related_index.on_index_update)
+    try:
+        await _related_index.ensure_ready()
+    except Exception as e:
+        print(f"⚠ 加载相关书签失败: {e}")
+
+
+async def get_related_bookmarks(
+    session,
+    bookmark_id: str,
+    include_hidden: bool = False,
+    limit: Optional[int] = None,
+) -> List[Tuple[Bookmark, float]]:
+    """读取预先计算的相关书签，按得分降序"""
+    query = (
+        select(Bookmark, BookmarkRelated.score)
+        .join(BookmarkRelated, BookmarkRelated.related_id == Bookmark.id)
+        .where(BookmarkRelated.bookmark_id == bookmark_id)
+        .order_by(BookmarkRelated.score.desc())
+    )
+    if not include_hidden:
+        query = query.where(Bookmark.visible == True)
+    if limit:
+        query = query.limit(limit)
+    result = await session.execute(query)
+    return [(bookmark, score) for bookmark, score in result.all()]
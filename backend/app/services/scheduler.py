@@ -7,6 +7,7 @@ from typing import Optional
 from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 # 全局调度器实例
 scheduler: Optional[AsyncIOScheduler] = None
@@ -185,6 +186,36 @@ async def init_scheduler():
         name="WebDAV 定时备份"
     )
 
+    # 添加链接健康检查任务
+    from app.config import get_settings
+    from app.services.link_checker import run_link_check
+
+    settings = get_settings()
+    if settings.link_check_enabled:
+        sched.add_job(
+            run_link_check,
+            IntervalTrigger(minutes=settings.link_check_interval_minutes),
+            id="link_check",
+            replace_existing=True,
+            name="链接健康检查",
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # 添加近似重复扫描任务
+    from app.services.duplicates import run_duplicate_scan
+
+    if settings.duplicate_scan_enabled:
+        sched.add_job(
+            run_duplicate_scan,
+            IntervalTrigger(minutes=settings.duplicate_scan_interval_minutes),
+            id="duplicate_scan",
+            replace_existing=True,
+            name="近似重复扫描",
+            max_instances=1,
+            coalesce=True,
+        )
+
     if not sched.running:
         sched.start()
         print(f"✓ 定时任务调度器已启动，备份时间: {hour:02d}:{minute:02d}")
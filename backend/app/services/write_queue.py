@@ -0,0 +1,237 @@
+"""
+写入队列
+
+书签增删改和 AI 处理结果的写入不再各自开启事务，而是提交给唯一的写入协程执行。
+写入协程把同时到达的多个写操作合并到一个事务中提交 (group commit)；有操作失败时整批改为
+每个操作在独立的 SAVEPOINT 中重新执行，失败的操作只回滚它自己。整个事务提交后才通知各调用方。
+
+第一个写操作最多等待 WRITE_QUEUE_MAX_DELAY_MS 毫秒凑批，每批最多 WRITE_QUEUE_MAX_BATCH 个操作。
+SQLite 文件数据库下写入协程独占一个 BEGIN IMMEDIATE 连接，不会出现多个写事务互相等待写锁。
+
+写操作为 async def operation(session) -> result：只修改数据，不能自行提交，也不能再次提交写操作；
+操作可能被重新执行，索引更新、推送通知等副作用由调用方在 submit_write 返回后执行。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import object_session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import engine, is_sqlite, write_engine, write_session_maker
+
+settings = get_settings()
+
+T = TypeVar("T")
+WriteOperation = Callable[[AsyncSession], Awaitable[T]]
+
+
+def pending_changes(obj) -> dict:
+    """ORM 对象中已修改但未写入的列 {列名: 新值}"""
+    state = inspect(obj)
+    return {
+        attr.key: attr.value
+        for attr in state.attrs
+        if attr.key in state.mapper.column_attrs and attr.history.has_changes()
+    }
+
+
+class WriteQueue:
+    """单写入协程 + 合并提交"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 内存 SQLite 与其他会话共用连接，pysqlite 的事务管理下 SAVEPOINT 不可靠，只能逐个提交
+        self.grouping = write_engine is not engine or not is_sqlite()
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self.retried_batches = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, operation: WriteOperation) -> Any:
+        """提交写操作，事务提交后返回操作结果 (操作抛出的异常原样抛出)"""
+        if not settings.write_queue_enabled:
+            result, _ = (await self._execute([(operation, None)]))[0]
+            return result
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        max_batch = max(1, settings.write_queue_max_batch) if self.grouping else 1
+        max_delay = max(0.0, settings.write_queue_max_delay_ms) / 1000
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + max_delay
+            while len(batch) < max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                # 调用方已取消的操作不再执行
+                pending = [(operation, future) for operation, future in batch if not future.done()]
+                if pending:
+                    await self._commit(pending)
+            except Exception as e:
+                # 异常已交给各调用方，这里只防止写入协程退出
+                print(f"⚠ 写入队列提交失败: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: List[Tuple[WriteOperation, asyncio.Future]]):
+        try:
+            results = await self._execute(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self.failed += 1
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # 整批提交失败时逐个重试，避免一个操作连累同批的其他操作
+            self.retried_batches += 1
+            for entry in batch:
+                await self._commit([entry])
+            return
+
+        for (_, future), (result, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    async def _execute(self, batch) -> List[Tuple[Any, Optional[Exception]]]:
+        """
+        在一个事务中执行一批写操作，返回 [(结果, 异常)]
+
+        先不设 SAVEPOINT 直接执行整批 (每个 SAVEPOINT 都要多两次数据库往返)；有操作失败时回滚，
+        再逐个放入 SAVEPOINT 重新执行，只让失败的操作回滚。单个操作的异常直接抛出，
+        事务提交失败时抛出异常。
+        """
+        if len(batch) > 1:
+            try:
+                async with write_session_maker() as session:
+                    results = [(await operation(session), None) for operation, _ in batch]
+                    await session.commit()
+                self._count(len(batch), 0)
+                return results
+            except Exception:
+                pass
+
+        async with write_session_maker() as session:
+            if len(batch) == 1:
+                results = [(await batch[0][0](session), None)]
+            else:
+                results = []
+                for operation, _ in batch:
+                    try:
+                        async with session.begin_nested():
+                            results.append((await operation(session), None))
+                    except Exception as e:
+                        results.append((None, e))
+            await session.commit()
+        self._count(len(batch), sum(1 for _, error in results if error is not None))
+        return results
+
+    def _count(self, operations: int, failed: int):
+        self.batches += 1
+        self.operations += operations
+        self.failed += failed
+        self.largest_batch = max(self.largest_batch, operations)
+
+    async def stop(self):
+        """等待已提交的写操作完成后停止写入协程"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.write_queue_enabled,
+            "grouping": self.grouping,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "operations": self.operations,
+            "failed": self.failed,
+            "retried_batches": self.retried_batches,
+            "largest_batch": self.largest_batch,
+            "average_batch": round(self.operations / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_write_queue = WriteQueue()
+
+
+def get_write_queue() -> WriteQueue:
+    return _write_queue
+
+
+async def submit_write(operation: WriteOperation) -> Any:
+    """提交写操作，合并提交后返回其结果"""
+    return await _write_queue.submit(operation)
+
+
+async def submit_changes(objects) -> int:
+    """
+    把在其他会话中修改过的 ORM 对象按主键写回，返回写回的对象数
+
+    写回后对象从原会话中移除，原会话提交时不会再次写入。
+    """
+    changes = []
+    for obj in objects:
+        values = pending_changes(obj)
+        if values:
+            mapper = inspect(obj).mapper
+            changes.append((mapper, mapper.primary_key_from_instance(obj), values))
+    if changes:
+        async def write(session: AsyncSession):
+            for mapper, identity, values in changes:
+                await session.execute(
+                    update(mapper.class_)
+                    .where(*(column == value for column, value in zip(mapper.primary_key, identity)))
+                    .values(**values)
+                )
+
+        await submit_write(write)
+
+    for obj in objects:
+        session = object_session(obj)
+        if session is not None:
+            session.expunge(obj)
+    return len(changes)
+
+
+async def stop_write_queue():
+    await _write_queue.stop()
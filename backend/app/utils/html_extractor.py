@@ -0,0 +1,263 @@
+"""
+网页正文提取
+
+提取器按名称注册，默认使用基于 lxml 的轻量提取器 (按段落文本密度选取正文容器)，
+解析失败或提取结果为空时回退到 BeautifulSoup 提取器。
+"""
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+from urllib.parse import urljoin, urlparse
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# 正文最大长度
+MAX_CONTENT_LENGTH = 5000
+
+# 不含正文的标签
+NOISE_TAGS = (
+    "script", "style", "noscript", "template", "svg", "iframe",
+    "nav", "footer", "header", "aside", "form",
+)
+
+# 计入正文得分的最短段落长度
+MIN_PARAGRAPH_LENGTH = 25
+
+# 正文容器至少包含的段落文本比例
+MIN_CANDIDATE_COVERAGE = 0.5
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class HTMLExtractor(ABC):
+    """提取器接口：从 HTML 中提取标题、描述、正文和 favicon"""
+
+    name = ""
+
+    @abstractmethod
+    def extract(self, url: str, html: str) -> dict:
+        """
+        Returns:
+            {
+                "title": str,
+                "description": str,
+                "content": str,
+                "favicon": str,
+            }
+        """
+
+
+class LxmlExtractor(HTMLExtractor):
+    """基于 lxml 的轻量提取器，参考 readability 按段落文本密度选取正文容器"""
+
+    name = "lxml"
+
+    def extract(self, url: str, html: str) -> dict:
+        from lxml import etree
+        from lxml import html as lxml_html
+
+        # 统一按 UTF-8 字节解析，避免 XML 编码声明导致 str 输入报错
+        parser = lxml_html.HTMLParser(encoding="utf-8")
+        doc = lxml_html.document_fromstring(html.encode("utf-8", "replace"), parser=parser)
+
+        title = ""
+        og_title = ""
+        description = ""
+        og_description = ""
+        favicon = ""
+
+        title_el = doc.find(".//title")
+        if title_el is not None and title_el.text:
+            title = title_el.text
+
+        for meta in doc.iter("meta"):
+            content = meta.get("content")
+            if not content:
+                continue
+            name = (meta.get("name") or "").lower()
+            prop = (meta.get("property") or "").lower()
+            if name == "description":
+                description = content
+            elif prop == "og:title":
+                og_title = content
+            elif prop == "og:description":
+                og_description = content
+
+        # 优先 rel="icon" / "shortcut icon"，其次 apple-touch-icon 等
+        for link in doc.iter("link"):
+            href = link.get("href")
+            rel = (link.get("rel") or "").lower()
+            if not href or "icon" not in rel:
+                continue
+            if "icon" in rel.split():
+                favicon = urljoin(url, href)
+                break
+            if not favicon:
+                favicon = urljoin(url, href)
+
+        etree.strip_elements(doc, etree.Comment, *NOISE_TAGS, with_tail=False)
+
+        root = doc.find(".//main")
+        if root is None:
+            root = doc.find(".//article")
+        if root is None:
+            root = self._best_candidate(doc)
+
+        content = ""
+        if root is not None:
+            content = self._collect_text(root)
+
+        return {
+            "title": (og_title or title).strip(),
+            "description": (og_description or description).strip(),
+            "content": content,
+            "favicon": favicon,
+        }
+
+    @staticmethod
+    def _best_candidate(doc):
+        """
+        为段落的父节点和祖父节点累计文本长度，得分最高的容器作为正文；
+        最佳容器包含的段落文本不足一半时 (正文分散)，使用 <body>
+        """
+        body = doc.find(".//body")
+        fallback = body if body is not None else doc
+        scores: Dict[object, float] = {}
+        paragraphs = []
+        for paragraph in doc.iter("p", "pre", "td", "blockquote"):
+            length = len(paragraph.text_content().strip())
+            if length < MIN_PARAGRAPH_LENGTH:
+                continue
+            paragraphs.append((paragraph, length))
+            parent = paragraph.getparent()
+            if parent is None:
+                continue
+            scores[parent] = scores.get(parent, 0) + length
+            grandparent = parent.getparent()
+            if grandparent is not None:
+                scores[grandparent] = scores.get(grandparent, 0) + length / 2
+
+        if not scores:
+            return fallback
+
+        best = max(scores, key=scores.get)
+        total = sum(length for _, length in paragraphs)
+        covered = sum(
+            length for paragraph, length in paragraphs
+            if any(ancestor is best for ancestor in paragraph.iterancestors())
+        )
+        if covered < total * MIN_CANDIDATE_COVERAGE:
+            return fallback
+        return best
+
+    @staticmethod
+    def _collect_text(root) -> str:
+        """拼接文本，收集到足够长度即停止"""
+        parts = []
+        collected = 0
+        # 折叠空白前的原始长度留足余量
+        limit = MAX_CONTENT_LENGTH * 4
+        for text in root.itertext():
+            parts.append(text)
+            collected += len(text)
+            if collected >= limit:
+                break
+        content = WHITESPACE_PATTERN.sub(" ", " ".join(parts)).strip()
+        return content[:MAX_CONTENT_LENGTH]
+
+
+class BeautifulSoupExtractor(HTMLExtractor):
+    """BeautifulSoup 提取器，兼容性最好，速度较慢"""
+
+    name = "bs4"
+
+    def extract(self, url: str, html: str) -> dict:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "lxml")
+
+        # 提取标题
+        title = ""
+        if soup.title:
+            title = soup.title.string or ""
+        og_title = soup.find("meta", property="og:title")
+        if og_title and og_title.get("content"):
+            title = og_title["content"]
+
+        # 提取描述
+        description = ""
+        meta_desc = soup.find("meta", attrs={"name": "description"})
+        if meta_desc and meta_desc.get("content"):
+            description = meta_desc["content"]
+        og_desc = soup.find("meta", property="og:description")
+        if og_desc and og_desc.get("content"):
+            description = og_desc["content"]
+
+        # 提取主要内容
+        # 移除脚本和样式
+        for script in soup(["script", "style", "nav", "footer", "header"]):
+            script.decompose()
+
+        # 尝试找主要内容区域
+        main_content = soup.find("main") or soup.find("article") or soup.find("body")
+        content = ""
+        if main_content:
+            content = main_content.get_text(separator=" ", strip=True)
+            # 清理多余空白
+            content = WHITESPACE_PATTERN.sub(" ", content)
+            # 限制长度
+            content = content[:MAX_CONTENT_LENGTH]
+
+        # 提取 favicon
+        favicon = ""
+        icon_link = soup.find("link", rel=lambda x: x and "icon" in x.lower() if x else False)
+        if icon_link and icon_link.get("href"):
+            favicon = icon_link["href"]
+            if favicon.startswith("/"):
+                parsed = urlparse(url)
+                favicon = f"{parsed.scheme}://{parsed.netloc}{favicon}"
+
+        return {
+            "title": title.strip(),
+            "description": description.strip(),
+            "content": content.strip(),
+            "favicon": favicon,
+        }
+
+
+EXTRACTORS: Dict[str, HTMLExtractor] = {
+    extractor.name: extractor
+    for extractor in (LxmlExtractor(), BeautifulSoupExtractor())
+}
+
+FALLBACK_EXTRACTOR = "bs4"
+
+
+def register_extractor(extractor: HTMLExtractor):
+    """注册提取器，可通过 SCRAPER_EXTRACTOR 选用"""
+    EXTRACTORS[extractor.name] = extractor
+
+
+def get_extractor(name: Optional[str] = None) -> HTMLExtractor:
+    """按名称获取提取器，名称未知时使用回退提取器"""
+    name = name or settings.scraper_extractor
+    return EXTRACTORS.get(name) or EXTRACTORS[FALLBACK_EXTRACTOR]
+
+
+def extract_page(url: str, html: str, extractor: Optional[str] = None) -> dict:
+    """使用配置的提取器解析网页，失败或结果为空时回退到 BeautifulSoup"""
+    primary = get_extractor(extractor)
+    try:
+        result = primary.extract(url, html)
+        if result["title"] or result["content"]:
+            return result
+    except Exception as e:
+        if primary.name == FALLBACK_EXTRACTOR:
+            raise
+        print(f"⚠ {primary.name} 提取失败，回退到 {FALLBACK_EXTRACTOR}: {e}")
+
+    if primary.name == FALLBACK_EXTRACTOR:
+        return result
+    return EXTRACTORS[FALLBACK_EXTRACTOR].extract(url, html)
@@ -0,0 +1,274 @@
+"""
+网页抓取缓存
+
+按 URL 持久化抓取提取结果 (标题、描述、正文、favicon) 和 ETag/Last-Modified，
+未过期直接返回，过期后由抓取方用条件请求重新验证；按 TTL、条目数和总字节数淘汰。
+读取只使用只读会话，命中次数先在内存中累计，定期经写入队列批量写回。
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, delete, func, and_, update
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.page_cache import PageCacheEntry
+from app.services.write_queue import submit_write
+
+settings = get_settings()
+
+# 本进程统计
+_stats = {
+    "hits": 0,
+    "revalidated": 0,
+    "misses": 0,
+}
+
+# 每写入多少条 (或多少字节) 检查一次淘汰
+EVICT_CHECK_INTERVAL = 50
+_writes_since_evict = 0
+_bytes_since_evict = 0
+
+# 未写回的命中 (key -> (次数, 最近使用时间))，累计到一定条数或时间后批量写回
+HIT_FLUSH_ENTRIES = 100
+HIT_FLUSH_SECONDS = 60
+_pending_hits: Dict[str, Tuple[int, datetime]] = {}
+_last_hit_flush = time.monotonic()
+
+
+def make_cache_key(url: str) -> str:
+    """生成缓存键"""
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _to_page(entry: PageCacheEntry) -> dict:
+    return {
+        "title": entry.title or "",
+        "description": entry.description or "",
+        "content": entry.content or "",
+        "favicon": entry.favicon or "",
+    }
+
+
+def record(outcome: str):
+    """记录一次查询结果: hits / revalidated / misses"""
+    _stats[outcome] += 1
+
+
+async def load(url: str) -> Optional[dict]:
+    """
+    读取缓存条目 (含已过期条目)，新鲜条目记录一次命中
+
+    Returns:
+        {
+            "page": dict,  # 与 fetch_page_content 返回值相同
+            "fresh": bool,
+            "etag": Optional[str],
+            "last_modified": Optional[str],
+        }
+    """
+    now = datetime.now()
+    key = make_cache_key(url)
+    async with read_session_maker() as session:
+        entry = await session.get(PageCacheEntry, key)
+        if entry is None:
+            return None
+
+    fresh = entry.expires_at > now
+    if fresh:
+        count, _ = _pending_hits.get(key, (0, now))
+        _pending_hits[key] = (count + 1, now)
+        if len(_pending_hits) >= HIT_FLUSH_ENTRIES or time.monotonic() - _last_hit_flush >= HIT_FLUSH_SECONDS:
+            await flush_hits()
+
+    return {
+        "page": _to_page(entry),
+        "fresh": fresh,
+        "etag": entry.etag,
+        "last_modified": entry.last_modified,
+    }
+
+
+async def flush_hits():
+    """把内存中累计的命中次数和最近使用时间写回数据库"""
+    global _pending_hits, _last_hit_flush
+
+    _last_hit_flush = time.monotonic()
+    if not _pending_hits:
+        return
+    hits, _pending_hits = _pending_hits, {}
+
+    async def write(session):
+        for key, (count, used_at) in hits.items():
+            await session.execute(
+                update(PageCacheEntry)
+                .where(PageCacheEntry.key == key)
+                .values(
+                    hit_count=func.coalesce(PageCacheEntry.hit_count, 0) + count,
+                    last_used_at=used_at,
+                )
+            )
+
+    try:
+        await submit_write(write)
+    except Exception as e:
+        print(f"⚠ 写回网页缓存命中次数失败: {e}")
+
+
+async def store(
+    url: str,
+    page: dict,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+):
+    """写入抓取结果"""
+    global _writes_since_evict, _bytes_since_evict
+
+    now = datetime.now()
+    key = make_cache_key(url)
+    values = {
+        "title": page.get("title", ""),
+        "description": page.get("description", ""),
+        "content": page.get("content", ""),
+        "favicon": page.get("favicon", ""),
+    }
+    size = sum(len((value or "").encode("utf-8")) for value in values.values())
+
+    async def write(session):
+        entry = await session.get(PageCacheEntry, key)
+        if entry is None:
+            entry = PageCacheEntry(key=key, url=url)
+            session.add(entry)
+        for name, value in values.items():
+            setattr(entry, name, value)
+        entry.etag = (etag or "")[:255] or None
+        entry.last_modified = (last_modified or "")[:64] or None
+        entry.size = size
+        entry.hit_count = 0
+        entry.revalidated_count = 0
+        entry.fetched_at = now
+        entry.last_used_at = now
+        entry.expires_at = now + timedelta(hours=settings.page_cache_ttl_hours)
+
+    await submit_write(write)
+
+    _writes_since_evict += 1
+    _bytes_since_evict += size
+    if _writes_since_evict >= EVICT_CHECK_INTERVAL or _bytes_since_evict >= _max_bytes() // 20:
+        _writes_since_evict = 0
+        _bytes_since_evict = 0
+        await evict()
+
+
+async def mark_revalidated(url: str):
+    """服务器返回 304，延长条目有效期"""
+    now = datetime.now()
+
+    async def write(session):
+        await session.execute(
+            update(PageCacheEntry)
+            .where(PageCacheEntry.key == make_cache_key(url))
+            .values(
+                revalidated_count=func.coalesce(PageCacheEntry.revalidated_count, 0) + 1,
+                last_used_at=now,
+                expires_at=now + timedelta(hours=settings.page_cache_ttl_hours),
+            )
+        )
+
+    await submit_write(write)
+
+
+def _max_bytes() -> int:
+    return max(0, settings.page_cache_max_mb) * 1024 * 1024
+
+
+async def evict() -> int:
+    """
+    删除无法重新验证的过期条目 (没有 ETag/Last-Modified)，
+    并按最近使用时间淘汰超出条目数上限或总字节数上限的条目
+    """
+    # 先写回命中记录，淘汰按最新的使用时间进行
+    await flush_hits()
+
+    async def write(session) -> int:
+        result = await session.execute(
+            delete(PageCacheEntry).where(and_(
+                PageCacheEntry.expires_at <= datetime.now(),
+                PageCacheEntry.etag.is_(None),
+                PageCacheEntry.last_modified.is_(None),
+            ))
+        )
+        removed = result.rowcount or 0
+
+        count, total_size = (await session.execute(
+            select(func.count(PageCacheEntry.key), func.coalesce(func.sum(PageCacheEntry.size), 0))
+        )).one()
+        overflow = count - settings.page_cache_max_entries
+        excess = total_size - _max_bytes()
+        if overflow <= 0 and excess <= 0:
+            return removed
+
+        # 从最久未使用的条目开始，直到条目数和字节数都回到上限以内
+        stale_keys = []
+        freed = 0
+        result = await session.execute(
+            select(PageCacheEntry.key, PageCacheEntry.size).order_by(PageCacheEntry.last_used_at)
+        )
+        for key, size in result.all():
+            if len(stale_keys) >= overflow and freed >= excess:
+                break
+            stale_keys.append(key)
+            freed += size or 0
+        for i in range(0, len(stale_keys), 500):
+            result = await session.execute(
+                delete(PageCacheEntry).where(PageCacheEntry.key.in_(stale_keys[i:i + 500]))
+            )
+            removed += result.rowcount or 0
+        return removed
+
+    return await submit_write(write)
+
+
+async def get_page_cache_stats() -> dict:
+    """获取缓存统计"""
+    await flush_hits()
+    async with read_session_maker() as session:
+        result = await session.execute(
+            select(
+                func.count(PageCacheEntry.key),
+                func.coalesce(func.sum(PageCacheEntry.size), 0),
+                func.coalesce(func.sum(PageCacheEntry.hit_count), 0),
+                func.coalesce(func.sum(PageCacheEntry.revalidated_count), 0),
+            )
+        )
+        entries, total_size, total_hits, total_revalidated = result.one()
+
+    lookups = _stats["hits"] + _stats["revalidated"] + _stats["misses"]
+    served = _stats["hits"] + _stats["revalidated"]
+    return {
+        "enabled": settings.page_cache_enabled,
+        "entries": entries,
+        "size_bytes": total_size,
+        "max_entries": settings.page_cache_max_entries,
+        "max_bytes": _max_bytes(),
+        "ttl_hours": settings.page_cache_ttl_hours,
+        "hits": _stats["hits"],
+        "revalidated": _stats["revalidated"],
+        "misses": _stats["misses"],
+        "hit_ratio": round(served / lookups, 4) if lookups else 0,
+        "lifetime_hits": total_hits,
+        "lifetime_revalidated": total_revalidated,
+    }
+
+
+async def clear_page_cache() -> int:
+    """清空缓存"""
+    _pending_hits.clear()
+
+    async def write(session) -> int:
+        result = await session.execute(delete(PageCacheEntry))
+        return result.rowcount or 0
+
+    return await submit_write(write)
@@ -1,16 +1,125 @@
 """
 网页抓取工具
 """
+import asyncio
+import time
 import httpx
-from bs4 import BeautifulSoup
-from typing import Optional
+from contextlib import asynccontextmanager
+from html.parser import HTMLParser
+from typing import Dict, Optional
+from urllib.parse import urljoin, urlparse
 import re
 
+from app.config import get_settings
+from app.utils import page_cache
+from app.utils.html_extractor import extract_page
+
+settings = get_settings()
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+
+# 应用级共享客户端 (长连接、连接池)
+_client: Optional[httpx.AsyncClient] = None
+
+# 全局并发上限、每个主机的并发上限和上次请求时间
+_global_slots: Optional[asyncio.Semaphore] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+_host_locks: Dict[str, asyncio.Lock] = {}
+_host_last_request: Dict[str, float] = {}
+
+# 记录的主机数超过该值时清理空闲主机
+MAX_TRACKED_HOSTS = 5000
+
+# 进行中的整页抓取 (url -> Future[page])
+_inflight: Dict[str, asyncio.Future] = {}
+
+# 条件请求命中 (304) 标记
+NOT_MODIFIED = object()
+
+
+def get_scraper_client() -> httpx.AsyncClient:
+    """获取共享的抓取客户端"""
+    global _client
+    if _client is None:
+        try:
+            import h2  # noqa: F401
+            http2 = settings.scraper_http2
+        except ImportError:
+            http2 = False
+
+        _client = httpx.AsyncClient(
+            http2=http2,
+            follow_redirects=True,
+            timeout=10,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=settings.scraper_max_connections,
+                max_keepalive_connections=settings.scraper_max_connections,
+                keepalive_expiry=30,
+            ),
+        )
+    return _client
+
+
+async def close_scraper_client():
+    """关闭共享的抓取客户端"""
+    global _client
+    client = _client
+    _client = None
+    if client is not None:
+        await client.aclose()
+
+
+def _prune_hosts():
+    """清理没有进行中请求的主机记录"""
+    limit = settings.scraper_per_host_concurrency
+    for host in list(_host_slots):
+        slots = _host_slots[host]
+        lock = _host_locks.get(host)
+        if slots._value == limit and not (lock and lock.locked()):
+            _host_slots.pop(host, None)
+            _host_locks.pop(host, None)
+            _host_last_request.pop(host, None)
+
+
+@asynccontextmanager
+async def host_slot(url: str):
+    """
+    获取请求许可：限制全局并发数和单个主机的并发数，
+    并保证同一主机相邻请求之间至少间隔 scraper_host_delay 秒
+    """
+    global _global_slots
+    if _global_slots is None:
+        _global_slots = asyncio.Semaphore(settings.scraper_max_in_flight)
+
+    host = (urlparse(url).hostname or "").lower()
+    if host not in _host_slots and len(_host_slots) >= MAX_TRACKED_HOSTS:
+        _prune_hosts()
+    host_slots = _host_slots.setdefault(
+        host, asyncio.Semaphore(settings.scraper_per_host_concurrency)
+    )
+    host_lock = _host_locks.setdefault(host, asyncio.Lock())
+
+    async with host_slots:
+        # 礼貌延迟
+        async with host_lock:
+            wait = _host_last_request.get(host, 0) + settings.scraper_host_delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            _host_last_request[host] = time.monotonic()
+
+        async with _global_slots:
+            yield
+
 
 async def fetch_page_content(url: str, timeout: int = 10) -> Optional[dict]:
     """
     抓取网页内容
 
+    结果写入网页抓取缓存：未过期直接返回缓存，过期后带 If-None-Match /
+    If-Modified-Since 重新验证，服务器返回 304 时沿用缓存内容。
+    相同 URL 的并发抓取只会发起一次请求。
+
     Returns:
         {
             "title": str,
@@ -19,68 +128,235 @@ async def fetch_page_content(url: str, timeout: int = 10) -> Optional[dict]:
             "favicon": str,
         }
     """
+    if not settings.page_cache_enabled:
+        result = await _download_page(url, timeout)
+        return result[0] if isinstance(result, tuple) else None
+
+    pending = _inflight.get(url)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[url] = future
     try:
-        async with httpx.AsyncClient(
-            follow_redirects=True,
-            timeout=timeout,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-            }
-        ) as client:
-            response = await client.get(url)
+        page = await _fetch_cached_page(url, timeout)
+        future.set_result(page)
+        return page
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(url, None)
+
+
+async def _fetch_cached_page(url: str, timeout: int) -> Optional[dict]:
+    """查缓存 → 条件请求 → 完整抓取"""
+    try:
+        cached = await page_cache.load(url)
+    except Exception as e:
+        print(f"⚠ 读取网页缓存失败: {e}")
+        cached = None
+
+    if cached is not None and cached["fresh"]:
+        page_cache.record("hits")
+        return cached["page"]
+
+    headers = {}
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    result = await _download_page(url, timeout, headers=headers)
+    if result is None:
+        return None
+
+    if result is NOT_MODIFIED:
+        page_cache.record("revalidated")
+        try:
+            await page_cache.mark_revalidated(url)
+        except Exception as e:
+            print(f"⚠ 更新网页缓存失败: {e}")
+        return cached["page"]
+
+    page, response_headers = result
+    page_cache.record("misses")
+    try:
+        await page_cache.store(
+            url,
+            page,
+            etag=response_headers.get("etag"),
+            last_modified=response_headers.get("last-modified"),
+        )
+    except Exception as e:
+        print(f"⚠ 写入网页缓存失败: {e}")
+    return page
+
+
+async def _download_page(url: str, timeout: int = 10, headers: Optional[dict] = None):
+    """
+    下载并解析网页
+
+    Returns:
+        (解析结果, 响应头)；服务器返回 304 时为 NOT_MODIFIED，失败为 None
+    """
+    try:
+        # 只在下载期间占用并发许可，解析不占用
+        async with host_slot(url):
+            response = await get_scraper_client().get(url, timeout=timeout, headers=headers)
+            if response.status_code == 304:
+                return NOT_MODIFIED
             response.raise_for_status()
+            html = response.text
+
+        # 解析在线程池中执行，不阻塞事件循环
+        page = await asyncio.to_thread(parse_page, url, html)
+        return page, response.headers
+
+    except Exception as e:
+        print(f"抓取页面失败 {url}: {e}")
+        return None
+
+
+def parse_page(url: str, html: str) -> dict:
+    """解析网页 HTML，提取标题、描述、正文和 favicon"""
+    return extract_page(url, html)
+
+
+# 被视为 HTML 的内容类型
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# <head> 结束标记
+HEAD_END_PATTERN = re.compile(rb"</head\s*>|<body[\s>]", re.IGNORECASE)
+
+
+class _HeadParser(HTMLParser):
+    """只解析 <head> 中的标题、描述和图标，遇到 </head> 或 <body> 即停止"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.og_title = ""
+        self.description = ""
+        self.og_description = ""
+        self.favicon = ""
+        self.charset = ""
+        self.done = False
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        attrs = {k.lower(): (v or "") for k, v in attrs}
+        if tag == "title":
+            self._in_title = True
+        elif tag == "meta":
+            name = attrs.get("name", "").lower()
+            prop = attrs.get("property", "").lower()
+            content = attrs.get("content", "")
+            if attrs.get("charset"):
+                self.charset = attrs["charset"]
+            elif name == "description" and content:
+                self.description = content
+            elif prop == "og:title" and content:
+                self.og_title = content
+            elif prop == "og:description" and content:
+                self.og_description = content
+        elif tag == "link":
+            rel = attrs.get("rel", "").lower()
+            if "icon" in rel and attrs.get("href") and not self.favicon:
+                self.favicon = attrs["href"]
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._in_title and not self.done:
+            self.title += data
 
-            soup = BeautifulSoup(response.text, "lxml")
-
-            # 提取标题
-            title = ""
-            if soup.title:
-                title = soup.title.string or ""
-            og_title = soup.find("meta", property="og:title")
-            if og_title and og_title.get("content"):
-                title = og_title["content"]
-
-            # 提取描述
-            description = ""
-            meta_desc = soup.find("meta", attrs={"name": "description"})
-            if meta_desc and meta_desc.get("content"):
-                description = meta_desc["content"]
-            og_desc = soup.find("meta", property="og:description")
-            if og_desc and og_desc.get("content"):
-                description = og_desc["content"]
-
-            # 提取主要内容
-            # 移除脚本和样式
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.decompose()
-
-            # 尝试找主要内容区域
-            main_content = soup.find("main") or soup.find("article") or soup.find("body")
-            content = ""
-            if main_content:
-                content = main_content.get_text(separator=" ", strip=True)
-                # 清理多余空白
-                content = re.sub(r"\s+", " ", content)
-                # 限制长度
-                content = content[:5000]
-
-            # 提取 favicon
-            favicon = ""
-            icon_link = soup.find("link", rel=lambda x: x and "icon" in x.lower() if x else False)
-            if icon_link and icon_link.get("href"):
-                favicon = icon_link["href"]
-                if favicon.startswith("/"):
-                    from urllib.parse import urlparse
-                    parsed = urlparse(url)
-                    favicon = f"{parsed.scheme}://{parsed.netloc}{favicon}"
 
+def _find_charset(head: bytes) -> Optional[str]:
+    """从 <meta charset> 或 http-equiv 中查找编码"""
+    match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', head, re.IGNORECASE)
+    return match.group(1).decode("ascii", "ignore") if match else None
+
+
+async def fetch_page_metadata(url: str, timeout: int = 10) -> Optional[dict]:
+    """
+    流式抓取网页元信息，只读取到 </head> 或字节上限为止
+
+    网页抓取缓存中有未过期条目时直接返回；非 HTML 内容不读取响应体。
+
+    Returns:
+        {
+            "title": str,
+            "description": str,
+            "favicon": str,
+        }
+    """
+    if settings.page_cache_enabled:
+        try:
+            cached = await page_cache.load(url)
+        except Exception as e:
+            print(f"⚠ 读取网页缓存失败: {e}")
+            cached = None
+        if cached is not None and cached["fresh"]:
+            page_cache.record("hits")
+            page = cached["page"]
+            favicon = urljoin(url, page["favicon"]) if page["favicon"] else ""
             return {
-                "title": title.strip(),
-                "description": description.strip(),
-                "content": content.strip(),
+                "title": page["title"],
+                "description": page["description"],
                 "favicon": favicon,
             }
 
+    max_bytes = settings.scraper_metadata_max_bytes
+    try:
+        async with host_slot(url):
+            async with get_scraper_client().stream("GET", url, timeout=timeout) as response:
+                response.raise_for_status()
+
+                content_type = response.headers.get("content-type", "").lower()
+                if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+                    return {"title": "", "description": "", "favicon": ""}
+
+                head = b""
+                async for chunk in response.aiter_bytes():
+                    # 只在新数据 (含少量重叠) 中查找结束标记
+                    tail = head[-16:] + chunk
+                    head += chunk
+                    if len(head) >= max_bytes or HEAD_END_PATTERN.search(tail):
+                        break
+                head = head[:max_bytes]
+                final_url = str(response.url)
+                encoding = response.charset_encoding
+
+        encoding = encoding or _find_charset(head) or "utf-8"
+        try:
+            text = head.decode(encoding, errors="replace")
+        except LookupError:
+            text = head.decode("utf-8", errors="replace")
+
+        parser = _HeadParser()
+        parser.feed(text)
+
+        favicon = urljoin(final_url, parser.favicon) if parser.favicon else ""
+        return {
+            "title": (parser.og_title or parser.title).strip(),
+            "description": (parser.og_description or parser.description).strip(),
+            "favicon": favicon,
+        }
+
     except Exception as e:
-        print(f"抓取页面失败 {url}: {e}")
+        print(f"抓取页面信息失败 {url}: {e}")
         return None
@@ -0,0 +1,224 @@
+"""
+网页正文提取器基准测试
+
+对保存的网页，比较各提取器的吞吐量和提取质量：
+- 标题 / 描述 / favicon 是否与 expected.json 一致
+- 正文召回率：must_contain 中的句子被提取到的比例
+- 噪声率：must_not_contain 中的导航、广告、脚本文本混入正文的比例
+
+benchmarks/corpus 中是手工编写的小页面 (1–2 KB)，覆盖常见结构，用于检查提取质量，
+其吞吐量不能代表真实网页。测量真实网页请用 --pages 指定浏览器 "另存为" (仅 HTML) 保存的网页目录：
+目录中有 expected.json (格式同 corpus) 时按其评分，否则只统计各提取器提取到的字段和正文长度。
+
+用法 (在 backend 目录下执行)：
+    python -m benchmarks.extractor_benchmark
+    python -m benchmarks.extractor_benchmark --pages ~/saved-pages --repeat 5
+    python -m benchmarks.extractor_benchmark --repeat 200 --inflate 50
+    python -m benchmarks.extractor_benchmark --extractors lxml bs4
+
+--inflate 会把每个页面的 <body> 内容复制 N 份，用于模拟大页面。
+"""
+import argparse
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+from app.utils.html_extractor import EXTRACTORS
+from app.utils.web_scraper import _find_charset
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+CANONICAL_RE = re.compile(
+    r'<link[^>]+rel=["\']canonical["\'][^>]*href=["\']([^"\']+)|<link[^>]+href=["\']([^"\']+)["\'][^>]*rel=["\']canonical',
+    re.IGNORECASE,
+)
+
+
+def load_corpus():
+    expected = json.loads((CORPUS_DIR / "expected.json").read_text(encoding="utf-8"))
+    pages = []
+    for name, spec in expected.items():
+        html = (CORPUS_DIR / name).read_text(encoding="utf-8")
+        pages.append((name, html, spec))
+    return pages
+
+
+def read_saved_page(path: Path) -> str:
+    """按 <meta charset> 解码保存的网页 (与抓取时相同)，未声明时按 UTF-8"""
+    data = path.read_bytes()
+    encoding = _find_charset(data[:4096]) or "utf-8"
+    try:
+        return data.decode(encoding, errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+
+def load_saved_pages(directory: Path, limit: int):
+    """
+    读取目录中保存的真实网页 (*.html / *.htm，含子目录)
+
+    有 expected.json 时只读取其中列出的页面并按其评分；否则 spec 中只有 URL
+    (取自 canonical 链接，没有时按文件路径生成)。
+    """
+    expected_path = directory / "expected.json"
+    if expected_path.exists():
+        expected = json.loads(expected_path.read_text(encoding="utf-8"))
+        return [(name, read_saved_page(directory / name), spec) for name, spec in expected.items()][:limit]
+
+    pages = []
+    files = sorted(p for p in directory.rglob("*") if p.suffix.lower() in (".html", ".htm"))
+    for path in files[:limit]:
+        html = read_saved_page(path)
+        name = str(path.relative_to(directory))
+        match = CANONICAL_RE.search(html)
+        url = (match.group(1) or match.group(2)) if match else f"https://saved.invalid/{name}"
+        pages.append((name, html, {"url": url}))
+    return pages
+
+
+def run_summary(extractor, pages) -> dict:
+    """没有标注时的统计：提取到标题 / 描述 / favicon 的页面比例和正文平均长度"""
+    results = []
+    errors = 0
+    for _, html, spec in pages:
+        try:
+            results.append(extractor.extract(spec["url"], html))
+        except Exception:
+            errors += 1
+    count = len(results) or 1
+    return {
+        "title": sum(bool(r["title"]) for r in results) / count,
+        "description": sum(bool(r["description"]) for r in results) / count,
+        "favicon": sum(bool(r["favicon"]) for r in results) / count,
+        "content_chars": sum(len(r["content"]) for r in results) / count,
+        "errors": errors,
+    }
+
+
+def inflate(html: str, times: int) -> str:
+    """复制 <body> 内容，构造大页面"""
+    match = re.search(r"<body[^>]*>(.*)</body>", html, re.IGNORECASE | re.DOTALL)
+    if not match or times <= 1:
+        return html
+    body = match.group(1)
+    return html[:match.start(1)] + body * times + html[match.end(1):]
+
+
+def score(result: dict, spec: dict) -> dict:
+    content = result["content"]
+    must = spec.get("must_contain", [])
+    noise = spec.get("must_not_contain", [])
+    return {
+        "title": result["title"] == spec["title"],
+        "description": result["description"] == spec["description"],
+        "favicon": result["favicon"] == spec["favicon"],
+        "recall": sum(s in content for s in must) / len(must) if must else 1.0,
+        "noise": sum(s in content for s in noise) / len(noise) if noise else 0.0,
+    }
+
+
+def run_quality(extractor, pages):
+    rows = []
+    for name, html, spec in pages:
+        try:
+            rows.append((name, score(extractor.extract(spec["url"], html), spec)))
+        except Exception as e:
+            rows.append((name, {"error": str(e)[:60]}))
+    return rows
+
+
+def run_throughput(extractor, pages, repeat: int, times: int):
+    docs = [(spec["url"], inflate(html, times)) for _, html, spec in pages]
+    total_bytes = sum(len(html.encode("utf-8")) for _, html in docs)
+    timings = []
+    for _ in range(repeat):
+        for url, html in docs:
+            start = time.perf_counter()
+            try:
+                extractor.extract(url, html)
+            except Exception:
+                pass
+            timings.append(time.perf_counter() - start)
+    elapsed = sum(timings)
+    return {
+        "pages_per_sec": len(timings) / elapsed if elapsed else 0,
+        "mb_per_sec": total_bytes * repeat / elapsed / 1024 / 1024 if elapsed else 0,
+        "p50_ms": statistics.median(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+        "avg_page_kb": total_bytes / len(docs) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网页正文提取器基准测试")
+    parser.add_argument("--extractors", nargs="+", default=list(EXTRACTORS))
+    parser.add_argument("--repeat", type=int, default=50, help="每个页面重复解析次数")
+    parser.add_argument("--inflate", type=int, default=1, help="页面 <body> 复制倍数")
+    parser.add_argument("--pages", default=None, help="保存的真实网页目录 (默认使用 benchmarks/corpus)")
+    parser.add_argument("--max-pages", type=int, default=500, help="--pages 目录中最多读取的页面数")
+    args = parser.parse_args()
+
+    if args.pages:
+        directory = Path(args.pages).expanduser()
+        pages = load_saved_pages(directory, args.max_pages)
+    else:
+        directory = CORPUS_DIR
+        pages = load_corpus()
+    if not pages:
+        print(f"没有找到网页: {directory}")
+        return
+    print(f"语料：{len(pages)} 个页面 ({directory})\n")
+
+    if any("title" not in spec for _, _, spec in pages):
+        print("== 提取结果 (无标注) ==")
+        print(f"{'extractor':<12}{'title':>8}{'desc':>8}{'icon':>8}{'chars':>10}{'errors':>8}")
+        for name in args.extractors:
+            r = run_summary(EXTRACTORS[name], pages)
+            print(
+                f"{name:<12}{r['title']:>8.0%}{r['description']:>8.0%}{r['favicon']:>8.0%}"
+                f"{r['content_chars']:>10.0f}{r['errors']:>8}"
+            )
+        print_throughput(args, pages)
+        return
+
+    print("== 提取质量 ==")
+    for name in args.extractors:
+        extractor = EXTRACTORS[name]
+        rows = run_quality(extractor, pages)
+        print(f"\n[{name}]")
+        print(f"{'page':<24}{'title':>7}{'desc':>7}{'icon':>7}{'recall':>8}{'noise':>8}")
+        scored = [r for _, r in rows if "error" not in r]
+        for page, r in rows:
+            if "error" in r:
+                print(f"{page:<24}  error: {r['error']}")
+                continue
+            print(
+                f"{page:<24}{'ok' if r['title'] else '-':>7}{'ok' if r['description'] else '-':>7}"
+                f"{'ok' if r['favicon'] else '-':>7}{r['recall']:>8.2f}{r['noise']:>8.2f}"
+            )
+        if scored:
+            print(
+                f"{'total':<24}{sum(r['title'] for r in scored):>7}{sum(r['description'] for r in scored):>7}"
+                f"{sum(r['favicon'] for r in scored):>7}"
+                f"{statistics.mean(r['recall'] for r in scored):>8.2f}"
+                f"{statistics.mean(r['noise'] for r in scored):>8.2f}"
+            )
+
+    print_throughput(args, pages)
+
+
+def print_throughput(args, pages):
+    print(f"\n== 吞吐量 (repeat={args.repeat}, inflate={args.inflate}) ==")
+    print(f"{'extractor':<12}{'pages/s':>10}{'MB/s':>8}{'p50 ms':>9}{'max ms':>9}{'page KB':>9}")
+    for name in args.extractors:
+        r = run_throughput(EXTRACTORS[name], pages, args.repeat, args.inflate)
+        print(
+            f"{name:<12}{r['pages_per_sec']:>10.1f}{r['mb_per_sec']:>8.2f}"
+            f"{r['p50_ms']:>9.2f}{r['max_ms']:>9.2f}{r['avg_page_kb']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
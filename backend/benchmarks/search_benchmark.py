@@ -0,0 +1,62 @@
+"""
+向量索引检索基准测试
+
+生成随机的 L2 归一化向量填充 VectorIndex，测量单次查询的延迟。
+
+用法 (在 backend 目录下执行)：
+    python -m benchmarks.search_benchmark
+    python -m benchmarks.search_benchmark --size 100000 --dim 512 --queries 200
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.services.ai.vector_index import VectorIndex
+
+
+def build_index(size: int, dim: int, seed: int = 0) -> VectorIndex:
+    rng = np.random.default_rng(seed)
+    index = VectorIndex(dim)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    for i, vector in enumerate(vectors):
+        # 约 5% 的书签为隐藏书签
+        index.upsert(f"bookmark-{i}", vector, visible=i % 20 != 0)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引检索基准测试")
+    parser.add_argument("--size", type=int, default=100000, help="书签数")
+    parser.add_argument("--dim", type=int, default=512, help="向量维度")
+    parser.add_argument("--queries", type=int, default=100, help="查询次数")
+    parser.add_argument("--limit", type=int, default=10, help="每次返回结果数")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(args.size, args.dim)
+    print(f"构建索引：{args.size} 个向量 × {args.dim} 维，耗时 {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    for include_hidden in (True, False):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.limit, include_hidden=include_hidden, min_score=-1.0)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(
+            f"include_hidden={include_hidden!s:<6}"
+            f"p50 {statistics.median(timings) * 1000:.2f} ms  "
+            f"p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.2f} ms  "
+            f"max {timings[-1] * 1000:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+多进程服务基准测试
+
+在临时 SQLite 数据库中写入书签，用 python -m app.serve 按不同的工作进程数启动服务，
+由多个压测进程通过 keep-alive 连接并发请求书签列表和单个书签 (均为只读接口)，比较吞吐量和延迟。
+第一行为原来的启动方式 (单进程、asyncio 事件循环、h11 解析器) 作为对照。
+
+压测进程和服务进程运行在同一台机器上，会争抢 CPU；工作进程数超过 CPU 核数后吞吐量不会再增加。
+
+用法 (在 backend 目录下执行)：
+    python -m benchmarks.serve_benchmark
+    python -m benchmarks.serve_benchmark --workers 1,2,4,8 --clients 4 --seconds 15
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+def parse_args():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, *(n for n in (2, 4, 8, 16) if n <= cpus)})
+    parser = argparse.ArgumentParser(description="多进程服务基准测试")
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)), help="依次测试的工作进程数，逗号分隔")
+    parser.add_argument("--bookmarks", type=int, default=200, help="书签数 (列表接口每次返回全部书签)")
+    parser.add_argument("--clients", type=int, default=max(1, cpus // 2), help="压测进程数")
+    parser.add_argument("--concurrency", type=int, default=64, help="同时进行的请求数 (所有压测进程合计)")
+    parser.add_argument("--seconds", type=float, default=10, help="每轮压测时长")
+    parser.add_argument("--dir", default=None, help="临时数据库所在目录 (默认系统临时目录)")
+    return parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def seed(count: int) -> list:
+    """写入测试书签，返回书签 ID"""
+    from app.database import async_session_maker, dispose_engines, init_db
+    from app.models.bookmark import Bookmark
+
+    await init_db()
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    async with async_session_maker() as session:
+        session.add_all(
+            Bookmark(
+                id=bookmark_id,
+                title=f"书签 {i}",
+                url=f"https://example.com/{i}",
+                description="description " * 20,
+                category=f"分类 {i % 20}",
+                tags='["python", "benchmark"]',
+                order=i,
+            )
+            for i, bookmark_id in enumerate(ids)
+        )
+        await session.commit()
+    await dispose_engines()
+    return ids
+
+
+def start_server(env: dict, workers: int, loop: str, http: str) -> subprocess.Popen:
+    env = dict(env, SERVER_WORKERS=str(workers), SERVER_LOOP=loop, SERVER_HTTP=http)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.serve"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return process
+
+
+def wait_ready(port: int, workers: int, timeout: float = 60):
+    """等待服务可以响应，再给其他工作进程留出启动和预热的时间"""
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                time.sleep(1 + 0.5 * workers)
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("服务启动超时")
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def fetch(reader, writer, path: str, host: str) -> int:
+    """在 keep-alive 连接上发送一次 GET 请求，读完响应后返回状态码"""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in lines[1:] if ": " in line)
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return int(lines[0].split(" ")[1])
+
+
+def load_client(host: str, port: int, paths: list, concurrency: int, seconds: float, result_queue):
+    """
+    压测进程：在 seconds 秒内循环请求，把 (成功请求的延迟列表, 失败数) 放入 result_queue
+
+    每个协程使用自己的 keep-alive 连接直接收发 HTTP/1.1，压测进程本身的开销尽量小
+    (httpx 连接池在几十个并发请求时就会成为瓶颈)。
+    """
+    async def run():
+        latencies = []
+        errors = 0
+        deadline = time.monotonic() + seconds
+
+        async def task(offset: int):
+            nonlocal errors
+            i = offset
+            reader, writer = await asyncio.open_connection(host, port)
+            try:
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        status = await fetch(reader, writer, paths[i % len(paths)], host)
+                    except (OSError, asyncio.IncompleteReadError):
+                        errors += 1
+                        writer.close()
+                        reader, writer = await asyncio.open_connection(host, port)
+                        continue
+                    if status == 200:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+                    i += 1
+            finally:
+                writer.close()
+
+        await asyncio.gather(*(task(i) for i in range(concurrency)))
+        return latencies, errors
+
+    latencies, errors = asyncio.run(run())
+    result_queue.put((latencies, errors))
+
+
+def run_load(port: int, paths: list, args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    per_client = max(1, args.concurrency // args.clients)
+    clients = [
+        context.Process(target=load_client, args=("127.0.0.1", port, paths, per_client, args.seconds, result_queue))
+        for _ in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+    latencies, errors = [], 0
+    for _ in clients:
+        client_latencies, client_errors = result_queue.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for client in clients:
+        client.join()
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        "rps": len(latencies) / args.seconds,
+        "p50": percentile(0.5),
+        "p99": percentile(0.99),
+        "errors": errors,
+    }
+
+
+def main():
+    args = parse_args()
+    worker_counts = [int(n) for n in args.workers.split(",") if n.strip()]
+    directory = tempfile.mkdtemp(prefix="litemark-bench-", dir=args.dir)
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}",
+        SERVER_HOST="127.0.0.1",
+        SERVER_PORT=str(free_port()),
+        FAVICON_PREFETCH="false",
+        LINK_CHECK_ENABLED="false",
+        DUPLICATE_SCAN_ENABLED="false",
+    )
+    # 数据库地址需在导入 app 之前设置
+    os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+    port = int(env["SERVER_PORT"])
+
+    try:
+        ids = asyncio.run(seed(args.bookmarks))
+        # 每 10 次请求中 1 次书签列表，9 次单个书签
+        paths = ["/api/bookmarks"] + [f"/api/bookmarks/{bookmark_id}" for bookmark_id in ids[:9]]
+
+        print(
+            f"CPU {os.cpu_count()} 核，{args.bookmarks} 个书签，{args.clients} 个压测进程，"
+            f"并发 {args.concurrency}，每轮 {args.seconds:g} 秒"
+        )
+        cpus = os.cpu_count() or 1
+        if max(worker_counts, default=1) >= cpus:
+            # 压测进程也占用 CPU，工作进程数达到核数后的结果不能说明多进程的扩展性
+            print(f"⚠ 工作进程数达到或超过 CPU 核数 ({cpus})，多进程扩展性请在核数更多的机器上测试")
+        profiles = [("1 进程 asyncio/h11", 1, "asyncio", "h11")] + [
+            (f"{n} 进程 uvloop/httptools", n, "uvloop", "httptools") for n in worker_counts
+        ]
+        baseline = None
+        for name, workers, loop, http in profiles:
+            process = start_server(env, workers, loop, http)
+            try:
+                wait_ready(port, workers)
+                result = run_load(port, paths, args)
+            finally:
+                stop_server(process)
+            baseline = baseline or result["rps"]
+            print(
+                f"{name}: {result['rps']:.0f} 次/秒 (x{result['rps'] / baseline:.2f})，"
+                f"p50 {result['p50']:.1f}ms，p99 {result['p99']:.1f}ms，失败 {result['errors']} 次"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+SQLite 连接参数基准测试
+
+在临时数据库中写入书签，然后让多个读协程 (分页查询) 和写协程 (逐条更新并提交) 同时运行，
+比较原来的连接方式 (每个会话新建连接、SQLite 默认参数) 和当前配置 (连接池 + SQLITE_* 参数)
+下的读写吞吐量。
+
+用法 (在 backend 目录下执行)：
+    python -m benchmarks.sqlite_benchmark
+    python -m benchmarks.sqlite_benchmark --bookmarks 20000 --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from app.config import get_settings
+from app.database import Base, install_sqlite_pragmas, sqlite_pragmas
+from app.models.bookmark import Bookmark
+
+# SQLite 默认参数 (只设置 busy_timeout，避免写冲突直接报错)
+DEFAULT_PROFILE = [("busy_timeout", "5000")]
+
+
+async def run_profile(name: str, pragmas, pool_options: dict, args) -> dict:
+    directory = tempfile.mkdtemp(prefix="litemark-bench-", dir=args.dir)
+    path = os.path.join(directory, "bench.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", **pool_options)
+    install_sqlite_pragmas(engine.sync_engine, pragmas)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    ids = [str(uuid.uuid4()) for _ in range(args.bookmarks)]
+    async with session_maker() as session:
+        session.add_all(
+            Bookmark(
+                id=bookmark_id,
+                title=f"书签 {i}",
+                url=f"https://example.com/{i}",
+                description="description " * 20,
+                category=f"分类 {i % 20}",
+            )
+            for i, bookmark_id in enumerate(ids)
+        )
+        await session.commit()
+
+    deadline = time.perf_counter() + args.seconds
+    reads = writes = 0
+
+    async def reader(seed: int):
+        nonlocal reads
+        i = seed * 97
+        while time.perf_counter() < deadline:
+            async with session_maker() as session:
+                await session.get(Bookmark, ids[i % len(ids)])
+                await session.execute(
+                    select(Bookmark.id, Bookmark.title).where(Bookmark.category == f"分类 {i % 20}").limit(20)
+                )
+            reads += 1
+            i += 1
+
+    async def writer(seed: int):
+        nonlocal writes
+        i = seed
+        while time.perf_counter() < deadline:
+            async with session_maker() as session:
+                await session.execute(
+                    update(Bookmark).where(Bookmark.id == ids[i % len(ids)]).values(description=f"updated {i}")
+                )
+                await session.commit()
+            writes += 1
+            i += 7
+
+    await asyncio.gather(
+        *(reader(n) for n in range(args.readers)),
+        *(writer(n) for n in range(args.writers)),
+    )
+    await engine.dispose()
+    shutil.rmtree(directory, ignore_errors=True)
+    return {"name": name, "reads": reads / args.seconds, "writes": writes / args.seconds}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="SQLite 连接参数基准测试")
+    parser.add_argument("--bookmarks", type=int, default=10000, help="书签数")
+    parser.add_argument("--readers", type=int, default=8, help="读协程数")
+    parser.add_argument("--writers", type=int, default=2, help="写协程数")
+    parser.add_argument("--seconds", type=float, default=5.0, help="每组测试时长")
+    parser.add_argument("--dir", default=None, help="临时数据库所在目录 (默认系统临时目录)")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    configured = sqlite_pragmas()
+    pooled = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.sqlite_pool_size,
+        "max_overflow": settings.sqlite_pool_overflow,
+    }
+    print("当前配置: " + ", ".join(f"{name}={value}" for name, value in configured))
+    profiles = (
+        ("原连接方式", DEFAULT_PROFILE, {"poolclass": NullPool}),
+        ("仅连接池", DEFAULT_PROFILE, pooled),
+        ("当前配置", configured, pooled),
+    )
+    for name, pragmas, pool_options in profiles:
+        result = await run_profile(name, pragmas, pool_options, args)
+        print(f"{result['name']}: 读 {result['reads']:.0f} 次/秒，写 {result['writes']:.0f} 次/秒")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
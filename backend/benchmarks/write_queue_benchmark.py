@@ -0,0 +1,106 @@
+"""
+写入队列基准测试
+
+在临时 SQLite 数据库中并发执行小写操作 (新建书签、修改标题)，比较两种方式：
+- 直接写入：每个操作使用自己的会话和事务 (原来的方式)，多个写事务争抢写锁
+- 写入队列：操作交给单个写入协程，合并到同一事务中提交
+
+用法 (在 backend 目录下执行)：
+    python -m benchmarks.write_queue_benchmark
+    python -m benchmarks.write_queue_benchmark --operations 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="写入队列基准测试")
+    parser.add_argument("--operations", type=int, default=1000, help="写操作数")
+    parser.add_argument("--concurrency", type=int, default=32, help="同时进行的写操作数")
+    parser.add_argument("--dir", default=None, help="临时数据库所在目录 (默认系统临时目录)")
+    return parser.parse_args()
+
+
+args = parse_args()
+directory = tempfile.mkdtemp(prefix="litemark-bench-", dir=args.dir)
+# 数据库地址需在导入 app 之前设置
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+sys.argv = sys.argv[:1]
+
+from sqlalchemy import update  # noqa: E402
+
+from app.database import async_session_maker, engine, init_db, write_engine  # noqa: E402
+from app.models.bookmark import Bookmark  # noqa: E402
+from app.services.write_queue import get_write_queue, stop_write_queue, submit_write  # noqa: E402
+
+
+def make_operation(i: int, ids: list):
+    """偶数为新建书签，奇数为修改已有书签的标题"""
+    async def operation(session):
+        if i % 2 == 0 or not ids:
+            bookmark_id = str(uuid.uuid4())
+            session.add(Bookmark(id=bookmark_id, title=f"书签 {i}", url=f"https://example.com/{i}", order=i))
+            ids.append(bookmark_id)
+        else:
+            await session.execute(
+                update(Bookmark).where(Bookmark.id == ids[i % len(ids)]).values(title=f"修改 {i}")
+            )
+    return operation
+
+
+async def direct(operation):
+    async with async_session_maker() as session:
+        await operation(session)
+        await session.commit()
+
+
+async def run(name: str, execute) -> None:
+    ids: list = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    errors = 0
+    latencies = []
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await execute(make_operation(i, ids))
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.operations)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(
+        f"{name}: {args.operations / elapsed:.0f} 次/秒，p50 {p50:.1f}ms，p99 {p99:.1f}ms，失败 {errors} 次"
+    )
+
+
+async def main():
+    await init_db()
+    print(f"{args.operations} 个写操作，并发 {args.concurrency}")
+    await run("直接写入", direct)
+    await run("写入队列", submit_write)
+    stats = get_write_queue().stats()
+    print(f"写入队列：{stats['batches']} 个事务，平均每个事务 {stats['average_batch']} 个操作")
+    await stop_write_queue()
+    await engine.dispose()
+    await write_engine.dispose()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
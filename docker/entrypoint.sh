@@ -10,6 +10,7 @@ export DEBUG=${DEBUG:-"false"}
 export CORS_ORIGINS=${CORS_ORIGINS:-"*"}
 export DEFAULT_ADMIN_USERNAME=${DEFAULT_ADMIN_USERNAME:-"admin"}
 export DEFAULT_ADMIN_PASSWORD=${DEFAULT_ADMIN_PASSWORD:-"admin123"}
+export SERVER_WORKERS=${SERVER_WORKERS:-"1"}
 
 # 创建日志目录
 mkdir -p /var/log/supervisor
@@ -23,6 +24,7 @@ echo "  LiteMark 启动中..."
 echo "================================"
 echo "数据库: $DATABASE_URL"
 echo "调试模式: $DEBUG"
+echo "工作进程: $SERVER_WORKERS"
 echo "================================"
 
 # 执行传入的命令
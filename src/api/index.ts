@@ -85,6 +85,14 @@ export interface Bookmark {
   visible?: boolean;
   order?: number;
   tags?: string;
+  favicon?: string;
+  favicon_hash?: string | null;
+  enrich_status?: string;
+  link_status_code?: number | null;
+  link_final_url?: string | null;
+  link_latency_ms?: number | null;
+  link_error?: string | null;
+  link_checked_at?: string | null;
   created_at?: string;
   updated_at?: string;
 }
@@ -161,10 +169,46 @@ export interface TaskProgress {
   progress: number;
   status: string;
   errors: string[];
+  cancel_requested?: boolean;
+  created_at?: string;
   started_at?: string;
   completed_at?: string;
 }
 
+export interface SearchResult {
+  id: string;
+  title: string;
+  url: string;
+  category?: string;
+  description?: string;
+  ai_summary?: string;
+  score: number;
+}
+
+export interface SearchResponse {
+  query_understood?: string;
+  results: SearchResult[];
+}
+
+export interface OrganizeCluster {
+  bookmark_ids: string[];
+  size: number;
+  cohesion: number;
+  suggested_name: string;
+  confidence?: number | null;
+  top_terms: string[];
+  top_domains: string[];
+  samples: { id: string; title: string; url: string }[];
+}
+
+export interface OrganizeProposal {
+  category: string;
+  total: number;
+  clusters: OrganizeCluster[];
+  unclustered_ids: string[];
+  llm_calls: number;
+}
+
 // ============ 认证 API ============
 
 export const authApi = {
@@ -194,6 +238,9 @@ export const bookmarksApi = {
   list: (): Promise<Bookmark[]> =>
     request('/api/bookmarks', { method: 'GET' }),
 
+  search: (q: string, limit = 50): Promise<Bookmark[]> =>
+    request(`/api/bookmarks?q=${encodeURIComponent(q)}&limit=${limit}`, { method: 'GET' }),
+
   get: (id: string): Promise<Bookmark> =>
     request(`/api/bookmarks/${id}`, { method: 'GET' }),
 
@@ -378,6 +425,50 @@ export const aiApi = {
    */
   getTasks: (): Promise<TaskProgress[]> =>
     request('/api/ai/tasks', { method: 'GET' }),
+
+  /**
+   * 取消任务
+   */
+  cancelTask: (taskId: string): Promise<TaskProgress> =>
+    request(`/api/ai/task/${taskId}/cancel`, { method: 'POST' }),
+
+  /**
+   * 继续执行已取消或失败的任务
+   */
+  resumeTask: (taskId: string): Promise<TaskProgress> =>
+    request(`/api/ai/task/${taskId}/resume`, { method: 'POST' }),
+
+  /**
+   * 语义搜索
+   */
+  search: (data: { query: string; limit?: number }): Promise<SearchResponse> =>
+    request('/api/ai/search', {
+      method: 'POST',
+      body: JSON.stringify(data),
+    }),
+
+  /**
+   * 分类整理建议（离线聚类，AI 只为分组命名）
+   */
+  organizePropose: (data: {
+    category?: string;
+    num_clusters?: number;
+    sample_size?: number;
+    name_clusters?: boolean;
+  }): Promise<OrganizeProposal> =>
+    request('/api/ai/organize/propose', {
+      method: 'POST',
+      body: JSON.stringify(data),
+    }),
+
+  /**
+   * 应用分类整理
+   */
+  organizeApply: (groups: { category: string; bookmark_ids: string[] }[]): Promise<{ success: boolean; updated: number }> =>
+    request('/api/ai/organize/apply', {
+      method: 'POST',
+      body: JSON.stringify({ groups }),
+    }),
 };
 
 // 工具函数导出